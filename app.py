@@ -1,6 +1,7 @@
 import streamlit as st
 import sys
 import json
+import time
 from datetime import datetime
 from pathlib import Path
 
@@ -9,6 +10,7 @@ project_root = Path(__file__).parent
 sys.path.append(str(project_root))
 
 from core.chat_agent import TripForgeChatAgent
+from utils.metrics import start_metrics_server
 
 # Page configuration
 st.set_page_config(
@@ -37,18 +39,25 @@ load_css()
 def initialize_session():
     """Initialize session state variables"""
     if 'chat_agent' not in st.session_state:
-        st.session_state.chat_agent = TripForgeChatAgent()
+        # The session ID in the URL lets a reload or redeploy resume the conversation from its checkpoint
+        st.session_state.chat_agent = TripForgeChatAgent(session_id=st.query_params.get("session"))
+        st.query_params["session"] = st.session_state.chat_agent.session_id
     
     if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+        st.session_state.chat_history = st.session_state.chat_agent.transcript()
     
     if 'agent_state' not in st.session_state:
-        st.session_state.agent_state = {}
+        st.session_state.agent_state = download_state(st.session_state.chat_agent.agent_state)
     
     if 'initialized' not in st.session_state:
         st.session_state.initialized = False
 
 
+def download_state(state: dict) -> dict:
+    """The parts of the agent state the sidebar downloads need; the message history stays with the agent"""
+    return {'itinerary': state.get('itinerary', ''), 'preferences': state.get('preferences', {})}
+
+
 def create_sidebar():
     """Create a narrow sidebar with essential features"""
     with st.sidebar:
@@ -185,27 +194,55 @@ def generate_chat_export():
     
     return None
 
-def display_chat_history():
-    """Display the chat history with user bubbles on right and assistant markdown on left"""
-    for message in st.session_state.chat_history:
-        if message['role'] == 'user':
-            # User message in bubble on the right
-            st.markdown(f"""
+def user_message_html(content: str) -> str:
+    """User message in a bubble on the right"""
+    return f"""
             <div class="user-message-container">
                 <div class="user-message">
-                    {message['content']}
+                    {content}
                 </div>
             </div>
-            """, unsafe_allow_html=True)
-        else:
-            # Assistant message as plain markdown on the left
-            st.markdown(f"""
+            """
+
+def assistant_message_html(content: str) -> str:
+    """Assistant message as plain markdown on the left"""
+    return f"""
             <div class="assistant-message-container">
                 <div class="assistant-message">
-                    {message['content']}
+                    {content}
                 </div>
             </div>
-            """, unsafe_allow_html=True)
+            """
+
+
+def display_chat_history():
+    """Display the chat history with user bubbles on right and assistant markdown on left"""
+    for message in st.session_state.chat_history:
+        if message['role'] == 'user':
+            st.markdown(user_message_html(message['content']), unsafe_allow_html=True)
+        else:
+            st.markdown(assistant_message_html(message['content']), unsafe_allow_html=True)
+
+# Minimum seconds between redraws of a streaming reply; redrawing on every token re-renders the whole text
+STREAM_REDRAW_INTERVAL = 0.05
+
+def stream_agent_response(user_input: str) -> tuple:
+    """Show the user's message and render the agent's reply as it is generated; returns (response, state)"""
+    st.markdown(user_message_html(user_input), unsafe_allow_html=True)
+    placeholder = st.empty()
+    text, last_redraw = "", 0.0
+    for kind, payload in st.session_state.chat_agent.process_message_stream(user_input):
+        if kind == "done":
+            return payload
+        if kind == "status":
+            # The model is searching; drop any partial text and show what it is doing
+            text = ""
+            placeholder.markdown(assistant_message_html(f"<em>{payload}</em>"), unsafe_allow_html=True)
+            continue
+        text += payload
+        if time.monotonic() - last_redraw >= STREAM_REDRAW_INTERVAL:
+            placeholder.markdown(assistant_message_html(text + " ▌"), unsafe_allow_html=True)
+            last_redraw = time.monotonic()
 
 def handle_user_input():
     """Handle user input and get agent response"""
@@ -219,12 +256,12 @@ def handle_user_input():
             'content': user_input
         })
         
-        # Get agent response
+        # Get agent response, streaming itinerary text into the page as it arrives
         try:
-            response, updated_state = st.session_state.chat_agent.process_message(user_input)
+            response, updated_state = stream_agent_response(user_input)
             
             # Update agent state
-            st.session_state.agent_state = updated_state
+            st.session_state.agent_state = download_state(updated_state)
             
             # Add assistant response to chat history
             st.session_state.chat_history.append({
@@ -245,6 +282,9 @@ def handle_user_input():
 
 def main():
     """Main application function"""
+    # Expose /metrics when TRIPFORGE_METRICS_PORT is set (no-op on reruns)
+    start_metrics_server()
+
     # Initialize session
     initialize_session()
     
@@ -0,0 +1 @@
+# Benchmarks for the TripForge chat pipeline
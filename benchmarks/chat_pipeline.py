@@ -0,0 +1,277 @@
+"""
+End-to-end latency and throughput benchmark for TripForgeChatAgent.
+
+Drives scripted multi-turn conversations through process_message with a fake
+LLM and a synthetic search backend, then writes per-turn latency percentiles,
+per-node time split, memory and throughput to JSON.
+
+Usage:
+    python -m benchmarks.chat_pipeline --sessions 8 --output bench.json
+    python -m benchmarks.chat_pipeline --baseline old.json --output new.json
+    python -m benchmarks.chat_pipeline --stream --llm-latency 2 --output stream.json
+    python -m benchmarks.chat_pipeline --async --sessions 64 --llm-latency 2 --output async.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+# Add project root to import the app modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from benchmarks.fakes import ScriptedChatModel, SyntheticSearchBackend
+from core.chat_agent import TripForgeChatAgent
+from utils.backends import SyntheticLatency, set_search_backend
+from utils.cache import search_cache
+from utils.llm_cache import LLMResponseCache
+from utils.metrics import metrics
+from utils.prefetch import prefetcher
+from utils.singleflight import search_singleflight
+
+SCRIPT = [
+    ("preferences", "Planning a beach trip to Goa with my partner"),
+    ("preferences", "From Delhi, 10th to 14th December, budget 60k total"),
+    ("itinerary_start", "Looks good!"),
+    ("itinerary_followup", "Can you find something cheaper for the hotel?"),
+    ("itinerary_followup", "What about an earlier return flight?"),
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def summarize(samples: list) -> dict:
+    """Latency summary in milliseconds."""
+    ms = [sample * 1000 for sample in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": statistics.fmean(ms) if ms else 0.0,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "max_ms": max(ms) if ms else 0.0,
+    }
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Callback handler that times every LangGraph node run, keyed by graph/node."""
+
+    # Called directly on async runs too, instead of via the executor (the handler only takes a lock)
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._graphs = {}       # root run_id -> graph name
+        self._running = {}      # node run_id -> (key, start)
+        self.samples = {}       # "graph/node" -> [seconds]
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = kwargs.get("name")
+        with self._lock:
+            if parent_run_id is None:
+                self._graphs[run_id] = name
+            elif parent_run_id in self._graphs and (metadata or {}).get("langgraph_node") == name:
+                self._running[run_id] = (f"{self._graphs[parent_run_id]}/{name}", time.perf_counter())
+
+    def _finish(self, run_id):
+        with self._lock:
+            self._graphs.pop(run_id, None)
+            running = self._running.pop(run_id, None)
+            if running is not None:
+                key, started = running
+                self.samples.setdefault(key, []).append(time.perf_counter() - started)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+
+def session_preferences(session: int, shared_route: bool) -> dict:
+    """Preferences for one benchmark session; distinct dates unless the route is shared."""
+    start = date(2025, 12, 10) + timedelta(days=0 if shared_route else session)
+    return {
+        "departure_city": "DEL", "arrival_city": "GOI", "city": "Goa",
+        "departure_date": start.isoformat(), "return_date": (start + timedelta(days=4)).isoformat(),
+        "adults": 2, "children": 0, "budget_per_person": "30000 INR", "interests": ["beaches", "nightlife"],
+    }
+
+
+def session_agent(session: int, args, timer: NodeTimer) -> TripForgeChatAgent:
+    llm = ScriptedChatModel(
+        preferences=session_preferences(session, args.shared_route),
+        itinerary_chars=args.itinerary_chars,
+        latency=SyntheticLatency(args.llm_latency, args.llm_jitter, seed=session),
+        cache=args.llm_cache or None,
+    )
+    return TripForgeChatAgent(llm=llm, callbacks=[timer])
+
+
+def run_session(session: int, args, timer: NodeTimer) -> list:
+    """Run one scripted conversation; returns (kind, seconds, seconds to first streamed token or None) per turn."""
+    agent = session_agent(session, args, timer)
+    turns = []
+    for kind, message in SCRIPT[:args.turns]:
+        started, first_token = time.perf_counter(), None
+        if args.stream:
+            for event, payload in agent.process_message_stream(message):
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - started
+                elif event == "done":
+                    response, _ = payload
+        else:
+            response, _ = agent.process_message(message)
+        turns.append((kind, time.perf_counter() - started, first_token))
+        if response.startswith("I encountered an error"):
+            raise RuntimeError(f"session {session}: {response}")
+    return turns
+
+
+async def arun_session(session: int, args, timer: NodeTimer) -> list:
+    """run_session through the async API; all sessions share the caller's event loop."""
+    agent = session_agent(session, args, timer)
+    turns = []
+    for kind, message in SCRIPT[:args.turns]:
+        started, first_token = time.perf_counter(), None
+        if args.stream:
+            async for event, payload in agent.aprocess_message_stream(message):
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - started
+                elif event == "done":
+                    response, _ = payload
+        else:
+            response, _ = await agent.aprocess_message(message)
+        turns.append((kind, time.perf_counter() - started, first_token))
+        if response.startswith("I encountered an error"):
+            raise RuntimeError(f"session {session}: {response}")
+    return turns
+
+
+async def arun_sessions(args, timer: NodeTimer) -> list:
+    return await asyncio.gather(*(arun_session(session, args, timer) for session in range(args.sessions)))
+
+
+def run_benchmark(args) -> dict:
+    set_search_backend(SyntheticSearchBackend(SyntheticLatency(args.search_latency, args.search_jitter)))
+    prefetcher.enabled = args.prefetch
+    if not args.warm_cache:
+        search_cache.clear()
+    metrics.reset()
+
+    # One response cache shared by every session, like the process-wide cache in the app
+    args.llm_cache = LLMResponseCache() if args.llm_cache else None
+    timer = NodeTimer()
+    if args.trace_allocations:
+        tracemalloc.start()
+    started = time.perf_counter()
+    if args.use_async:
+        session_turns = asyncio.run(arun_sessions(args, timer))
+    else:
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            session_turns = list(pool.map(lambda session: run_session(session, args, timer), range(args.sessions)))
+    wall = time.perf_counter() - started
+
+    memory = {}
+    if args.trace_allocations:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory = {"traced_current_bytes": current, "traced_peak_bytes": peak,
+                  "traced_current_bytes_per_session": current / args.sessions}
+
+    turns = [turn for session in session_turns for turn in session]
+    by_kind, first_tokens = {}, {}
+    for kind, seconds, first_token in turns:
+        by_kind.setdefault(kind, []).append(seconds)
+        if first_token is not None:
+            first_tokens.setdefault(kind, []).append(first_token)
+    node_total = sum(sum(samples) for samples in timer.samples.values())
+    nodes = {
+        key: {**summarize(samples), "total_s": sum(samples),
+              "share": sum(samples) / node_total if node_total else 0.0}
+        for key, samples in sorted(timer.samples.items())
+    }
+    return {
+        "config": vars(args) | {"baseline": None, "output": None, "llm_cache": args.llm_cache is not None},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "turns": summarize([seconds for _, seconds, _ in turns]),
+        "by_kind": {kind: summarize(samples) for kind, samples in by_kind.items()},
+        "first_token": {kind: summarize(samples) for kind, samples in first_tokens.items()},
+        "nodes": nodes,
+        "throughput": {"sessions": args.sessions, "turns": len(turns), "wall_s": wall,
+                       "turns_per_s": len(turns) / wall if wall else 0.0},
+        "memory": memory,
+        "search_cache": search_cache.stats(),
+        "singleflight": search_singleflight.stats(),
+        "prefetch": prefetcher.stats(),
+        "llm_cache": args.llm_cache.stats() if args.llm_cache else None,
+        "metrics": metrics.snapshot(),
+    }
+
+
+def compare(baseline: dict, current: dict) -> list:
+    """Lines describing relative changes of headline metrics against a baseline run."""
+    lines = []
+    metrics = [("turns", "p50_ms"), ("turns", "p95_ms"), ("turns", "p99_ms"), ("throughput", "turns_per_s")]
+    metrics += [("nodes", node) for node in current.get("nodes", {})]
+    metrics += [("first_token", kind) for kind in current.get("first_token", {})]
+    for section, name in metrics:
+        old, new = baseline.get(section, {}).get(name), current.get(section, {}).get(name)
+        if isinstance(new, dict):
+            old, new, name = (old or {}).get("mean_ms"), new.get("mean_ms"), f"{name} mean_ms"
+        if not old or new is None:
+            continue
+        lines.append(f"{section}.{name}: {old:.3f} -> {new:.3f} ({(new - old) / old:+.1%})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=len(SCRIPT), help=f"turns per session (max {len(SCRIPT)})")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="synthetic seconds per LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.0)
+    parser.add_argument("--search-latency", type=float, default=0.0, help="synthetic seconds per search")
+    parser.add_argument("--search-jitter", type=float, default=0.0)
+    parser.add_argument("--itinerary-chars", type=int, default=6000)
+    parser.add_argument("--shared-route", action="store_true", help="all sessions search the same route and dates")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the search cache from earlier runs")
+    parser.add_argument("--prefetch", action="store_true", help="enable speculative prefetch")
+    parser.add_argument("--llm-cache", action="store_true", help="share an LLM response cache between sessions")
+    parser.add_argument("--stream", action="store_true", help="use process_message_stream and report time to first token")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="run every session on one event loop with aprocess_message")
+    parser.add_argument("--trace-allocations", action="store_true", help="track allocations with tracemalloc (slower)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    text = json.dumps(results, indent=2, default=str)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print("\n".join(compare(baseline, results)))
+
+
+if __name__ == "__main__":
+    main()
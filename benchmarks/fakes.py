@@ -0,0 +1,243 @@
+# Fake LLM and search backends for offline benchmarking
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from utils.backends import SyntheticLatency
+from utils.cache import make_cache_key
+
+AIRLINES = ["IndiGo", "Air India", "Vistara", "SpiceJet", "Akasa Air"]
+AMENITIES = ["Free Wi-Fi", "Pool", "Spa", "Beach access", "Fitness centre", "Restaurant",
+             "Room service", "Airport shuttle", "Free parking", "Kid-friendly", "Bar", "Air conditioning"]
+STREAM_CHUNK_CHARS = 80     # characters per streamed chunk, roughly 20 tokens
+FIRST_TOKEN_SHARE = 0.1     # share of the synthetic latency spent before the first streamed chunk
+PLACES = ["Baga Beach", "Calangute Beach", "Fort Aguada", "Anjuna Flea Market", "Dabolim Airport"]
+
+
+def _rng(params: dict) -> random.Random:
+    seed = hashlib.sha256(make_cache_key(params).encode("utf-8")).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def fake_flights(params: dict, offers: int = 12) -> dict:
+    """Deterministic google_flights-shaped response for the given parameters."""
+    rng = _rng(params)
+    date = params.get("outbound_date", "2025-12-10")
+    flights = []
+    for idx in range(offers):
+        stops = rng.choice([0, 0, 1, 1, 2])
+        legs, layovers, total = [], [], 0
+        hour = rng.randint(0, 20)
+        for leg_idx in range(stops + 1):
+            duration = rng.randint(60, 180)
+            total += duration
+            legs.append({
+                "departure_airport": {"name": f"Airport {leg_idx}", "id": params.get("departure_id", "DEL") if leg_idx == 0 else "BOM",
+                                      "time": f"{date} {hour:02d}:{rng.randint(0, 59):02d}"},
+                "arrival_airport": {"name": f"Airport {leg_idx + 1}", "id": params.get("arrival_id", "GOI") if leg_idx == stops else "BOM",
+                                    "time": f"{date} {min(hour + 2, 23):02d}:{rng.randint(0, 59):02d}"},
+                "duration": duration,
+                "airplane": "Airbus A320neo",
+                "airline": rng.choice(AIRLINES),
+                "airline_logo": "https://www.gstatic.com/flights/airline_logos/70px/6E.png",
+                "travel_class": "Economy",
+                "flight_number": f"6E {rng.randint(100, 9999)}",
+                "legroom": "29 in",
+                "extensions": ["Average legroom (29 in)", "Carbon emissions estimate: 98 kg"],
+            })
+            if leg_idx < stops:
+                layover = rng.randint(45, 600)
+                total += layover
+                layovers.append({"duration": layover, "name": "Chhatrapati Shivaji Maharaj International Airport",
+                                 "id": "BOM", "overnight": layover > 480})
+        flights.append({
+            "flights": legs,
+            "layovers": layovers,
+            "total_duration": total,
+            "carbon_emissions": {"this_flight": 98000, "typical_for_this_route": 101000},
+            "price": rng.randint(3000, 15000),
+            "type": "One way",
+            "airline_logo": "https://www.gstatic.com/flights/airline_logos/70px/multi.png",
+            "departure_token": hashlib.sha1(f"{idx}{date}".encode()).hexdigest() * 4,
+        })
+    return {"best_flights": flights[:3], "other_flights": flights[3:]}
+
+
+def fake_hotels(params: dict, properties: int = 20) -> dict:
+    """Deterministic google_hotels-shaped response for the given parameters."""
+    rng = _rng(params)
+    hotels = []
+    for idx in range(properties):
+        price = rng.randint(1500, 20000)
+        hotels.append({
+            "type": "hotel",
+            "name": f"Hotel {idx} {rng.choice(['Sea View', 'Palms', 'Residency', 'Grand'])}",
+            "link": f"https://example.com/hotel/{idx}",
+            "property_token": hashlib.sha1(str(idx).encode()).hexdigest(),
+            "serpapi_property_details_link": f"https://serpapi.com/search.json?engine=google_hotels&property_token={idx}",
+            "gps_coordinates": {"latitude": 15.5 + rng.uniform(-0.2, 0.2), "longitude": 73.8 + rng.uniform(-0.1, 0.1)},
+            "check_in_time": "2:00 PM",
+            "check_out_time": "11:00 AM",
+            "rate_per_night": {"lowest": f"₹{price:,}", "extracted_lowest": price,
+                               "before_taxes_fees": f"₹{int(price * 0.85):,}"},
+            "total_rate": {"lowest": f"₹{price * 4:,}", "extracted_lowest": price * 4},
+            "prices": [{"source": "Booking.com", "logo": "https://www.gstatic.com/images/branding/product/1x/hotel_48dp.png",
+                        "num_guests": int(params.get("adults", 2)), "rate_per_night": {"lowest": f"₹{price:,}"}}],
+            "nearby_places": [
+                {"name": place, "transportations": [{"type": "Taxi", "duration": f"{rng.randint(3, 40)} min"},
+                                                    {"type": "Walking", "duration": f"{rng.randint(5, 90)} min"}]}
+                for place in rng.sample(PLACES, 3)
+            ],
+            "hotel_class": f"{rng.randint(2, 5)}-star hotel",
+            "extracted_hotel_class": rng.randint(2, 5),
+            "images": [{"thumbnail": f"https://example.com/t/{idx}/{n}.jpg", "original_image": f"https://example.com/o/{idx}/{n}.jpg"}
+                       for n in range(8)],
+            "overall_rating": round(rng.uniform(3.2, 4.9), 1),
+            "reviews": rng.randint(40, 9000),
+            "location_rating": round(rng.uniform(2.5, 5.0), 1),
+            "amenities": rng.sample(AMENITIES, 8),
+            "excluded_amenities": ["No pets", "No smoking"],
+            "essential_info": ["Entire hotel", "Sleeps 4"],
+        })
+    return {"properties": hotels}
+
+
+class SyntheticSearchBackend:
+    """Search backend returning generated SerpAPI payloads after a synthetic delay."""
+
+    requires_api_key = False
+
+    def __init__(self, latency: SyntheticLatency = None):
+        self.latency = latency or SyntheticLatency()
+        self.calls = 0
+
+    def _respond(self, params: dict) -> dict:
+        self.calls += 1
+        if params.get("engine") == "google_hotels":
+            return fake_hotels(params)
+        return fake_flights(params)
+
+    def search(self, params: dict) -> dict:
+        self.latency.sleep()
+        return self._respond(params)
+
+    async def asearch(self, params: dict) -> dict:
+        await self.latency.asleep()
+        return self._respond(params)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Fake Gemini that walks through a fixed conversation.
+
+    Preferences phase: "continue" for the first user message, "confirm" with a
+    draft after a "continue" and "end" after a "confirm". Itinerary phase: a new user
+    message triggers flight and hotel tool calls; tool results trigger an
+    itinerary of itinerary_chars characters.
+    """
+
+    preferences: dict
+    itinerary_chars: int = 6000
+    latency: Any = None
+    _ids: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "tripforge-scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=list(tools), **kwargs)
+
+    def _tool_calls(self) -> list:
+        if self._ids is None:
+            self._ids = itertools.count()
+        prefs = self.preferences
+        travellers = {"adults": prefs["adults"], "children": prefs["children"]}
+        calls = [
+            ("search_flights", {"departure_city": prefs["departure_city"], "arrival_city": prefs["arrival_city"],
+                                "departure_date": prefs["departure_date"], **travellers}),
+            ("search_flights", {"departure_city": prefs["arrival_city"], "arrival_city": prefs["departure_city"],
+                                "departure_date": prefs["return_date"], **travellers}),
+            ("search_hotels", {"query": f"{prefs['city']} hotels", "check_in_date": prefs["departure_date"],
+                               "check_out_date": prefs["return_date"], **travellers}),
+        ]
+        return [{"name": name, "args": args, "id": f"call_{next(self._ids)}"} for name, args in calls]
+
+    def _respond(self, messages, tools) -> AIMessage:
+        if tools is None:
+            # The preferences graph sends only the last exchange, so the script follows the last reply's state
+            replies = [message for message in messages if isinstance(message, AIMessage)]
+            last_state = json.loads(replies[-1].content).get("state") if replies else None
+            if last_state is None:
+                first = {name: self.preferences[name] for name in ("arrival_city", "adults", "children", "interests")}
+                payload = {"state": "continue", "question": "Where are you flying from?", "slots": first}
+            elif last_state == "continue":
+                payload = {"state": "confirm", "question": "Shall I lock this in?", "preferences": self.preferences,
+                           "slots": self.preferences}
+            else:
+                payload = {"state": "end", "filename": "bench-preferences.txt", "preferences": self.preferences}
+            return AIMessage(content=json.dumps(payload))
+        if isinstance(messages[-1], HumanMessage):
+            return AIMessage(content="", tool_calls=self._tool_calls())
+        tool_text = sum(len(message.content) for message in messages if isinstance(message, ToolMessage))
+        body = f"Day 1: Beaches and sunsets (based on {tool_text} chars of search results)\n"
+        return AIMessage(content=(body * (self.itinerary_chars // len(body) + 1))[:self.itinerary_chars])
+
+    def _with_usage(self, messages, response: AIMessage) -> AIMessage:
+        # Rough 4-characters-per-token usage, so token metrics move like the real model's
+        prompt = sum(len(str(message.content)) for message in messages) // 4
+        completion = len(str(response.content)) // 4 + 20 * len(response.tool_calls)
+        response.usage_metadata = {"input_tokens": prompt, "output_tokens": completion, "total_tokens": prompt + completion}
+        return response
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency is not None:
+            self.latency.sleep()
+        return ChatResult(generations=[ChatGeneration(message=self._with_usage(messages, self._respond(messages, kwargs.get("tools"))))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency is not None:
+            await self.latency.asleep()
+        return ChatResult(generations=[ChatGeneration(message=self._with_usage(messages, self._respond(messages, kwargs.get("tools"))))])
+
+    def _stream_chunks(self, messages, tools) -> list:
+        """(seconds to wait first, chunk) pairs: same total latency as _generate, but the first chunk arrives early."""
+        response = self._with_usage(messages, self._respond(messages, tools))
+        delay = self.latency.next() if self.latency is not None else 0.0
+        text = response.content
+        pieces = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)] or [""]
+        tool_call_chunks = [{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": idx}
+                            for idx, call in enumerate(response.tool_calls)]
+        chunks = []
+        for idx, piece in enumerate(pieces):
+            if idx:
+                wait = delay * (1 - FIRST_TOKEN_SHARE) / (len(pieces) - 1)
+            else:
+                wait = delay * FIRST_TOKEN_SHARE if len(pieces) > 1 else delay
+            last = idx == len(pieces) - 1
+            chunk = AIMessageChunk(content=piece, tool_call_chunks=tool_call_chunks if last else [],
+                                   usage_metadata=response.usage_metadata if last else None)
+            chunks.append((wait, ChatGenerationChunk(message=chunk)))
+        return chunks
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for wait, chunk in self._stream_chunks(messages, kwargs.get("tools")):
+            time.sleep(wait)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for wait, chunk in self._stream_chunks(messages, kwargs.get("tools")):
+            await asyncio.sleep(wait)
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
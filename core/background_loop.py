@@ -0,0 +1,55 @@
+# Event loop on a daemon thread that runs the sync API's turns, so every session shares one loop
+import asyncio
+import threading
+
+
+class BackgroundLoop:
+    """
+    An asyncio event loop running on its own daemon thread, started on first use.
+
+    Sync callers submit coroutines and block on the result; the coroutines of
+    all callers interleave on the one loop, so waiting on the model or a
+    search never holds a thread per conversation.
+    """
+
+    def __init__(self, name: str = "tripforge-loop"):
+        self.name = name
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name=self.name, daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop; returns a concurrent.futures.Future (cancel() cancels the task)."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """
+        Run a coroutine on the loop and wait for its result.
+
+        If the waiting thread is interrupted (e.g. Streamlit stops the script
+        run), the coroutine is cancelled instead of being left running.
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and running is self._loop:
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run() called from its own loop; await the coroutine instead")
+        future = self.submit(coro)
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+
+agent_loop = BackgroundLoop()
@@ -1,37 +1,227 @@
+import asyncio
+import queue
 import sys
+import threading
+import time
+import uuid
+import weakref
 from pathlib import Path
 
 # Add parent directory to path to import from original modules
 parent_dir = Path(__file__).parent.parent
 sys.path.append(str(parent_dir))
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from graphs.preferences_graph import get_preferences_graph
-from graphs.itinerary_graph import create_itinerary_graph
-from utils.tools import tools
-from langchain_core.messages import HumanMessage
+from core.background_loop import agent_loop
+from core.registry import runtime_registry
+from core.checkpoints import SESSION_IDLE_SECONDS, SESSIONS_EVICTED, SESSIONS_RESUMED, default_checkpointer, is_durable
+from utils.prefetch import prefetcher
+from utils.metrics import TURN_FIRST_TOKEN_SECONDS, track_turn
+from utils.rate_limiter import search_priority
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage
+from langchain_core.output_parsers import JsonOutputParser
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Agents alive in this process, swept for idle sessions at the start of every turn
+_live_agents = weakref.WeakSet()
+
+
+def evict_idle_sessions(max_idle: float = None) -> int:
+    """
+    Drop the in-memory state of sessions idle for longer than max_idle seconds.
+
+    Only sessions backed by a durable checkpointer are evicted; their state
+    is reloaded from it on the next message.
+
+    Args:
+        max_idle: Idle seconds before eviction (default: TRIPFORGE_SESSION_IDLE_SECONDS or 1800)
+
+    Returns:
+        Number of sessions evicted
+    """
+    cutoff = time.monotonic() - (SESSION_IDLE_SECONDS if max_idle is None else max_idle)
+    return sum(agent.evict() for agent in list(_live_agents) if agent.last_active < cutoff)
+
+
 class TripForgeChatAgent:
     """
     Streamlit-compatible wrapper for the TripForge LangGraph agent.
     Uses the original separate graphs with proper state management.
     """
     
-    def __init__(self):
-        """Initialize the chat agent with LLM and separate graphs"""
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
-        self.preferences_graph = get_preferences_graph(self.llm)
-        self.itinerary_graph = create_itinerary_graph(self.llm.bind_tools(tools))
+    def __init__(self, llm=None, callbacks: list = None, session_id: str = None, checkpointer=None):
+        """
+        Initialize the chat agent with LLM and separate graphs
+
+        Args:
+            llm: Chat model to use (default: the process-wide create_llm() model,
+                i.e. Gemini or the record/replay backend selected by
+                TRIPFORGE_LLM_BACKEND, with graphs shared by all such sessions)
+            callbacks: LangChain callback handlers attached to every graph run
+            session_id: ID of the conversation; pass an earlier session's ID to
+                resume it from the checkpointer (default: a new ID)
+            checkpointer: LangGraph checkpointer for both graphs (default: the
+                process-wide one from TRIPFORGE_CHECKPOINT_SQLITE_PATH, if set)
+        """
+        self.callbacks = callbacks or []
+        self.checkpointer = checkpointer if checkpointer is not None else default_checkpointer
+        # Compiled graphs are stateless; the session only owns agent_state
+        runtime = runtime_registry.get(llm, self.checkpointer)
+        self.llm = runtime.llm
+        self.preferences_graph = runtime.preferences_graph
+        self.itinerary_graph = runtime.itinerary_graph
         self.agent_state = {}
         self.is_initialized = False
         self.current_phase = "preferences"
+        self.session_id = session_id or uuid.uuid4().hex
+        # Existing sessions are loaded from the checkpointer on first use
+        self._loaded = session_id is None
+        self._lock = threading.Lock()
+        self.last_active = time.monotonic()
+        _live_agents.add(self)
     
+    def _run_config(self, phase: str = None, **config) -> dict:
+        """Build the graph run config, attaching the agent's callback handlers and the phase's checkpoint thread."""
+        if self.callbacks:
+            config['callbacks'] = self.callbacks
+        if self.checkpointer is not None and phase:
+            config['configurable'] = {'thread_id': f"{self.session_id}:{phase}"}
+        return config
+
+    async def _acquire(self) -> None:
+        # A threading lock, since eviction runs on other sessions' turns; polled so a busy session never blocks the loop
+        while not self._lock.acquire(blocking=False):
+            await asyncio.sleep(0.01)
+
+    async def _aensure_loaded(self) -> None:
+        """Reload the state of a resumed or evicted session from the checkpointer."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.checkpointer is None:
+            return
+        # The itinerary thread only exists once preferences are complete
+        for phase, graph in (("itinerary", self.itinerary_graph), ("preferences", self.preferences_graph)):
+            values = (await graph.aget_state(self._run_config(phase))).values
+            if values:
+                self.agent_state = dict(values)
+                self.is_initialized = True
+                self.current_phase = phase
+                SESSIONS_RESUMED.inc(phase=phase)
+                return
+
+    async def _arollback(self, snapshot: tuple) -> None:
+        """Put the session back to how it was before an abandoned turn, in memory and in the checkpointer."""
+        state, messages, initialized, phase = snapshot
+        known_ids = {message.id for message in messages if message.id}
+        self.agent_state = {**state, 'messages': messages} if state else {}
+        self.is_initialized, self.current_phase = initialized, phase
+        if self.checkpointer is None:
+            return
+        for thread_phase, graph, existed, as_node in (
+            ("preferences", self.preferences_graph, initialized, "start"),
+            ("itinerary", self.itinerary_graph, phase == "itinerary", "start_itinerary"),
+        ):
+            config = self._run_config(thread_phase)
+            if not existed:
+                await self.checkpointer.adelete_thread(config['configurable']['thread_id'])
+                continue
+            values = (await graph.aget_state(config)).values
+            stale = [RemoveMessage(id=message.id) for message in values.get('messages', []) if message.id not in known_ids]
+            if stale:
+                await graph.aupdate_state(config, {'messages': stale}, as_node=as_node)
+
+    def evict(self) -> bool:
+        """
+        Drop the in-memory conversation state; the next message reloads it.
+
+        Returns:
+            True if evicted; False without a durable checkpointer or while a turn is running
+        """
+        if not is_durable(self.checkpointer) or not self._loaded or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self.agent_state = {}
+            self.is_initialized = False
+            self.current_phase = "preferences"
+            self._loaded = False
+        finally:
+            self._lock.release()
+        SESSIONS_EVICTED.inc()
+        return True
+
+    def transcript(self) -> list:
+        """
+        The conversation as shown to the user, rebuilt from the agent state.
+
+        Used to redraw a resumed session. Prompts written by the agent itself
+        (the itinerary request) and tool traffic are left out; preferences
+        replies show their question.
+
+        Returns:
+            List of {'role': 'user' | 'assistant', 'content': str}
+        """
+        messages = agent_loop.run(self._amessages())
+        parser = JsonOutputParser()
+        entries = []
+        for i, message in enumerate(messages):
+            if isinstance(message, HumanMessage):
+                # A request right after a later system prompt starts the itinerary phase and was not typed by the user
+                if i > 1 and isinstance(messages[i - 1], SystemMessage):
+                    continue
+                entries.append({'role': 'user', 'content': message.content})
+            elif isinstance(message, AIMessage) and not message.tool_calls and message.content:
+                try:
+                    parsed = parser.parse(message.content)
+                except Exception:
+                    parsed = None
+                if not isinstance(parsed, dict) or 'state' not in parsed:
+                    entries.append({'role': 'assistant', 'content': message.content})
+                elif parsed.get('question'):
+                    entries.append({'role': 'assistant', 'content': parsed['question']})
+        return entries
+
+    async def _amessages(self) -> list:
+        await self._acquire()
+        try:
+            await self._aensure_loaded()
+            return list(self.agent_state.get('messages', []))
+        finally:
+            self._lock.release()
+
+    async def _arun_itinerary(self, config: dict, on_event=None) -> dict:
+        """
+        Run the itinerary graph on the agent state and return the final graph state.
+
+        With on_event the reply is streamed: on_event(("token", text)) is called
+        as the model writes its reply and on_event(("status", text)) when the
+        model turns to tool calls instead. The final state is the same either way.
+        """
+        if on_event is None:
+            return await self.itinerary_graph.ainvoke(self.agent_state, config=config)
+        result = None
+        async for mode, payload in self.itinerary_graph.astream(self.agent_state, config=config,
+                                                                stream_mode=["messages", "values"]):
+            if mode == "values":
+                result = payload
+                if payload.get('next_action') == 'tool_node':
+                    names = [call['name'].replace('_', ' ') for call in payload['messages'][-1].tool_calls]
+                    on_event(("status", f"Looking up: {', '.join(dict.fromkeys(names))}..."))
+                continue
+            message, metadata = payload
+            # Only the model's reply is streamed; tool results and prompts also pass through this mode
+            if metadata.get('langgraph_node') != 'invoke_llm' or not isinstance(message, AIMessage):
+                continue
+            if isinstance(message.content, str) and message.content:
+                on_event(("token", message.content))
+        return result
+
     def process_message(self, user_input: str) -> tuple[str, dict]:
         """
         Process a user message through the appropriate LangGraph workflow.
+
+        Runs aprocess_message on the shared background event loop and waits for it.
         
         Args:
             user_input: The user's message (empty string for initialization)
@@ -39,16 +229,114 @@ class TripForgeChatAgent:
         Returns:
             tuple: (agent_response, updated_state)
         """
+        return agent_loop.run(self.aprocess_message(user_input))
+
+    def process_message_stream(self, user_input: str):
+        """
+        Streaming variant of process_message for incremental rendering.
+
+        Itinerary replies are streamed as the model generates them; preferences
+        replies are short JSON documents and only arrive with the final event.
+        The final response and state are the same as process_message's. Closing
+        the generator before the "done" event abandons the turn (see aprocess_message).
+
+        Args:
+            user_input: The user's message
+
+        Yields:
+            ("token", text): the next piece of the reply
+            ("status", text): the model is calling tools; replaces any text streamed so far
+            ("done", (agent_response, updated_state)): always the last event
+        """
+        started = time.perf_counter()
+        first_token = True
+        # Events are handed over through a thread-safe queue rather than one loop round trip per token
+        events = queue.SimpleQueue()
+        turn = agent_loop.submit(self._alocked_turn(user_input, events.put))
+        turn.add_done_callback(lambda _: events.put(None))
+        try:
+            while (event := events.get()) is not None:
+                if event[0] == "token" and first_token:
+                    TURN_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, graph="itinerary_graph")
+                    first_token = False
+                yield event
+            yield "done", turn.result()
+        finally:
+            turn.cancel()
+
+    async def aprocess_message(self, user_input: str) -> tuple[str, dict]:
+        """
+        Async process_message: graphs, model calls and searches are awaited, so
+        many conversations can share one event loop.
+
+        Cancelling the call abandons the turn: the user's message and anything
+        the graphs produced for it are dropped from the session (and its
+        checkpoints), as if the message had never been sent.
+
+        Args:
+            user_input: The user's message
+
+        Returns:
+            tuple: (agent_response, updated_state)
+        """
+        return await self._alocked_turn(user_input)
+
+    async def aprocess_message_stream(self, user_input: str):
+        """
+        Async variant of process_message_stream, yielding the same events.
+
+        Closing the generator (aclose) before the "done" event cancels the turn
+        like cancelling aprocess_message.
+        """
+        started = time.perf_counter()
+        first_token = True
+        events = asyncio.Queue()
+        turn = asyncio.create_task(self._alocked_turn(user_input, events.put_nowait))
+        turn.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                if event[0] == "token" and first_token:
+                    TURN_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, graph="itinerary_graph")
+                    first_token = False
+                yield event
+            yield "done", turn.result()
+        finally:
+            if not turn.done():
+                turn.cancel()
+                await asyncio.gather(turn, return_exceptions=True)
+
+    async def _alocked_turn(self, user_input: str, on_event=None) -> tuple[str, dict]:
+        """Run _aturn with the session loaded and protected from eviction, then sweep idle sessions."""
+        await self._acquire()
+        try:
+            await self._aensure_loaded()
+            # The session before this message, restored if the turn is abandoned
+            snapshot = (dict(self.agent_state), list(self.agent_state.get('messages', [])),
+                        self.is_initialized, self.current_phase)
+            try:
+                result = await self._aturn(user_input, on_event)
+            except asyncio.CancelledError:
+                await self._arollback(snapshot)
+                raise
+        finally:
+            self.last_active = time.monotonic()
+            self._lock.release()
+        evict_idle_sessions()
+        return result
+
+    async def _aturn(self, user_input: str, on_event=None) -> tuple[str, dict]:
+        """Shared body of every process_message variant; returns (agent_response, updated_state)."""
         try:
             # If we have user input, process it
             if user_input and user_input.strip():
                 # Initialize the preferences graph if this is the first user input
                 if not self.is_initialized:
                     # Start with preferences graph using the actual user input
-                    result = self.preferences_graph.invoke({
-                        'user_input': user_input,
-                        'first_message': True
-                    })
+                    with track_turn("preferences_graph"):
+                        result = await self.preferences_graph.ainvoke({
+                            'user_input': user_input,
+                            'first_message': True
+                        }, config=self._run_config("preferences"))
                     self.agent_state = result
                     self.is_initialized = True
                     self.current_phase = "preferences"
@@ -69,22 +357,28 @@ class TripForgeChatAgent:
                     self.agent_state['next_action'] = 'invoke_llm'
                     
                     # Continue with preferences graph
-                    result = self.preferences_graph.invoke(self.agent_state)
+                    with track_turn("preferences_graph"):
+                        result = await self.preferences_graph.ainvoke(self.agent_state, config=self._run_config("preferences"))
                     self.agent_state = result
                     
                     # Check if preferences are complete
                     if self.agent_state.get('preferences') and self.agent_state.get('next_action') == 'start_itinerary':
                         # Transition to itinerary phase
                         self.current_phase = "itinerary"
+                        # Make sure the final preferences' searches are warm (stale drafts are cancelled)
+                        prefetcher.prefetch(self.session_id, self.agent_state['preferences'])
                         
                         # Start itinerary graph with preferences
                         self.agent_state['next_action'] = 'start'
-                        itinerary_result = self.itinerary_graph.invoke(self.agent_state)
+                        with track_turn("itinerary_graph"):
+                            itinerary_result = await self._arun_itinerary(self._run_config("itinerary"), on_event)
                         self.agent_state.update(itinerary_result)
                         
                         return self.agent_state.get('llm_response', 'Here is your itinerary!'), self.agent_state
                     
-                    # Still in preferences phase
+                    # Still in preferences phase; start likely searches while the user reviews the draft
+                    if self.agent_state.get('draft_preferences'):
+                        prefetcher.prefetch(self.session_id, self.agent_state['draft_preferences'])
                     return self.agent_state.get('llm_response', 'Please tell me more.'), self.agent_state
                 
                 elif self.current_phase == "itinerary":
@@ -92,7 +386,9 @@ class TripForgeChatAgent:
                     self.agent_state['next_action'] = 'invoke_llm'
                     
                     # Continue with itinerary graph - user can ask further questions
-                    result = self.itinerary_graph.invoke(self.agent_state, config={"recursion_limit": 100})
+                    # Follow-up searches queue behind first-itinerary searches of other sessions
+                    with track_turn("itinerary_graph"), search_priority("refinement"):
+                        result = await self._arun_itinerary(self._run_config("itinerary", recursion_limit=100), on_event)
                     self.agent_state.update(result)
                     
                     # Return the response - no completion check, keep it open-ended
@@ -114,6 +410,10 @@ class TripForgeChatAgent:
     
     def reset_conversation(self):
         """Reset the conversation state"""
+        prefetcher.discard(self.session_id)
+        if self.checkpointer is not None:
+            for phase in ("preferences", "itinerary"):
+                self.checkpointer.delete_thread(f"{self.session_id}:{phase}")
         self.agent_state = {}
         self.is_initialized = False
         self.current_phase = "preferences"
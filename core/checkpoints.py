@@ -0,0 +1,105 @@
+# Checkpoint storage for conversation state, so sessions survive restarts and can leave memory when idle
+import asyncio
+import sqlite3
+import warnings
+from typing import Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+
+from utils.config import env_bool, env_float, env_str
+from utils.metrics import metrics
+
+# Sessions idle for longer than this drop their in-memory state; the next message reloads it from the checkpointer
+SESSION_IDLE_SECONDS = env_float("TRIPFORGE_SESSION_IDLE_SECONDS", 30 * 60)
+
+SESSIONS_EVICTED = metrics.counter(
+    "tripforge_sessions_evicted_total", "Idle sessions whose state was dropped from memory.")
+SESSIONS_RESUMED = metrics.counter(
+    "tripforge_sessions_resumed_total", "Sessions whose state was reloaded from the checkpointer.", ("phase",))
+
+
+def _threaded_sqlite_saver(path: str) -> BaseCheckpointSaver:
+    """
+    SqliteSaver whose async methods run the sync ones on a worker thread.
+
+    The stock SqliteSaver only implements the sync API and the async saver
+    is tied to the event loop it was created on; the agent awaits its graphs
+    from any loop, so writes go through a thread instead.
+    """
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    class ThreadedSqliteSaver(SqliteSaver):
+        async def aget_tuple(self, config):
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config, *, filter=None, before=None, limit=None):
+            for item in await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+                yield item
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config, writes, task_id, task_path=""):
+            return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id):
+            return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    return ThreadedSqliteSaver(sqlite3.connect(path, check_same_thread=False))
+
+
+class CheckpointerUnavailable(RuntimeError):
+    """Raised when durable checkpoints are configured but their package is not installed."""
+
+
+def create_checkpointer(sqlite_path: Optional[str] = None,
+                        allow_memory_fallback: Optional[bool] = None) -> Optional[BaseCheckpointSaver]:
+    """
+    Create the checkpointer both graphs are compiled with.
+
+    With a SQLite path (argument or TRIPFORGE_CHECKPOINT_SQLITE_PATH) state is
+    saved there after every node, using the langgraph-checkpoint-sqlite
+    package. If that package is missing this raises, rather than quietly
+    losing every conversation on restart, unless the in-memory fallback is
+    allowed; in-memory checkpoints survive Streamlit reruns but not restarts.
+    Without a path there is no checkpointer and sessions keep their state in
+    memory only, as before.
+
+    Args:
+        sqlite_path: Database file (default: TRIPFORGE_CHECKPOINT_SQLITE_PATH)
+        allow_memory_fallback: Use in-memory checkpoints, with a warning, when the package is missing
+            (default: TRIPFORGE_CHECKPOINT_ALLOW_MEMORY_FALLBACK)
+
+    Returns:
+        A checkpoint saver, or None when checkpointing is disabled
+
+    Raises:
+        CheckpointerUnavailable: A path is set, the package is missing and the fallback is not allowed
+    """
+    path = sqlite_path or env_str("TRIPFORGE_CHECKPOINT_SQLITE_PATH")
+    if not path:
+        return None
+    try:
+        return _threaded_sqlite_saver(path)
+    except ImportError as e:
+        if allow_memory_fallback is None:
+            allow_memory_fallback = env_bool("TRIPFORGE_CHECKPOINT_ALLOW_MEMORY_FALLBACK")
+        if not allow_memory_fallback:
+            raise CheckpointerUnavailable(
+                f"Checkpoints are configured at {path}, but langgraph-checkpoint-sqlite is not installed. "
+                "Install it (see requirements.txt), or set TRIPFORGE_CHECKPOINT_ALLOW_MEMORY_FALLBACK=1 "
+                "to keep checkpoints in memory only."
+            ) from e
+        warnings.warn(f"langgraph-checkpoint-sqlite is not installed; checkpoints for {path} are kept in memory "
+                      "and lost on restart", RuntimeWarning, stacklevel=2)
+        return InMemorySaver()
+
+
+def is_durable(checkpointer: Optional[BaseCheckpointSaver]) -> bool:
+    """True when the checkpointer keeps state outside this process, so in-memory state can be dropped."""
+    return checkpointer is not None and not isinstance(checkpointer, InMemorySaver)
+
+
+# Process-wide so every session writes to the same database connection (None when disabled)
+default_checkpointer = create_checkpointer()
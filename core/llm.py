@@ -0,0 +1,143 @@
+# LLM construction for TripForge, with record/replay stand-ins for offline runs
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict
+
+from utils.backends import CASSETTE_DIR, Cassette, SyntheticLatency, replay_latency_from_env
+from utils.config import env_str
+from utils.llm_cache import llm_response_cache
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+
+def _tool_name(tool) -> str:
+    if isinstance(tool, dict):
+        return tool.get("name") or tool.get("function", {}).get("name", "")
+    return getattr(tool, "name", getattr(tool, "__name__", str(tool)))
+
+
+def messages_key(messages: list, tools: Optional[list] = None) -> str:
+    """
+    Stable hash of a conversation and the bound tool names.
+
+    Message IDs and provider metadata are ignored; type, content, tool calls
+    and tool call IDs are what make two requests equivalent.
+    """
+    canonical = []
+    for message in messages:
+        entry = {"type": message.type, "content": message.content}
+        if getattr(message, "tool_calls", None):
+            entry["tool_calls"] = [[call["name"], call["args"]] for call in message.tool_calls]
+        if getattr(message, "tool_call_id", None):
+            entry["tool_call_id"] = message.tool_call_id
+        canonical.append(entry)
+    payload = {"messages": canonical, "tools": sorted(_tool_name(tool) for tool in tools or [])}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class RecordingChatModel(BaseChatModel):
+    """Calls a real chat model and records each response into a cassette."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: Any
+    cassette: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "tripforge-recording"
+
+    def bind_tools(self, tools, **kwargs):
+        # Tools are forwarded to the inner model on every call
+        return self.bind(tools=list(tools), **kwargs)
+
+    def _model_for(self, tools):
+        return self.inner.bind_tools(tools) if tools else self.inner
+
+    def _record(self, messages, tools, response) -> ChatResult:
+        self.cassette.append({"key": messages_key(messages, tools), "response": message_to_dict(response)})
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tools = kwargs.pop("tools", None)
+        response = self._model_for(tools).invoke(messages, stop=stop, **kwargs)
+        return self._record(messages, tools, response)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tools = kwargs.pop("tools", None)
+        response = await self._model_for(tools).ainvoke(messages, stop=stop, **kwargs)
+        return self._record(messages, tools, response)
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Replays recorded chat responses deterministically, without network access.
+
+    Requests are matched on messages_key(); unknown requests (e.g. a prompt
+    containing a different date) take the next unused response in recording
+    order.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    cassette: Any
+    latency: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "tripforge-replay"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=list(tools), **kwargs)
+
+    def _replay(self, messages, tools):
+        interaction = self.cassette.find(messages_key(messages, tools))
+        if interaction is None:
+            raise ValueError(f"LLM cassette {self.cassette.path} has no more recorded responses")
+        return ChatResult(generations=[ChatGeneration(message=messages_from_dict([interaction["response"]])[0])])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency is not None:
+            self.latency.sleep()
+        return self._replay(messages, kwargs.get("tools"))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency is not None:
+            await self.latency.asleep()
+        return self._replay(messages, kwargs.get("tools"))
+
+
+def create_llm(model: str = DEFAULT_MODEL, backend: Optional[str] = None, latency: Optional[SyntheticLatency] = None,
+               cache=None):
+    """
+    Build the chat model used by TripForgeChatAgent.
+
+    Args:
+        model: Gemini model name
+        backend: "live", "record" or "replay" (default: TRIPFORGE_LLM_BACKEND or "live")
+        latency: Synthetic latency for replay (default: TRIPFORGE_REPLAY_LATENCY/JITTER)
+        cache: Response cache for the model (default: the shared LLMResponseCache
+            when TRIPFORGE_LLM_CACHE is enabled, otherwise none)
+
+    Returns:
+        A LangChain chat model supporting invoke/ainvoke and bind_tools
+    """
+    backend = (backend or env_str("TRIPFORGE_LLM_BACKEND", "live")).lower()
+    cassette_path = Path(CASSETTE_DIR) / "llm.json"
+    if backend == "replay":
+        llm = ReplayChatModel(cassette=Cassette(cassette_path), latency=latency or replay_latency_from_env())
+    else:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        llm = ChatGoogleGenerativeAI(model=model)
+        if backend == "record":
+            llm = RecordingChatModel(inner=llm, cassette=Cassette(cassette_path))
+    cache = cache if cache is not None else llm_response_cache
+    if cache is not None:
+        llm.cache = cache
+    return llm
@@ -0,0 +1,75 @@
+# Process-wide chat model and compiled graphs, shared by every chat session
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+from core.llm import create_llm
+from graphs.itinerary_graph import create_itinerary_graph
+from graphs.preferences_graph import get_preferences_graph
+from utils.tools import tools
+
+
+@dataclass(frozen=True, slots=True)
+class AgentRuntime:
+    """A chat model and the graphs compiled around it; holds no conversation state."""
+    llm: Any
+    preferences_graph: Any
+    itinerary_graph: Any
+
+
+def build_runtime(llm, checkpointer=None) -> AgentRuntime:
+    """Compile both graphs for a chat model (and optional checkpointer)."""
+    return AgentRuntime(
+        llm=llm,
+        preferences_graph=get_preferences_graph(llm, checkpointer=checkpointer),
+        itinerary_graph=create_itinerary_graph(llm.bind_tools(tools), checkpointer=checkpointer),
+    )
+
+
+class RuntimeRegistry:
+    """
+    Builds the default chat model and compiled graphs once per process.
+
+    Graphs keep no state between runs (conversation state is passed in, or
+    loaded from the checkpointer by thread ID), so every session can share
+    them, along with the model's HTTP client and the tool thread pool.
+    Sessions given their own chat model get their own graphs, which are not
+    cached.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._llm = None
+        self._runtimes: dict = {}       # id(checkpointer) -> (checkpointer, AgentRuntime)
+
+    def get(self, llm=None, checkpointer=None) -> AgentRuntime:
+        """
+        Return the runtime for a session.
+
+        Args:
+            llm: Session-specific chat model; None shares the process-wide create_llm() model
+            checkpointer: Checkpointer the graphs are compiled with
+
+        Returns:
+            AgentRuntime with the model and both compiled graphs
+        """
+        if llm is not None:
+            return build_runtime(llm, checkpointer)
+        with self._lock:
+            entry = self._runtimes.get(id(checkpointer))
+            if entry is None:
+                if self._llm is None:
+                    self._llm = create_llm()
+                # The checkpointer is kept with its runtime so its id cannot be reused by another object
+                entry = (checkpointer, build_runtime(self._llm, checkpointer))
+                self._runtimes[id(checkpointer)] = entry
+            return entry[1]
+
+    def clear(self) -> None:
+        """Forget the shared model and graphs; the next session builds them again."""
+        with self._lock:
+            self._llm = None
+            self._runtimes.clear()
+
+
+runtime_registry = RuntimeRegistry()
@@ -12,15 +12,31 @@ sys.path.append(str(parent_dir))
 from utils.schema import AgentState
 from utils.prompts import system_prompt_phase_2, itinerary_prompt
 from utils.tools import  tools_dict
+from utils.tool_runner import ToolRunner
+from utils.context import fit_context
+from utils.metrics import instrument_node, record_llm_call
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def create_itinerary_graph(llm) -> StateGraph:
+def create_itinerary_graph(llm, max_tool_concurrency: int = None, tool_timeout: float = None,
+                           context_token_budget: int = None, checkpointer=None) -> StateGraph:
     """
     Modified itinerary graph for Streamlit compatibility.
     Removes console I/O operations.
+
+    Args:
+        llm: Chat model with the search tools bound
+        max_tool_concurrency: Maximum tool calls run in parallel per turn
+            (default: TRIPFORGE_TOOL_MAX_CONCURRENCY or 6)
+        tool_timeout: Per-call tool timeout in seconds
+            (default: TRIPFORGE_TOOL_TIMEOUT or 60)
+        context_token_budget: Estimated prompt tokens per LLM call; earlier turns
+            are collapsed or dropped to fit (default: TRIPFORGE_CONTEXT_TOKEN_BUDGET or 12000)
+        checkpointer: Optional LangGraph checkpointer; state is saved per thread_id after every node
     """
+    tool_runner = ToolRunner(tools_dict, max_concurrency=max_tool_concurrency, timeout=tool_timeout)
     
     def init_node(state: AgentState) -> AgentState:
         state['next_action'] = "start" if not state.get('next_action') else state['next_action']
@@ -47,15 +63,14 @@ def create_itinerary_graph(llm) -> StateGraph:
         state['itinerary_file'] = f"trip-itinerary-{preferences.get('departure_city', 'unknown')}-{preferences.get('arrival_city', 'unknown')}-{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt"
         return state
 
-    def invoke_llm(state: AgentState) -> AgentState:
-        """Invoke the LLM to generate the itinerary based on the preferences."""
-        response = llm.invoke(state['messages'])
+    def apply_response(state: AgentState, response) -> AgentState:
+        """Record the model's reply and decide whether tools run next."""
         state['messages'].append(response)
         
         try: 
             if hasattr(response, 'tool_calls') and response.tool_calls:
+                # Each call is counted and timed by record_tool_call when it runs
                 state['next_action'] = "tool_node"
-                print(f"Tool calls detected: {response.tool_calls}")
             else:
                 state['next_action'] = 'user_input'
                 state['itinerary'] = response.content
@@ -66,6 +81,23 @@ def create_itinerary_graph(llm) -> StateGraph:
         
         return state
 
+    def invoke_llm(state: AgentState) -> AgentState:
+        """Invoke the LLM to generate the itinerary based on the preferences."""
+        # The state keeps the full history; the model sees it collapsed to the token budget
+        messages = fit_context(state['messages'], context_token_budget)
+        started = time.perf_counter()
+        response = llm.invoke(messages)
+        record_llm_call("itinerary_graph", response, time.perf_counter() - started)
+        return apply_response(state, response)
+
+    async def ainvoke_llm(state: AgentState) -> AgentState:
+        """Async invoke_llm, used when the graph runs with ainvoke/astream."""
+        messages = fit_context(state['messages'], context_token_budget)
+        started = time.perf_counter()
+        response = await llm.ainvoke(messages)
+        record_llm_call("itinerary_graph", response, time.perf_counter() - started)
+        return apply_response(state, response)
+
 
     def tool_node(state: AgentState) -> AgentState:
         """Execute tool calls from the LLM's response."""
@@ -73,18 +105,17 @@ def create_itinerary_graph(llm) -> StateGraph:
         state['llm_response'] = "Let me gather some additional information for you..."
 
         tool_calls = state['messages'][-1].tool_calls
-        results = []
-        for t in tool_calls:
-            if t['name'] not in tools_dict:
-                result = f"Tool not available: {t['name']}. Available tools: {list(tools_dict.keys())}"
-            else:
-                try:
-                    result = tools_dict[t['name']].func(**t['args'])
-                except Exception as e:
-                    result = f"Error executing tool {t['name']}: {str(e)}"
+        # Independent searches run concurrently; results keep the tool call order
+        results = tool_runner.run(tool_calls)
 
-            results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=str(result)))
+        state['messages'].extend(results)
+        state['next_action'] = 'invoke_llm'
+        return state
 
+    async def atool_node(state: AgentState) -> AgentState:
+        """Async tool_node: searches run as tasks on the event loop instead of pool threads."""
+        state['llm_response'] = "Let me gather some additional information for you..."
+        results = await tool_runner.arun(state['messages'][-1].tool_calls)
         state['messages'].extend(results)
         state['next_action'] = 'invoke_llm'
         return state
@@ -94,10 +125,10 @@ def create_itinerary_graph(llm) -> StateGraph:
 
     graph = StateGraph(AgentState)
     
-    graph.add_node("init", init_node)
-    graph.add_node("start_itinerary", start_itinerary)
-    graph.add_node("invoke_llm", invoke_llm)
-    graph.add_node("tool_node", tool_node)
+    graph.add_node("init", instrument_node("itinerary_graph", "init", init_node))
+    graph.add_node("start_itinerary", instrument_node("itinerary_graph", "start_itinerary", start_itinerary))
+    graph.add_node("invoke_llm", instrument_node("itinerary_graph", "invoke_llm", invoke_llm, ainvoke_llm))
+    graph.add_node("tool_node", instrument_node("itinerary_graph", "tool_node", tool_node, atool_node))
 
     graph.add_edge(START, "init")
     graph.add_edge("start_itinerary", "invoke_llm")
@@ -114,6 +145,6 @@ def create_itinerary_graph(llm) -> StateGraph:
         "user_input": END
     })
 
-    app = graph.compile()
+    app = graph.compile(name="itinerary_graph", checkpointer=checkpointer)
 
     return app
@@ -10,19 +10,66 @@ sys.path.append(str(parent_dir))
 
 from utils.schema import AgentState
 from utils.prompts import system_prompt_phase_1, initialize_prompt
+from utils.metrics import LLM_SKIPPED, instrument_node, record_llm_call
+from utils.context import CONTEXT_TOKENS, message_tokens
+from utils.slots import SlotStore
 from datetime import datetime
+import json
+import re
+import time
 
+# Replies made only of these words confirm the draft preferences without another LLM call
+AFFIRMATIVE_WORDS = {
+    "yes", "yeah", "yea", "yep", "yup", "y", "sure", "ok", "okay", "k", "kk", "alright", "fine", "good", "great",
+    "perfect", "awesome", "amazing", "excellent", "nice", "cool", "correct", "right", "exactly", "absolutely",
+    "definitely", "confirm", "confirmed", "done", "go", "ahead", "proceed", "lock", "it", "in", "book", "do",
+    "looks", "look", "sounds", "seems", "all", "that", "thats", "this", "is", "s", "lets", "let", "us", "please",
+    "plz", "pls", "love", "like", "works", "for", "me", "to", "the", "plan", "spot", "on", "very", "so", "really",
+    "totally", "just", "thanks", "thank", "you", "ty", "fab", "fantastic", "wonderful", "brilliant", "haan", "ji",
+}
+# At least one of these must appear, so "thanks" or "just the plan" alone do not end the conversation
+_STRONG_AFFIRMATIVES = AFFIRMATIVE_WORDS - {"it", "in", "do", "all", "that", "thats", "this", "is", "s", "lets",
+                                            "let", "us", "please", "plz", "pls", "for", "me", "to", "the", "plan",
+                                            "on", "very", "so", "really", "just", "thanks", "thank", "you", "ty",
+                                            "like", "k", "ji"}
+# Replies ending in one of these are cut short ("ok so", "yes let's"), and the user has more to say
+_CONTINUATIONS = {"so", "lets", "let", "is", "that", "to", "for", "the", "just", "really", "very", "like", "do"}
+_MAX_AFFIRMATIVE_WORDS = 8
 
-def get_preferences_graph(llm):
+
+def is_affirmative(text: str) -> bool:
+    """
+    True for short, plain confirmations such as "Looks good!" or "yes, lock it in 👍".
+
+    Questions and replies that trail off are left to the model.
+
+    >>> is_affirmative("Looks good!"), is_affirmative("yes, lock it in 👍"), is_affirmative("ok")
+    (True, True, True)
+    >>> is_affirmative("ok so"), is_affirmative("thanks")
+    (False, False)
+    >>> is_affirmative("is it good?"), is_affirmative("go ahead?"), is_affirmative("is that ok")
+    (False, False, False)
+    """
+    if "?" in text:
+        return False
+    if "👍" in text or "✅" in text:
+        text = text.replace("👍", " yes ").replace("✅", " yes ")
+    words = re.sub(r"[^a-z\s]+", "", text.lower().replace("'", "")).split()
+    if not words or len(words) > _MAX_AFFIRMATIVE_WORDS or words[0] == "is" or words[-1] in _CONTINUATIONS:
+        return False
+    return all(word in AFFIRMATIVE_WORDS for word in words) and any(word in _STRONG_AFFIRMATIVES for word in words)
+
+
+def get_preferences_graph(llm, checkpointer=None):
     """
     Modified preferences graph for Streamlit compatibility.
     Removes console I/O operations.
+
+    Args:
+        llm: Chat model used for the preferences conversation
+        checkpointer: Optional LangGraph checkpointer; state is saved per thread_id after every node
     """
     parser = JsonOutputParser()
-
-    current_date = datetime.now()
-    current_date_str = current_date.strftime('%Y-%m-%d')
-    current_year = current_date.year
     
     def init_node(state: AgentState) -> AgentState:
         """Initialize the state for the preferences graph."""
@@ -31,6 +78,10 @@ def get_preferences_graph(llm):
 
     def start_node(state: AgentState) -> AgentState:
         """Initial state of the graph, setting up the conversation."""
+        # Read per conversation: the compiled graph is shared by every session for the life of the process
+        current_date = datetime.now()
+        current_date_str = current_date.strftime('%Y-%m-%d')
+        current_year = current_date.year
         
         system_prompt = system_prompt_phase_1.invoke({
             "date": current_date_str,
@@ -58,39 +109,104 @@ def get_preferences_graph(llm):
         state['next_action'] = 'invoke_llm'
         state['llm_response'] = ''
         state['preferences'] = {}
+        state['draft_preferences'] = {}
+        state['slots'] = {}
         state['preferences_file'] = f"trip-preferences-{current_date.strftime('%Y-%m-%d_%H-%M-%S')}.txt"
         return state
 
-    def invoke_llm(state: AgentState) -> AgentState:
-        """Invoke the LLM to generate a response based on the current state."""
-        response = llm.invoke(state['messages'])
-        state['messages'].append(AIMessage(content=response.content))
-        
+    def awaiting_confirmation(state: AgentState) -> bool:
+        """True when the last model reply was a 'confirm' summary and the user just answered it."""
+        messages = state.get('messages', [])
+        if not state.get('draft_preferences') or len(messages) < 2 or not isinstance(messages[-1], HumanMessage):
+            return False
+        try:
+            return parser.parse(messages[-2].content).get('state') == 'confirm'
+        except Exception:
+            return False
+
+    def compact_messages(state: AgentState, slots: SlotStore) -> list:
+        """System prompt, the collected slots and only the last exchange instead of the whole transcript."""
+        messages = state['messages']
+        system = next((m for m in reversed(messages) if isinstance(m, SystemMessage)), None)
+        last_reply = next((m for m in reversed(messages) if isinstance(m, AIMessage)), None)
+        if system is None or last_reply is None:
+            return list(messages)
+        return [system, HumanMessage(content=slots.snapshot()), last_reply, messages[-1]]
+
+    def confirm_locally(state: AgentState) -> bool:
+        """End the conversation without the LLM when the user plainly accepts the draft."""
+        if not (awaiting_confirmation(state) and is_affirmative(state['messages'][-1].content)):
+            return False
+        # A plain "looks good" would only make the model repeat the draft with state 'end'
+        LLM_SKIPPED.inc(graph="preferences_graph", reason="confirmation")
+        state['preferences'] = dict(state['draft_preferences'])
+        state['messages'].append(AIMessage(content=json.dumps({
+            "state": "end", "filename": state['preferences_file'], "preferences": state['preferences'],
+        })))
+        state['next_action'] = 'start_itinerary'
+        return True
+
+    def prompt_messages(state: AgentState, slots: SlotStore) -> list:
+        messages = compact_messages(state, slots)
+        CONTEXT_TOKENS.observe(sum(message_tokens(m) for m in messages), graph="preferences_graph")
+        return messages
+
+    def apply_response(state: AgentState, slots: SlotStore, content: str) -> AgentState:
+        """Update the state from the model's JSON reply."""
         try:
-            parsed_response = parser.parse(response.content)
+            parsed_response = parser.parse(content)
+            slots.update(parsed_response.get('slots'))
+            if parsed_response.get('state') in ('confirm', 'end'):
+                slots.update(parsed_response.get('preferences'))
             if parsed_response.get('state') == 'continue':
                 state['next_action'] = 'user_input'
                 state['llm_response'] = parsed_response.get('question', 'Tell me more about your trip.')
             elif parsed_response.get('state') == 'confirm':
                 state['next_action'] = 'user_input'
                 state['llm_response'] = parsed_response.get('question', 'Does this look good?')
+                # Draft preferences let searches start before the user confirms
+                state['draft_preferences'] = slots.fill_gaps(parsed_response.get('preferences'))
             elif parsed_response.get('state') == 'end':
                 state['next_action'] = 'start_itinerary'
                 state['preferences_file'] = parsed_response.get('filename', state['preferences_file'])
-                state['preferences'] = parsed_response.get('preferences', {})
+                state['preferences'] = slots.fill_gaps(parsed_response.get('preferences'))
         except Exception as e:
             state['next_action'] = 'user_input'
             state['llm_response'] = f"I encountered an issue processing your response: {str(e)}. Could you please try again?"
+        state['messages'].append(AIMessage(content=content))
+        state['slots'] = slots.values
         
         return state
 
+    def invoke_llm(state: AgentState) -> AgentState:
+        """Invoke the LLM to generate a response based on the current state."""
+        if confirm_locally(state):
+            return state
+        slots = SlotStore(state.get('slots'))
+        messages = prompt_messages(state, slots)
+        started = time.perf_counter()
+        response = llm.invoke(messages)
+        record_llm_call("preferences_graph", response, time.perf_counter() - started)
+        return apply_response(state, slots, response.content)
+
+    async def ainvoke_llm(state: AgentState) -> AgentState:
+        """Async invoke_llm, used when the graph runs with ainvoke/astream."""
+        if confirm_locally(state):
+            return state
+        slots = SlotStore(state.get('slots'))
+        messages = prompt_messages(state, slots)
+        started = time.perf_counter()
+        response = await llm.ainvoke(messages)
+        record_llm_call("preferences_graph", response, time.perf_counter() - started)
+        return apply_response(state, slots, response.content)
+
     def router(state: AgentState) -> str:
         return state['next_action']
 
     graph = StateGraph(AgentState)
-    graph.add_node("init", init_node)
-    graph.add_node("start", start_node)
-    graph.add_node("invoke_llm", invoke_llm)
+    graph.add_node("init", instrument_node("preferences_graph", "init", init_node))
+    graph.add_node("start", instrument_node("preferences_graph", "start", start_node))
+    graph.add_node("invoke_llm", instrument_node("preferences_graph", "invoke_llm", invoke_llm, ainvoke_llm))
 
     graph.add_edge(START, "init")
     
@@ -103,7 +219,7 @@ def get_preferences_graph(llm):
     
     graph.add_edge("invoke_llm", END)
     
-    preferences_graph = graph.compile()
+    preferences_graph = graph.compile(name="preferences_graph", checkpointer=checkpointer)
     
     return preferences_graph
 
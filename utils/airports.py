@@ -0,0 +1,231 @@
+import bisect
+import csv
+import re
+import threading
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+AIRPORTS_CSV = Path(__file__).parent / "data" / "airports.csv"
+
+# Words that do not help identify an airport ("Delhi airport", "Heathrow Intl")
+_NOISE_WORDS = {"airport", "international", "intl", "int", "the", "of", "city", "metropolitan", "area"}
+_CODES = re.compile(r"[A-Z]{3}(\s*,\s*[A-Z]{3})*")
+_CODE_TOKEN = re.compile(r"\b[A-Z]{3}\b")
+
+
+def normalize(text: str) -> str:
+    """Lower-case, strip accents/punctuation and noise words: "Zürich Intl." -> "zurich"."""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+    words = re.sub(r"[^a-z0-9]+", " ", text).split()
+    kept = [word for word in words if word not in _NOISE_WORDS]
+    return " ".join(kept or words)
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True, slots=True)
+class Airport:
+    iata: str
+    name: str
+    city: str
+    country: str
+    metro: str
+
+
+@dataclass(frozen=True, slots=True)
+class Resolution:
+    """Result of resolving a place name: every IATA code it stands for."""
+    query: str
+    codes: tuple
+    label: str          # metro/city name or airport name that matched
+    method: str         # "code", "exact", "prefix" or "fuzzy"
+    score: float = 1.0
+
+    @property
+    def search_ids(self) -> str:
+        """Comma-joined codes as accepted by Google Flights departure_id/arrival_id."""
+        return ",".join(self.codes)
+
+
+class AirportIndex:
+    """
+    Offline airport/city index for IATA resolution.
+
+    Loaded lazily from the bundled CSV on first use. Every searchable name (IATA
+    code, airport name, airport alias, city/metro name and city alias) is
+    normalized into a key that maps to a tuple of airport ids; city and metro
+    keys map to all of their airports, primary airport first. Exact lookups are
+    a dict hit, prefix lookups bisect a sorted key list (a compact stand-in for
+    a trie), and misspellings fall back to a trigram index scored by Jaccard
+    similarity. Trigram postings are stored as compact arrays of key ids.
+    """
+
+    def __init__(self, path=AIRPORTS_CSV, fuzzy_cutoff: float = 0.4):
+        self.path = Path(path)
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._airports: tuple = ()
+        self._by_code: dict = {}
+        self._keys: list = []           # sorted normalized keys
+        self._targets: list = []        # key id -> (airport ids, label)
+        self._key_ids: dict = {}
+        self._trigram_postings: dict = {}
+        self._trigram_counts = array("B")
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            with open(self.path, "r", encoding="utf-8", newline="") as f:
+                rows = list(csv.DictReader(f))
+
+            airports, targets = [], {}
+
+            def add(name: str, ids: list, label: str) -> None:
+                key = normalize(name)
+                if not key:
+                    return
+                existing = targets.setdefault(key, ([], label))[0]
+                existing.extend(i for i in ids if i not in existing)
+
+            metros = {}
+            for row in rows:
+                metro_names = [name.strip() for name in row["metro"].split(";") if name.strip()] or [row["city"]]
+                airport = Airport(row["iata"], row["name"], row["city"], row["country"], metro_names[0])
+                airports.append(airport)
+                for metro_name in metro_names:
+                    metros.setdefault(metro_name, []).append(len(airports) - 1)
+
+            # Metro/city names first so they win over airport names sharing a key
+            for metro_name, ids in metros.items():
+                add(metro_name, ids, airports[ids[0]].metro)
+            for airport_id, (airport, row) in enumerate(zip(airports, rows)):
+                add(airport.city, metros.get(airport.city, [airport_id]), airport.city)
+                add(airport.iata, [airport_id], airport.name)
+                add(airport.name, [airport_id], airport.name)
+                for alias in row["aliases"].split(";"):
+                    if alias.strip():
+                        add(alias, [airport_id], airport.name)
+
+            keys = sorted(targets)
+            postings = {}
+            for key_id, key in enumerate(keys):
+                for gram in _trigrams(key):
+                    postings.setdefault(gram, array("H")).append(key_id)
+
+            self._airports = tuple(airports)
+            self._by_code = {airport.iata: airport for airport in airports}
+            self._keys = keys
+            self._key_ids = {key: key_id for key_id, key in enumerate(keys)}
+            self._targets = [(tuple(targets[key][0]), targets[key][1]) for key in keys]
+            self._trigram_postings = postings
+            self._trigram_counts = array("B", (min(255, len(_trigrams(key))) for key in keys))
+            self._loaded = True
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self._load()
+
+    def airport(self, code: str) -> Optional[Airport]:
+        """Return the airport for an IATA code, or None if it is not in the dataset."""
+        self._ensure_loaded()
+        return self._by_code.get(str(code).strip().upper())
+
+    def _resolution(self, query: str, key_id: int, method: str, score: float = 1.0) -> Resolution:
+        ids, label = self._targets[key_id]
+        return Resolution(query, tuple(self._airports[i].iata for i in ids), label, method, score)
+
+    def _prefix_matches(self, key: str, limit: int) -> list:
+        start = bisect.bisect_left(self._keys, key)
+        matches = []
+        for key_id in range(start, len(self._keys)):
+            if not self._keys[key_id].startswith(key):
+                break
+            matches.append(key_id)
+        # Shortest completion first: "lon" -> "london" before "london city"
+        return sorted(matches, key=lambda key_id: len(self._keys[key_id]))[:limit]
+
+    def _fuzzy_matches(self, key: str, limit: int) -> list:
+        grams = _trigrams(key)
+        shared = {}
+        for gram in grams:
+            for key_id in self._trigram_postings.get(gram, ()):
+                shared[key_id] = shared.get(key_id, 0) + 1
+        scored = []
+        for key_id, count in shared.items():
+            score = count / (len(grams) + self._trigram_counts[key_id] - count)
+            if score >= self.fuzzy_cutoff:
+                scored.append((score, key_id))
+        scored.sort(key=lambda item: (-item[0], len(self._keys[item[1]])))
+        return scored[:limit]
+
+    def lookup(self, query: str, limit: int = 5) -> list:
+        """
+        Find the places a query may refer to, best first.
+
+        Args:
+            query: IATA code(s), city, metro, airport name or alias (typos tolerated)
+            limit: Maximum number of candidates
+
+        Returns:
+            List of Resolution objects (empty when nothing matches)
+        """
+        self._ensure_loaded()
+        text = str(query or "").strip()
+        if not text:
+            return []
+        if _CODES.fullmatch(text):
+            codes = tuple(code.strip() for code in text.split(","))
+            # Unknown single codes may be metro codes such as "NYC"
+            key_id = self._key_ids.get(normalize(text)) if len(codes) == 1 and codes[0] not in self._by_code else None
+            if key_id is not None:
+                return [self._resolution(text, key_id, "exact")]
+            label = ", ".join(self._by_code[code].name if code in self._by_code else code for code in codes)
+            return [Resolution(text, codes, label, "code")]
+        # "Goa (GOI)", "Paris CDG": a known code inside the text wins
+        for code in _CODE_TOKEN.findall(text):
+            if code in self._by_code:
+                return [Resolution(text, (code,), self._by_code[code].name, "code")]
+
+        key = normalize(text)
+        key_id = self._key_ids.get(key)
+        if key_id is not None:
+            return [self._resolution(text, key_id, "exact")]
+        candidates = [self._resolution(text, key_id, "prefix") for key_id in self._prefix_matches(key, limit)] if len(key) >= 3 else []
+        if not candidates:
+            candidates = [self._resolution(text, key_id, "fuzzy", score) for score, key_id in self._fuzzy_matches(key, limit)]
+        return candidates
+
+    def resolve(self, query: str) -> Optional[Resolution]:
+        """Return the best Resolution for a query, or None."""
+        candidates = self.lookup(query, limit=1)
+        return candidates[0] if candidates else None
+
+    def to_search_ids(self, value: str) -> str:
+        """
+        Convert a city/airport name into Google Flights airport ids.
+
+        Upper-case IATA codes pass through unchanged and exact city, metro,
+        airport or alias names are resolved (metro areas become comma-joined
+        codes, e.g. "Goa" -> "GOI,GOX"). Prefix and fuzzy matches are only
+        guesses ("Bern" is closest to Berlin), so anything not matched exactly
+        is returned as given; resolve_airport offers those candidates instead.
+        """
+        text = str(value or "").strip()
+        resolution = self.resolve(text)
+        return resolution.search_ids if resolution and resolution.method in ("code", "exact") else text
+
+    def city_for(self, code: str) -> Optional[str]:
+        """Return the city (metro) name served by an IATA code, or None."""
+        airport = self.airport(code)
+        return airport.metro if airport else None
+
+
+airport_index = AirportIndex()
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from utils.cache import make_cache_key
+from utils.config import env_float, env_str
+from utils.rate_limiter import serpapi_rate_limiter
+from utils.serpapi_client import serpapi_client
+
+CASSETTE_DIR = env_str("TRIPFORGE_CASSETTE_DIR", "cassettes")
+
+
+class Cassette:
+    """
+    JSON file of recorded interactions.
+
+    Each interaction is a dict with at least a "key"; replay looks entries up
+    by key and, for keys that were never recorded, falls back to the next
+    unused entry in recording order so replays stay deterministic even when
+    inputs drift (e.g. the current date in a prompt).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.interactions = []
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.interactions = json.load(f).get("interactions", [])
+        self._used = set()
+
+    def append(self, interaction: dict) -> None:
+        """Record an interaction and rewrite the cassette file atomically."""
+        with self._lock:
+            self.interactions.append(interaction)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "interactions": self.interactions}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def find(self, key: str, sequential_fallback: bool = True) -> Optional[dict]:
+        """
+        Return the first unused interaction recorded for key.
+
+        Args:
+            key: Interaction key
+            sequential_fallback: Use the next unused interaction when key is unknown
+
+        Returns:
+            The interaction, or None when the cassette is exhausted
+        """
+        with self._lock:
+            fallback = None
+            for idx, interaction in enumerate(self.interactions):
+                if idx in self._used:
+                    continue
+                if interaction.get("key") == key:
+                    self._used.add(idx)
+                    return interaction
+                if fallback is None:
+                    fallback = idx
+            if sequential_fallback and fallback is not None:
+                self._used.add(fallback)
+                return self.interactions[fallback]
+            return None
+
+    def rewind(self) -> None:
+        """Make every interaction available for replay again."""
+        with self._lock:
+            self._used.clear()
+
+
+class SyntheticLatency:
+    """Deterministic injected delay: base seconds plus seeded jitter."""
+
+    def __init__(self, seconds: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.seconds = seconds
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next(self) -> float:
+        if self.seconds <= 0 and self.jitter <= 0:
+            return 0.0
+        with self._lock:
+            return max(0.0, self.seconds + self._random.uniform(-self.jitter, self.jitter))
+
+    def sleep(self) -> None:
+        delay = self.next()
+        if delay:
+            time.sleep(delay)
+
+    async def asleep(self) -> None:
+        delay = self.next()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class LiveSearchBackend:
+    """Real SerpAPI searches over the pooled HTTP client, paced by the shared rate limiter."""
+
+    requires_api_key = True
+
+    def __init__(self, client=serpapi_client, rate_limiter=serpapi_rate_limiter):
+        self.client = client
+        self.rate_limiter = rate_limiter
+
+    def search(self, params: dict) -> dict:
+        self.rate_limiter.acquire()
+        return self.client.search(params)
+
+    async def asearch(self, params: dict) -> dict:
+        await self.rate_limiter.aacquire()
+        return await self.client.asearch(params)
+
+
+class RecordingSearchBackend:
+    """Passes searches to another backend and records every response into a cassette."""
+
+    requires_api_key = True
+
+    def __init__(self, inner, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+
+    def _record(self, params: dict, results: dict) -> None:
+        recorded_params = {name: value for name, value in params.items() if name != "api_key"}
+        self.cassette.append({"key": make_cache_key(params), "params": recorded_params, "response": results})
+
+    def search(self, params: dict) -> dict:
+        results = self.inner.search(params)
+        self._record(params, results)
+        return results
+
+    async def asearch(self, params: dict) -> dict:
+        results = await self.inner.asearch(params)
+        self._record(params, results)
+        return results
+
+
+class ReplaySearchBackend:
+    """
+    Serves searches from a cassette without network access or an API key.
+
+    Searches are matched on their normalized parameters; searches that were
+    never recorded get an empty SerpAPI-style error payload, which the tools
+    report as "no results". Responses are delayed by the configured synthetic
+    latency.
+    """
+
+    requires_api_key = False
+
+    def __init__(self, cassette: Cassette, latency: Optional[SyntheticLatency] = None):
+        self.latency = latency or SyntheticLatency()
+        # Identical searches always replay the first recorded response
+        self._responses = {}
+        for interaction in cassette.interactions:
+            self._responses.setdefault(interaction["key"], interaction["response"])
+
+    def _lookup(self, params: dict) -> dict:
+        response = self._responses.get(make_cache_key(params))
+        if response is None:
+            return {"error": "No recorded response for this search"}
+        return json.loads(json.dumps(response))
+
+    def search(self, params: dict) -> dict:
+        self.latency.sleep()
+        return self._lookup(params)
+
+    async def asearch(self, params: dict) -> dict:
+        await self.latency.asleep()
+        return self._lookup(params)
+
+
+def replay_latency_from_env() -> SyntheticLatency:
+    """Synthetic latency configured by TRIPFORGE_REPLAY_LATENCY / TRIPFORGE_REPLAY_JITTER (seconds)."""
+    return SyntheticLatency(env_float("TRIPFORGE_REPLAY_LATENCY", 0.0), env_float("TRIPFORGE_REPLAY_JITTER", 0.0))
+
+
+def _search_backend_from_env():
+    mode = env_str("TRIPFORGE_SEARCH_BACKEND", "live").lower()
+    cassette_path = Path(CASSETTE_DIR) / "search.json"
+    if mode == "record":
+        return RecordingSearchBackend(LiveSearchBackend(), Cassette(cassette_path))
+    if mode == "replay":
+        return ReplaySearchBackend(Cassette(cassette_path), replay_latency_from_env())
+    return LiveSearchBackend()
+
+
+_search_backend = _search_backend_from_env()
+
+
+def get_search_backend():
+    """Return the backend every search tool call goes through."""
+    return _search_backend
+
+
+def set_search_backend(backend) -> None:
+    """Swap the process-wide search backend (e.g. for replay runs and benchmarks)."""
+    global _search_backend
+    _search_backend = backend
@@ -0,0 +1,285 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from utils.config import env_float, env_int, env_str
+
+# Parameters that never change the search results and must not leak into cache keys
+EXCLUDED_KEY_PARAMS = {"api_key", "output", "no_cache", "async"}
+
+DEFAULT_TTLS = {
+    "google_flights": 15 * 60,   # fares move quickly
+    "google_hotels": 60 * 60,    # room rates are more stable
+}
+
+# How long past expiry a result may still be served (marked with its age) while a refresh runs
+DEFAULT_MAX_STALE = {
+    "google_flights": 60 * 60,
+    "google_hotels": 6 * 60 * 60,
+}
+
+
+def make_cache_key(params: dict) -> str:
+    """
+    Build a stable cache key from SerpAPI search parameters.
+
+    Values are stringified, stripped and lower-cased so that e.g. adults=2 and
+    adults="2", or "Goa hotels" and "goa hotels", share one entry. The api_key
+    (and other transport-only parameters) are excluded.
+    """
+    normalized = {}
+    for name, value in params.items():
+        if name in EXCLUDED_KEY_PARAMS or value is None:
+            continue
+        if isinstance(value, bool):
+            value = str(value).lower()
+        normalized[str(name).lower()] = " ".join(str(value).split()).lower()
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+
+class _Entry:
+    __slots__ = ("payload", "engine", "stored_at", "expires_at", "size", "latency", "from_disk")
+
+    def __init__(self, payload: str, engine: str, stored_at: float, expires_at: float, latency: float):
+        self.payload = payload
+        self.engine = engine
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+        self.size = len(payload.encode("utf-8"))
+        self.latency = latency
+        self.from_disk = False
+
+
+class SearchCache:
+    """
+    TTL + LRU cache for raw SerpAPI responses with an optional SQLite tier.
+
+    The in-memory tier is bounded both by entry count and by total payload
+    bytes; the least recently used entries are evicted first. When a SQLite
+    path is given every write goes through to disk as well, and memory misses
+    fall back to (and are promoted from) the disk tier, so cached searches
+    survive process restarts.
+
+    Expired entries are kept for a further per-engine max staleness so that
+    get_stale() can serve them while upstream is slow or failing; get() only
+    ever returns fresh entries.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[dict] = None,
+        default_ttl: float = 15 * 60,
+        max_entries: int = 512,
+        max_bytes: int = 32 * 1024 * 1024,
+        sqlite_path: Optional[str] = None,
+        max_stale: Optional[dict] = None,
+    ):
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.max_stale = dict(DEFAULT_MAX_STALE)
+        self.max_stale.update(max_stale or {})
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "stale_hits": 0,
+            "saved_seconds": 0.0,
+        }
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                " key TEXT PRIMARY KEY,"
+                " engine TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " latency REAL NOT NULL DEFAULT 0,"
+                " payload TEXT NOT NULL)"
+            )
+            self._db.execute("DELETE FROM search_cache WHERE expires_at <= ?",
+                             (time.time() - max(self.max_stale.values(), default=0),))
+            self._db.commit()
+
+    def ttl_for(self, engine: str) -> float:
+        """Return the time-to-live in seconds for an engine."""
+        return self.ttls.get(engine, self.default_ttl)
+
+    def max_stale_for(self, engine: str) -> float:
+        """Return how many seconds past expiry an engine's results may be served stale."""
+        return self.max_stale.get(engine, 0)
+
+    def _lookup(self, key: str, now: float) -> Optional[_Entry]:
+        """Find an entry in memory or on disk, dropping it once it is past its staleness window."""
+        entry = self._entries.get(key)
+        from_disk = False
+        if entry is None:
+            entry, from_disk = self._load_from_disk(key), True
+        if entry is None:
+            return None
+        if entry.expires_at + self.max_stale_for(entry.engine) <= now:
+            if not from_disk:
+                self._remove(key)
+            if self._db is not None:
+                self._db.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._db.commit()
+            self._stats["expirations"] += 1
+            return None
+        if from_disk:
+            self._insert(key, entry)
+        else:
+            self._entries.move_to_end(key)
+        entry.from_disk = from_disk
+        return entry
+
+    def get(self, params: dict) -> Optional[dict]:
+        """
+        Look up cached results for a search.
+
+        Args:
+            params: SerpAPI parameters (api_key is ignored)
+
+        Returns:
+            A fresh copy of the cached results, or None on a miss
+        """
+        key = make_cache_key(params)
+        now = time.time()
+        with self._lock:
+            entry = self._lookup(key, now)
+            if entry is None or entry.expires_at <= now:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits" if entry.from_disk else "memory_hits"] += 1
+            self._stats["saved_seconds"] += entry.latency
+            return json.loads(entry.payload)
+
+    def get_stale(self, params: dict) -> Optional[tuple]:
+        """
+        Look up an expired entry that is still within the engine's max staleness.
+
+        Args:
+            params: SerpAPI parameters (api_key is ignored)
+
+        Returns:
+            (results copy, age in seconds since it was stored), or None
+        """
+        key = make_cache_key(params)
+        now = time.time()
+        with self._lock:
+            entry = self._lookup(key, now)
+            if entry is None or entry.expires_at > now:
+                return None
+            self._stats["stale_hits"] += 1
+            return json.loads(entry.payload), now - entry.stored_at
+
+    def set(self, params: dict, results: dict, latency: float = 0.0) -> None:
+        """
+        Store search results.
+
+        Args:
+            params: SerpAPI parameters the results were fetched with
+            results: Decoded SerpAPI response
+            latency: Upstream latency in seconds, used to report time saved by hits
+        """
+        engine = params.get("engine", "")
+        ttl = self.ttl_for(engine)
+        if ttl <= 0:
+            return
+        key = make_cache_key(params)
+        now = time.time()
+        entry = _Entry(json.dumps(results, separators=(",", ":")), engine, now, now + ttl, latency)
+        with self._lock:
+            self._stats["stores"] += 1
+            self._insert(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, engine, entry.stored_at, entry.expires_at, latency, entry.payload),
+                )
+                self._db.commit()
+
+    def clear(self) -> None:
+        """Drop every cached entry from memory and disk."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM search_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and current occupancy."""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["persistent"] = self._db is not None
+            return stats
+
+    def _insert(self, key: str, entry: _Entry) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _load_from_disk(self, key: str) -> Optional[_Entry]:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT engine, stored_at, expires_at, latency, payload FROM search_cache WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        engine, stored_at, expires_at, latency, payload = row
+        return _Entry(payload, engine, stored_at, expires_at, latency)
+
+
+def _ttls_from_env() -> dict:
+    return {
+        engine: env_float(f"TRIPFORGE_CACHE_TTL_{engine.upper()}", ttl)
+        for engine, ttl in DEFAULT_TTLS.items()
+    }
+
+
+def _max_stale_from_env() -> dict:
+    return {
+        engine: env_float(f"TRIPFORGE_CACHE_MAX_STALE_{engine.upper()}", max_stale)
+        for engine, max_stale in DEFAULT_MAX_STALE.items()
+    }
+
+
+# Process-wide cache shared by every session's tool calls
+search_cache = SearchCache(
+    ttls=_ttls_from_env(),
+    max_stale=_max_stale_from_env(),
+    max_entries=env_int("TRIPFORGE_CACHE_MAX_ENTRIES", 512),
+    max_bytes=env_int("TRIPFORGE_CACHE_MAX_BYTES", 32 * 1024 * 1024),
+    sqlite_path=env_str("TRIPFORGE_CACHE_SQLITE_PATH") or None,
+)
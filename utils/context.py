@@ -0,0 +1,142 @@
+import re
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from utils.config import env_int
+from utils.metrics import metrics
+from utils.renderers import estimate_tokens
+from utils.result_store import result_store
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = env_int("TRIPFORGE_CONTEXT_TOKEN_BUDGET", 12000)
+
+CONTEXT_TOKENS = metrics.histogram(
+    "tripforge_context_tokens", "Estimated prompt tokens sent to the model after context fitting.", ("graph",),
+    (500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000))
+CONTEXT_TRIMMED_TOKENS = metrics.counter(
+    "tripforge_context_trimmed_tokens_total", "Estimated prompt tokens removed by context fitting.", ("graph",))
+
+_RESULT_ID = re.compile(r"Result ID: (\S+)")
+_PREVIEW_CHARS = 160
+# Replies at least this long are treated as itineraries and the newest one is kept in full
+ITINERARY_MIN_TOKENS = 500
+
+
+def _text(message) -> str:
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+
+def message_tokens(message) -> int:
+    """Estimated tokens of one message, including its tool call arguments."""
+    tokens = estimate_tokens(_text(message))
+    for call in getattr(message, "tool_calls", None) or ():
+        tokens += estimate_tokens(str(call.get("args", ""))) + 10
+    return tokens
+
+
+def _preview(text: str) -> str:
+    first_line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+    return first_line[:_PREVIEW_CHARS] + ("..." if len(first_line) > _PREVIEW_CHARS else "")
+
+
+def collapse_tool_result(message: ToolMessage) -> ToolMessage:
+    """Replace an earlier tool result with a short reference the model can follow up on."""
+    text = _text(message)
+    result_id = _RESULT_ID.search(text)
+    if result_id and result_id.group(1) in result_store:
+        summary = (f"[Earlier {message.name or 'tool'} result {result_id.group(1)}, omitted to save space. "
+                   f"Call get_search_details(\"{result_id.group(1)}\") if its details are needed.]")
+    elif result_id:
+        # The store is shared by every session, so other traffic may have evicted it
+        summary = (f"[Earlier {message.name or 'tool'} result {result_id.group(1)}, omitted to save space. "
+                   f"It has expired; repeat the search if its details are needed: {_preview(text)}]")
+    else:
+        summary = f"[Earlier {message.name or 'tool'} result, omitted to save space: {_preview(text)}]"
+    return message.model_copy(update={"content": summary})
+
+
+def collapse_reply(message: AIMessage) -> AIMessage:
+    """Replace a superseded reply (e.g. an older itinerary) with its first line."""
+    return message.model_copy(update={"content": f"[Earlier reply, superseded by a later one: {_preview(_text(message))}]"})
+
+
+def _turns(messages: list) -> list:
+    """Split a history into [start, end) ranges, each starting at a HumanMessage."""
+    starts = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+    return [(start, end) for start, end in zip(starts, starts[1:] + [len(messages)])]
+
+
+def fit_context(messages: list, token_budget: int = None, graph: str = "itinerary_graph") -> list:
+    """
+    Build the message list sent to the model from the full conversation history.
+
+    The history starts at the last system prompt; anything before it belongs
+    to an earlier phase (the preferences chat, already summarized in the
+    itinerary system prompt) and is left out. The system prompt, the first request (which carries the preferences), the
+    latest reply, the latest itinerary-sized reply and the whole current turn
+    are always kept as they are. While the history is over budget, tool
+    results and superseded replies from earlier turns are collapsed into
+    one-line references, oldest first (search results keep their Result ID
+    for get_search_details while it is still stored). If it is still over
+    budget, the oldest turns in between are dropped; a tool call is only ever
+    dropped together with its results.
+
+    Args:
+        messages: Full history from the graph state (not modified)
+        token_budget: Estimated token budget (default: TRIPFORGE_CONTEXT_TOKEN_BUDGET); 0 sends everything
+
+    Returns:
+        New list of messages to pass to llm.invoke
+    """
+    budget = DEFAULT_CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    original = sum(message_tokens(message) for message in messages)
+    if budget <= 0:
+        CONTEXT_TOKENS.observe(original, graph=graph)
+        return list(messages)
+    phase_start = max((i for i, message in enumerate(messages) if isinstance(message, SystemMessage)), default=0)
+    messages = messages[phase_start:]
+    turns = _turns(messages)
+    if len(turns) < 2:
+        total = sum(message_tokens(message) for message in messages)
+        CONTEXT_TOKENS.observe(total, graph=graph)
+        CONTEXT_TRIMMED_TOKENS.inc(original - total, graph=graph)
+        return list(messages)
+
+    current_start = turns[-1][0]
+    replies = [i for i, message in enumerate(messages[:current_start])
+               if isinstance(message, AIMessage) and not message.tool_calls and _text(message).strip()]
+    itineraries = [i for i in replies if message_tokens(messages[i]) >= ITINERARY_MIN_TOKENS]
+    protected = set(replies[-1:] + itineraries[-1:])
+    superseded = set(replies) - protected
+    fitted = list(messages)
+    sizes = [message_tokens(message) for message in fitted]
+    total = sum(sizes)
+    # Earlier results stay in full while they fit; the oldest are collapsed first
+    for i, message in enumerate(messages[:current_start]):
+        if total <= budget:
+            break
+        if isinstance(message, ToolMessage):
+            fitted[i] = collapse_tool_result(message)
+        elif i in superseded:
+            fitted[i] = collapse_reply(message)
+        else:
+            continue
+        size = message_tokens(fitted[i])
+        total -= sizes[i] - size
+        sizes[i] = size
+    # Oldest turns go first; the first request and the current turn stay
+    keep = [True] * len(fitted)
+    for start, end in turns[1:-1]:
+        if total <= budget:
+            break
+        answered = any(start < i < end for i in protected)
+        for i in range(start, end):
+            # Protected replies survive together with the question they answered
+            if i in protected or (i == start and answered):
+                continue
+            keep[i] = False
+            total -= sizes[i]
+
+    result = [message for message, kept in zip(fitted, keep) if kept]
+    CONTEXT_TOKENS.observe(total, graph=graph)
+    CONTEXT_TRIMMED_TOKENS.inc(original - total, graph=graph)
+    return result
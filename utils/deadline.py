@@ -0,0 +1,48 @@
+import contextlib
+import contextvars
+import time
+from typing import Optional
+
+# Monotonic time by which the current tool call must finish (None: no deadline)
+_deadline = contextvars.ContextVar("tripforge_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting (or continuing to wait on) work after the tool call's deadline."""
+
+
+@contextlib.contextmanager
+def deadline_at(when: Optional[float]):
+    """
+    Bound blocking work started in this block (and threads given a copy of its context).
+
+    HTTP requests, rate limit waits and coalesced searches shorten their own
+    timeouts to the time left, so a call abandoned by the tool runner really
+    stops and frees its worker thread. An earlier deadline already in effect
+    is kept.
+    """
+    current = _deadline.get()
+    if when is None or (current is not None and current <= when):
+        yield
+        return
+    token = _deadline.set(when)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (at least 0), or None without one."""
+    when = _deadline.get()
+    return None if when is None else max(0.0, when - time.monotonic())
+
+
+def bounded(timeout: Optional[float]) -> Optional[float]:
+    """A timeout shortened to the current deadline; raises DeadlineExceeded once it has passed."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("the tool call ran out of time")
+    return left if timeout is None else min(timeout, left)
@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+from typing import Optional
+
+
+def date_window(start: str, end: Optional[str], max_days: int) -> list:
+    """
+    Expand an inclusive YYYY-MM-DD window into a list of dates.
+
+    Args:
+        start: First date of the window
+        end: Last date of the window (default: same as start)
+        max_days: Maximum number of dates in the window
+
+    Returns:
+        ISO date strings
+
+    Raises:
+        ValueError: A date is malformed or the window is longer than max_days
+    """
+    first = date.fromisoformat(start)
+    last = date.fromisoformat(end) if end else first
+    if last < first:
+        first, last = last, first
+    days = (last - first).days + 1
+    if days > max_days:
+        # Rejected rather than cut short, so no one mistakes a partial grid for the whole window
+        raise ValueError(f"{first.isoformat()} to {last.isoformat()} is {days} days; windows are limited to "
+                         f"{max_days} days, so split it into several calls")
+    return [(first + timedelta(days=offset)).isoformat() for offset in range(days)]
+
+
+def summarize_offers(offers: list) -> tuple:
+    """Return (cheapest price, fastest total duration) over all offers, None when unknown."""
+    prices = [offer.price for offer in offers if isinstance(offer.price, (int, float))]
+    durations = [offer.total_duration for offer in offers if isinstance(offer.total_duration, (int, float))]
+    return (min(prices) if prices else None, min(durations) if durations else None)
+
+
+def _cell(value, marked: bool, mark: str) -> str:
+    if value is None:
+        return "-"
+    return f"{value:,}{mark}" if marked else f"{value:,}"
+
+
+def _render_row_block(title: str, rows: dict) -> list:
+    """rows: date -> (price, duration) or an error string."""
+    prices = [cell[0] for cell in rows.values() if isinstance(cell, tuple) and cell[0] is not None]
+    durations = [cell[1] for cell in rows.values() if isinstance(cell, tuple) and cell[1] is not None]
+    cheapest = min(prices) if prices else None
+    fastest = min(durations) if durations else None
+
+    lines = [title]
+    for day, cell in rows.items():
+        weekday = date.fromisoformat(day).strftime("%a")
+        if not isinstance(cell, tuple):
+            lines.append(f"  {day} {weekday} | {cell}")
+            continue
+        price, duration = cell
+        lines.append(
+            f"  {day} {weekday} | {_cell(price, price is not None and price == cheapest, ' *')} "
+            f"| {_cell(duration, duration is not None and duration == fastest, ' ^')} mins"
+        )
+    return lines
+
+
+def render_fare_matrix(departure_city: str, arrival_city: str, outbound: dict, inbound: Optional[dict] = None) -> str:
+    """
+    Render per-date fare summaries as a compact grid.
+
+    Args:
+        departure_city: Origin airport code(s)
+        arrival_city: Destination airport code(s)
+        outbound: Departure date -> (cheapest price, fastest mins) or an error/empty message
+        inbound: Return date -> (cheapest price, fastest mins) or message, for return windows
+
+    Returns:
+        Text grid with the cheapest (*) and fastest (^) cells marked
+    """
+    lines = ["Fare matrix: cheapest fare (total for the group) | fastest duration; * = cheapest, ^ = fastest"]
+    lines += _render_row_block(f"Outbound {departure_city} -> {arrival_city}:", outbound)
+
+    if inbound:
+        lines += _render_row_block(f"Return {arrival_city} -> {departure_city}:", inbound)
+
+        # Round-trip totals from the cheapest one-way fares, only where return is after departure
+        out_prices = {d: c[0] for d, c in outbound.items() if isinstance(c, tuple) and c[0] is not None}
+        in_prices = {d: c[0] for d, c in inbound.items() if isinstance(c, tuple) and c[0] is not None}
+        totals = {
+            (out_day, in_day): out_price + in_price
+            for out_day, out_price in out_prices.items()
+            for in_day, in_price in in_prices.items()
+            if in_day > out_day
+        }
+        if totals:
+            best = min(totals.values())
+            in_days = sorted({in_day for _, in_day in totals})
+            lines.append("Round-trip totals (rows: departure, columns: return):")
+            lines.append("  " + " " * 10 + "".join(f"{in_day[5:]:>10}" for in_day in in_days))
+            for out_day in sorted({out_day for out_day, _ in totals}):
+                cells = []
+                for in_day in in_days:
+                    total = totals.get((out_day, in_day))
+                    cells.append(f"{_cell(total, total == best, '*'):>10}")
+                lines.append(f"  {out_day:<10}" + "".join(cells))
+
+    lines.append("Call search_flights for the chosen date(s) to get bookable options (results are cached).")
+    return "\n".join(lines)
@@ -0,0 +1,211 @@
+import re
+from typing import Optional
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """Map lat/lon degrees onto 3D unit vectors; chord length then orders points like great-circle distance."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_km(chord) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def km_to_chord(km: float) -> float:
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def haversine_km(lat, lon, latitudes, longitudes) -> np.ndarray:
+    """Great-circle distances in km from one point to many."""
+    return chord_to_km(np.linalg.norm(to_unit_vectors(latitudes, longitudes) - to_unit_vectors([lat], [lon]), axis=1))
+
+
+class KDTree:
+    """
+    Static 3-d tree over unit vectors, stored in flat arrays.
+
+    Built once per result set by recursive median splits (argpartition) on
+    the axis of widest spread. Nodes are plain tuples over ranges of one
+    permutation array, and leaves of up to LEAF_SIZE points are scanned with
+    a single vectorized distance computation.
+    """
+
+    # Large leaves: one numpy scan beats Python-level traversal, so a typical city is a single leaf
+    LEAF_SIZE = 128
+
+    def __init__(self, points: np.ndarray):
+        self.points = np.asarray(points, dtype=np.float64)
+        self._index = np.arange(len(self.points))
+        self._nodes = []    # (start, end, axis, split value, left node, right node); leaves have axis -1
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def _build(self, start: int, end: int) -> int:
+        node = len(self._nodes)
+        self._nodes.append(None)
+        if end - start <= self.LEAF_SIZE:
+            self._nodes[node] = (start, end, -1, 0.0, -1, -1)
+            return node
+        segment = self._index[start:end]
+        spread = np.ptp(self.points[segment], axis=0)
+        axis = int(np.argmax(spread))
+        mid = (end - start) // 2
+        order = np.argpartition(self.points[segment, axis], mid)
+        self._index[start:end] = segment[order]
+        split = self.points[self._index[start + mid], axis]
+        left = self._build(start, start + mid)
+        right = self._build(start + mid, end)
+        self._nodes[node] = (start, end, axis, split, left, right)
+        return node
+
+    def _search(self, target: np.ndarray, radius: float, k: Optional[int]) -> tuple:
+        """Return (indices, chord distances) within radius, keeping only the k nearest when k is set."""
+        found_idx, found_dist = np.zeros(0, dtype=np.intp), np.zeros(0)
+        bound = radius
+        stack = [0] if self._nodes else []
+        while stack:
+            start, end, axis, split, left, right = self._nodes[stack.pop()]
+            if axis >= 0:
+                diff = target[axis] - split
+                near, far = (left, right) if diff < 0 else (right, left)
+                # Far side only if the splitting plane is within the current search radius
+                if abs(diff) <= bound:
+                    stack.append(far)
+                stack.append(near)
+                continue
+            members = self._index[start:end]
+            dist = np.sqrt(((self.points[members] - target) ** 2).sum(axis=1))
+            keep = dist <= bound
+            found_idx = np.concatenate((found_idx, members[keep]))
+            found_dist = np.concatenate((found_dist, dist[keep]))
+            if k is not None and len(found_dist) >= k:
+                # Only the k best so far can survive; the k-th distance bounds the rest of the search
+                best = np.argpartition(found_dist, k - 1)[:k]
+                found_idx, found_dist = found_idx[best], found_dist[best]
+                bound = found_dist.max()
+        order = np.argsort(found_dist, kind="stable")
+        return found_idx[order], found_dist[order]
+
+    def nearest(self, target: np.ndarray, k: int) -> tuple:
+        return self._search(target, np.inf, k)
+
+    def within(self, target: np.ndarray, radius: float) -> tuple:
+        return self._search(target, radius, None)
+
+
+def _minutes(duration: str) -> Optional[float]:
+    """Parse "12 min" / "1 hr 5 min" into minutes."""
+    hours = re.search(r"(\d+)\s*h", duration or "")
+    minutes = re.search(r"(\d+)\s*m", duration or "")
+    if not hours and not minutes:
+        return None
+    return (int(hours.group(1)) * 60 if hours else 0) + (int(minutes.group(1)) if minutes else 0)
+
+
+def _normalize(name: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", str(name).lower()).split())
+
+
+class HotelGeoIndex:
+    """
+    Spatial index over the hotels of one search result.
+
+    Hotels without coordinates are left out of the tree. Attractions have no
+    coordinates in Google Hotels responses, so a named place is located at
+    the centroid of the hotels that list it under nearby_places, weighted
+    towards the hotels with the shortest travel time to it.
+    """
+
+    def __init__(self, offers: list):
+        self.offers = offers
+        located = [i for i, offer in enumerate(offers) if offer.latitude is not None and offer.longitude is not None]
+        self._offer_ids = np.array(located, dtype=np.int32)
+        self._latitudes = np.array([offers[i].latitude for i in located], dtype=np.float64)
+        self._longitudes = np.array([offers[i].longitude for i in located], dtype=np.float64)
+        self.tree = KDTree(to_unit_vectors(self._latitudes, self._longitudes) if located else np.zeros((0, 3)))
+        self._places: dict = {}     # normalized name -> locate_place result
+        self._place_table: Optional[list] = None
+
+    def __len__(self) -> int:
+        return len(self._offer_ids)
+
+    def locate_place(self, name: str) -> Optional[tuple]:
+        """
+        Estimate the coordinates of a nearby place named in the hotel results.
+
+        Args:
+            name: Place name, matched case-insensitively as whole words within a listed place (e.g. "baga beach")
+
+        Returns:
+            (latitude, longitude, matched place name) or None when no hotel lists it
+        """
+        wanted = _normalize(name)
+        if not wanted:
+            return None
+        if wanted not in self._places:
+            self._places[wanted] = self._locate(wanted)
+        return self._places[wanted]
+
+    def _place_rows(self) -> list:
+        """(row, normalized place name, original name, weight) for every nearby place, parsed once."""
+        if self._place_table is None:
+            table = []
+            for row, offer_id in enumerate(self._offer_ids):
+                for place in self.offers[offer_id].nearby_places:
+                    durations = [m for _, duration in place.transportations if (m := _minutes(duration)) is not None]
+                    weight = 1.0 / (1.0 + (min(durations) if durations else 30.0))
+                    table.append((row, _normalize(place.name or ""), place.name, weight))
+            self._place_table = table
+        return self._place_table
+
+    def _locate(self, wanted: str) -> Optional[tuple]:
+        rows, weights, matched = {}, [], None
+        # Only the query inside a place name counts, never the reverse: a listed "Airport" or "Beach"
+        # must not match every query that contains the word
+        padded = f" {wanted} "
+        for row, place_name, original, weight in self._place_rows():
+            if row in rows or not place_name or padded not in f" {place_name} ":
+                continue
+            rows[row] = len(weights)
+            weights.append(weight)
+            matched = matched or original
+        if not rows:
+            return None
+        selected = list(rows)
+        vectors = to_unit_vectors(self._latitudes[selected], self._longitudes[selected])
+        centre = np.average(vectors, axis=0, weights=weights)
+        centre /= np.linalg.norm(centre)
+        return float(np.degrees(np.arcsin(centre[2]))), float(np.degrees(np.arctan2(centre[1], centre[0]))), matched
+
+    def nearest(self, latitude: float, longitude: float, k: int = 5, max_km: Optional[float] = None) -> list:
+        """
+        Hotels closest to a point.
+
+        Args:
+            latitude: Point latitude in degrees
+            longitude: Point longitude in degrees
+            k: Maximum number of hotels
+            max_km: Ignore hotels further than this
+
+        Returns:
+            List of (offer index, distance in km), nearest first
+        """
+        target = to_unit_vectors([latitude], [longitude])[0]
+        if max_km is not None:
+            indices, chords = self.tree.within(target, km_to_chord(max_km))
+            indices, chords = indices[:k], chords[:k]
+        else:
+            indices, chords = self.tree.nearest(target, k)
+        return [(int(self._offer_ids[i]), float(km)) for i, km in zip(indices, chord_to_km(chords))]
+
+    def distances(self, latitude: float, longitude: float) -> np.ndarray:
+        """Distance in km from a point to every hotel (NaN for hotels without coordinates)."""
+        result = np.full(len(self.offers), np.nan)
+        result[self._offer_ids] = haversine_km(latitude, longitude, self._latitudes, self._longitudes)
+        return result
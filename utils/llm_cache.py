@@ -0,0 +1,110 @@
+import hashlib
+import json
+from typing import Optional
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration
+
+from utils.cache import SearchCache
+from utils.config import env_bool, env_float, env_int, env_str
+from utils.metrics import metrics
+
+LLM_CACHE_ENGINE = "llm"
+
+LLM_CACHE_LOOKUPS = metrics.counter(
+    "tripforge_llm_cache_lookups_total", "Chat model response cache lookups.", ("result",))
+
+
+def canonical_prompt(prompt: str) -> str:
+    """
+    Reduce a serialized message list to what makes two requests equivalent.
+
+    LangChain passes caches the dumps() of the messages, which includes message
+    IDs, provider metadata and token usage that differ between otherwise
+    identical conversations. Like core.llm.messages_key, only type, content,
+    tool calls and tool call IDs are kept.
+    """
+    try:
+        entries = json.loads(prompt)
+    except ValueError:
+        return prompt
+    if not isinstance(entries, list):
+        return prompt
+    canonical = []
+    for entry in entries:
+        fields = entry.get("kwargs", {}) if isinstance(entry, dict) else {}
+        item = {"type": fields.get("type"), "content": fields.get("content")}
+        if fields.get("tool_calls"):
+            item["tool_calls"] = [[call.get("name"), call.get("args")] for call in fields["tool_calls"]]
+        if fields.get("tool_call_id"):
+            item["tool_call_id"] = fields["tool_call_id"]
+        canonical.append(item)
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def response_cache_key(prompt: str, llm_string: str) -> str:
+    """Hash of the canonical messages plus the model string (model name, parameters and bound tools)."""
+    digest = hashlib.sha256()
+    digest.update(canonical_prompt(prompt).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(llm_string.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Exact-match cache of chat model responses, set as a model's `cache`.
+
+    Entries are stored in a SearchCache (TTL + LRU bounded by entries and
+    bytes, with an optional SQLite tier) under a hash of the canonicalized
+    messages and the model string. Tool-calling responses are cached like any
+    other, so a repeated conversation replays its tool calls as well; empty
+    responses are never stored.
+    """
+
+    def __init__(self, ttl: float = 24 * 60 * 60, max_entries: int = 256, max_bytes: int = 16 * 1024 * 1024,
+                 sqlite_path: Optional[str] = None):
+        self.store = SearchCache(ttls={LLM_CACHE_ENGINE: ttl}, default_ttl=ttl, max_entries=max_entries,
+                                 max_bytes=max_bytes, sqlite_path=sqlite_path)
+
+    @staticmethod
+    def _params(prompt: str, llm_string: str) -> dict:
+        return {"engine": LLM_CACHE_ENGINE, "key": response_cache_key(prompt, llm_string)}
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[list]:
+        cached = self.store.get(self._params(prompt, llm_string))
+        LLM_CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+        if cached is None:
+            return None
+        return [ChatGeneration(message=message) for message in messages_from_dict(cached["messages"])]
+
+    def update(self, prompt: str, llm_string: str, return_val: list) -> None:
+        messages = [generation.message for generation in return_val if isinstance(generation, ChatGeneration)]
+        if not messages or len(messages) != len(return_val):
+            return
+        if not any(message.content or getattr(message, "tool_calls", None) for message in messages):
+            return
+        self.store.set(self._params(prompt, llm_string), {"messages": [message_to_dict(m) for m in messages]})
+
+    def clear(self, **kwargs) -> None:
+        self.store.clear()
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+
+def llm_cache_from_env() -> Optional[LLMResponseCache]:
+    """Return an LLMResponseCache when TRIPFORGE_LLM_CACHE is enabled, else None."""
+    if not env_bool("TRIPFORGE_LLM_CACHE", False):
+        return None
+    return LLMResponseCache(
+        ttl=env_float("TRIPFORGE_LLM_CACHE_TTL", 24 * 60 * 60),
+        max_entries=env_int("TRIPFORGE_LLM_CACHE_MAX_ENTRIES", 256),
+        max_bytes=env_int("TRIPFORGE_LLM_CACHE_MAX_BYTES", 16 * 1024 * 1024),
+        sqlite_path=env_str("TRIPFORGE_LLM_CACHE_SQLITE_PATH") or None,
+    )
+
+
+# Process-wide so identical conversations in different sessions share responses (None when disabled)
+llm_response_cache = llm_cache_from_env()
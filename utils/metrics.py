@@ -0,0 +1,307 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from langchain_core.runnables import RunnableLambda
+
+from utils.config import env_int, env_str
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 8, 12, 20)
+
+
+def _label_text(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def prometheus_lines(self) -> list:
+        with self._lock:
+            return [f"{self.name}{_label_text(self.labels, key)} {value:g}" for key, value in sorted(self._values.items())]
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [{"labels": dict(zip(self.labels, key)), "value": value} for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, with optional labels."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}   # label values -> [bucket counts..., +Inf count, sum]
+
+    def _bounds(self) -> list:
+        return [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def prometheus_lines(self) -> list:
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for le, count in zip(self._bounds(), series[:-1]):
+                    cumulative += count
+                    bucket_labels = _label_text(self.labels, key, 'le="%s"' % le)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series[-1]:g}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {cumulative}")
+        return lines
+
+    def snapshot(self) -> list:
+        with self._lock:
+            result = []
+            for key, series in sorted(self._series.items()):
+                cumulative, buckets = 0, {}
+                for le, count in zip(self._bounds(), series[:-1]):
+                    cumulative += count
+                    buckets[le] = cumulative
+                result.append({
+                    "labels": dict(zip(self.labels, key)),
+                    "count": cumulative,
+                    "sum": series[-1],
+                    "mean": series[-1] / cumulative if cumulative else 0.0,
+                    "buckets": buckets,
+                })
+            return result
+
+
+class MetricsRegistry:
+    """Named metrics rendered as Prometheus exposition text or a JSON snapshot."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render_prometheus(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.prometheus_lines())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Return all metrics as a JSON-serializable dict."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: {"type": metric.kind, "help": metric.help, "series": metric.snapshot()} for metric in metrics}
+
+    def reset(self) -> None:
+        """Drop every recorded value (metric definitions are kept)."""
+        with self._lock:
+            for metric in self._metrics.values():
+                with metric._lock:
+                    (metric._values if isinstance(metric, Counter) else metric._series).clear()
+
+
+metrics = MetricsRegistry()
+
+NODE_SECONDS = metrics.histogram(
+    "tripforge_node_duration_seconds", "Wall time of each LangGraph node run.", ("graph", "node"))
+TURN_SECONDS = metrics.histogram(
+    "tripforge_turn_duration_seconds", "Wall time of one graph invocation (a user turn).", ("graph",))
+TURN_FIRST_TOKEN_SECONDS = metrics.histogram(
+    "tripforge_turn_first_token_seconds", "Time from a streamed user turn's start to its first response token.", ("graph",))
+TURN_ITERATIONS = metrics.histogram(
+    "tripforge_turn_llm_iterations", "LLM calls (agent loop iterations) per graph invocation.", ("graph",), COUNT_BUCKETS)
+LLM_SECONDS = metrics.histogram(
+    "tripforge_llm_duration_seconds", "Latency of chat model calls.", ("graph",))
+LLM_SKIPPED = metrics.counter(
+    "tripforge_llm_calls_skipped_total", "Chat model calls answered locally instead.", ("graph", "reason"))
+LLM_TOKENS = metrics.counter(
+    "tripforge_llm_tokens_total", "Tokens reported by the chat model (usage metadata).", ("graph", "kind"))
+TOOL_SECONDS = metrics.histogram(
+    "tripforge_tool_duration_seconds", "Latency of tool calls.", ("tool", "status"))
+TOOL_PAYLOAD_BYTES = metrics.histogram(
+    "tripforge_tool_payload_bytes", "Size of tool results sent back to the model.", ("tool",), SIZE_BUCKETS)
+TOOL_TIMEOUTS = metrics.counter(
+    "tripforge_tool_timeouts_total", "Tool calls that did not finish within the tool timeout.", ("tool",))
+
+# Mutable per-turn counters, shared with nodes and tool threads through context copies
+_current_turn = contextvars.ContextVar("tripforge_turn", default=None)
+
+
+@contextlib.contextmanager
+def track_turn(graph: str):
+    """Time one graph invocation and record its LLM loop iterations."""
+    turn = {"llm_calls": 0}
+    token = _current_turn.set(turn)
+    started = time.perf_counter()
+    try:
+        yield turn
+    finally:
+        _current_turn.reset(token)
+        TURN_SECONDS.observe(time.perf_counter() - started, graph=graph)
+        TURN_ITERATIONS.observe(turn["llm_calls"], graph=graph)
+
+
+def instrument_node(graph: str, node: str, fn, afn=None):
+    """
+    Wrap a graph node so every run records its wall time.
+
+    Args:
+        graph: Graph name for the metric labels
+        node: Node name for the metric labels
+        fn: Sync node function
+        afn: Async node function used by ainvoke/astream; without it fn runs
+            inline on the event loop, which suits nodes that never block
+
+    Returns:
+        A runnable to pass to StateGraph.add_node
+    """
+    @functools.wraps(fn)
+    def wrapper(state):
+        started = time.perf_counter()
+        try:
+            return fn(state)
+        finally:
+            NODE_SECONDS.observe(time.perf_counter() - started, graph=graph, node=node)
+
+    async def async_wrapper(state):
+        started = time.perf_counter()
+        try:
+            return await afn(state) if afn is not None else fn(state)
+        finally:
+            NODE_SECONDS.observe(time.perf_counter() - started, graph=graph, node=node)
+
+    return RunnableLambda(wrapper, afunc=async_wrapper, name=fn.__name__)
+
+
+def record_llm_call(graph: str, response, seconds: float) -> None:
+    """Record latency and prompt/completion tokens of a chat model response."""
+    LLM_SECONDS.observe(seconds, graph=graph)
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        LLM_TOKENS.inc(usage.get("input_tokens", 0), graph=graph, kind="prompt")
+        LLM_TOKENS.inc(usage.get("output_tokens", 0), graph=graph, kind="completion")
+    turn = _current_turn.get()
+    if turn is not None:
+        turn["llm_calls"] += 1
+
+
+def record_tool_call(tool: str, seconds: float, result: str, status: str = "ok") -> None:
+    """Record latency and result size of a tool call."""
+    TOOL_SECONDS.observe(seconds, tool=tool, status=status)
+    TOOL_PAYLOAD_BYTES.observe(len(result.encode("utf-8")), tool=tool)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, content_type = metrics.render_prometheus(), "text/plain; version=0.0.4"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, content_type = json.dumps(metrics.snapshot()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics (Prometheus text) and /metrics.json on a background thread.
+
+    Safe to call repeatedly (e.g. on every Streamlit rerun); only the first call
+    starts a server. The endpoints have no authentication, so they only listen
+    on localhost unless a host is given explicitly.
+
+    Args:
+        port: Port to listen on (default: TRIPFORGE_METRICS_PORT; 0/unset disables)
+        host: Interface to bind (default: TRIPFORGE_METRICS_HOST, else 127.0.0.1)
+
+    Returns:
+        The running server, or None when disabled
+    """
+    global _server
+    port = env_int("TRIPFORGE_METRICS_PORT", 0) if port is None else port
+    if not port:
+        return None
+    host = host or env_str("TRIPFORGE_METRICS_HOST", "127.0.0.1")
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="tripforge-metrics", daemon=True).start()
+    return _server
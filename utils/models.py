@@ -0,0 +1,177 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+@dataclass(frozen=True, slots=True)
+class Layover:
+    """A connection between two legs of a flight itinerary."""
+    name: Optional[str] = None
+    duration: Optional[int] = None      # minutes
+    overnight: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class FlightLeg:
+    """A single flight segment."""
+    airline: Optional[str] = None
+    flight_number: Optional[str] = None
+    travel_class: Optional[str] = None
+    departure_airport: Optional[str] = None
+    departure_id: Optional[str] = None
+    departure_time: Optional[str] = None
+    arrival_airport: Optional[str] = None
+    arrival_id: Optional[str] = None
+    arrival_time: Optional[str] = None
+    duration: Optional[int] = None      # minutes
+    airplane: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class FlightOffer:
+    """A bookable flight option made of one or more legs."""
+    legs: Tuple[FlightLeg, ...] = ()
+    layovers: Tuple[Layover, ...] = ()
+    total_duration: Optional[int] = None    # minutes
+    price: Optional[int] = None
+    type: Optional[str] = None
+    airline_logo: Optional[str] = None
+    departure_token: Optional[str] = None
+    best: bool = False                      # listed under Google's "best flights"
+
+
+@dataclass(frozen=True, slots=True)
+class NearbyPlace:
+    """A point of interest near a hotel with the ways to get there."""
+    name: Optional[str] = None
+    transportations: Tuple[Tuple[str, str], ...] = ()  # (type, duration)
+
+
+@dataclass(frozen=True, slots=True)
+class HotelOffer:
+    """A hotel or vacation rental returned by Google Hotels."""
+    name: Optional[str] = None
+    type: Optional[str] = None
+    overall_rating: Optional[float] = None
+    reviews: Optional[int] = None
+    rate_per_night: Optional[str] = None
+    rate_before_taxes: Optional[str] = None
+    num_guests: Optional[int] = None
+    source: Optional[str] = None
+    source_logo: Optional[str] = None
+    property_token: Optional[str] = None
+    link: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    check_in_time: Optional[str] = None
+    check_out_time: Optional[str] = None
+    essential_info: Tuple[str, ...] = ()
+    amenities: Tuple[str, ...] = ()
+    excluded_amenities: Tuple[str, ...] = ()
+    nearby_places: Tuple[NearbyPlace, ...] = ()
+    image: Optional[str] = None
+
+
+def _parse_leg(leg: dict) -> FlightLeg:
+    departure = leg.get('departure_airport', {})
+    arrival = leg.get('arrival_airport', {})
+    return FlightLeg(
+        airline=leg.get('airline'),
+        flight_number=leg.get('flight_number'),
+        travel_class=leg.get('travel_class'),
+        departure_airport=departure.get('name'),
+        departure_id=departure.get('id'),
+        departure_time=departure.get('time'),
+        arrival_airport=arrival.get('name'),
+        arrival_id=arrival.get('id'),
+        arrival_time=arrival.get('time'),
+        duration=leg.get('duration'),
+        airplane=leg.get('airplane'),
+    )
+
+
+def _parse_flight(flight: dict, best: bool) -> FlightOffer:
+    return FlightOffer(
+        legs=tuple(_parse_leg(leg) for leg in flight.get('flights', [])),
+        layovers=tuple(
+            Layover(
+                name=layover.get('name'),
+                duration=layover.get('duration'),
+                overnight=bool(layover.get('overnight')),
+            )
+            for layover in flight.get('layovers', [])
+        ),
+        total_duration=flight.get('total_duration'),
+        price=flight.get('price'),
+        type=flight.get('type'),
+        airline_logo=flight.get('airline_logo'),
+        departure_token=flight.get('departure_token'),
+        best=best,
+    )
+
+
+def parse_flight_offers(results: dict) -> list:
+    """
+    Parse a Google Flights response into FlightOffer objects.
+
+    Args:
+        results: Decoded SerpAPI google_flights response
+
+    Returns:
+        Every offer in the response, "best flights" first
+    """
+    offers = [_parse_flight(flight, True) for flight in results.get('best_flights') or []]
+    offers.extend(_parse_flight(flight, False) for flight in results.get('other_flights') or [])
+    return offers
+
+
+def select_flight_offers(offers: list, limit: int = 3) -> list:
+    """Pick the offers shown to the model: top "best flights", else top other flights."""
+    best = [offer for offer in offers if offer.best]
+    return (best or offers)[:limit]
+
+
+def _parse_hotel(hotel: dict) -> HotelOffer:
+    rate = hotel.get('rate_per_night', {})
+    price = (hotel.get('prices') or [{}])[0]
+    coords = hotel.get('gps_coordinates', {})
+    return HotelOffer(
+        name=hotel.get('name'),
+        type=hotel.get('type'),
+        overall_rating=hotel.get('overall_rating'),
+        reviews=hotel.get('reviews'),
+        rate_per_night=rate.get('lowest'),
+        rate_before_taxes=rate.get('before_taxes_fees'),
+        num_guests=price.get('num_guests'),
+        source=price.get('source'),
+        source_logo=price.get('logo'),
+        property_token=hotel.get('property_token'),
+        link=hotel.get('link', hotel.get('serpapi_property_details_link')),
+        latitude=coords.get('latitude'),
+        longitude=coords.get('longitude'),
+        check_in_time=hotel.get('check_in_time'),
+        check_out_time=hotel.get('check_out_time'),
+        essential_info=tuple(hotel.get('essential_info', [])),
+        amenities=tuple(hotel.get('amenities', [])),
+        excluded_amenities=tuple(hotel.get('excluded_amenities', [])),
+        nearby_places=tuple(
+            NearbyPlace(
+                name=place.get('name'),
+                transportations=tuple((t['type'], t['duration']) for t in place.get('transportations', [])),
+            )
+            for place in hotel.get('nearby_places', [])
+        ),
+        image=(hotel.get('images') or [{}])[0].get('original_image'),
+    )
+
+
+def parse_hotel_offers(results: dict) -> list:
+    """
+    Parse a Google Hotels response into HotelOffer objects.
+
+    Args:
+        results: Decoded SerpAPI google_hotels response
+
+    Returns:
+        Every property in the response, in SerpAPI order
+    """
+    return [_parse_hotel(hotel) for hotel in results.get('properties', [])]
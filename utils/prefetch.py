@@ -0,0 +1,207 @@
+import contextvars
+import functools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from utils.airports import airport_index
+from utils.cache import make_cache_key, search_cache
+from utils.config import env_bool, env_float, env_int
+from utils.rate_limiter import search_priority
+from utils.tools import add_search_listener, tools_dict
+
+# Set while a prefetch job runs so the search listener can tell prefetches from real tool calls
+_prefetching = contextvars.ContextVar("tripforge_prefetching", default=False)
+
+
+def airport_code(value) -> Optional[str]:
+    """Return an IATA code from "GOI" or "Goa (GOI)", or None for plain city names."""
+    text = str(value or "").strip()
+    if re.fullmatch(r"[A-Za-z]{3}", text):
+        return text.upper()
+    match = re.search(r"\(([A-Z]{3})\)", text)
+    return match.group(1) if match else None
+
+
+def city_name(value) -> Optional[str]:
+    """Return the city part of "Goa" or "Goa (GOI)", or the city served by a bare IATA code."""
+    text = re.sub(r"\([^)]*\)", "", str(value or "")).strip()
+    if not text:
+        return None
+    if re.fullmatch(r"[A-Z]{3}", text):
+        return airport_index.city_for(text)
+    return text
+
+
+def _count(value, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def plan_searches(preferences: dict) -> list:
+    """
+    Predict the tool calls the itinerary LLM will make for a set of preferences.
+
+    Mirrors the phase 2 prompt rules: one-way outbound and return flights with
+    IATA codes and default optional parameters, and a "<city> hotels" search
+    for single-destination trips.
+
+    Args:
+        preferences: Draft or final preferences dictionary
+
+    Returns:
+        List of (tool_name, kwargs) tuples; empty when key slots are missing
+    """
+    departure = airport_code(preferences.get('departure_city'))
+    arrival = airport_code(preferences.get('arrival_city'))
+    departure_date = preferences.get('departure_date')
+    return_date = preferences.get('return_date')
+    adults = _count(preferences.get('adults'), 1)
+    children = _count(preferences.get('children'), 0)
+
+    planned = []
+    if departure and arrival and departure_date:
+        travellers = {"adults": adults, "children": children}
+        planned.append(("search_flights", {"departure_city": departure, "arrival_city": arrival,
+                                           "departure_date": departure_date, **travellers}))
+        if return_date:
+            planned.append(("search_flights", {"departure_city": arrival, "arrival_city": departure,
+                                               "departure_date": return_date, **travellers}))
+
+    city = city_name(preferences.get('arrival_city'))
+    if city and departure_date and return_date and not preferences.get('multi_city'):
+        planned.append(("search_hotels", {"query": f"{city} hotels", "check_in_date": departure_date,
+                                          "check_out_date": return_date, "adults": adults, "children": children}))
+    return planned
+
+
+class Prefetcher:
+    """
+    Speculatively runs the searches a session is about to need.
+
+    Jobs run on a small background pool and simply call the tools, which warms
+    the shared search cache. Every search the tools perform is observed; the
+    first real (non-prefetch) lookup of a prefetched search counts as a hit.
+    Re-planning for a session cancels its queued jobs that no longer match
+    and skips jobs that already finished, and prefetched searches that are
+    never used age out (with the record of finished jobs) after max_age seconds.
+    """
+
+    def __init__(self, max_workers: int = 4, max_age: float = 15 * 60, enabled: bool = True):
+        self.enabled = enabled
+        self.max_age = max_age
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tripforge-prefetch")
+        self._lock = threading.Lock()
+        self._jobs: dict = {}           # session_id -> {job_key: Future} of queued and running jobs
+        self._completed: dict = {}      # session_id -> {job_key: finish time} of jobs that already ran
+        self._prefetched: dict = {}     # search cache key -> prefetch time
+        self._stats = {"planned": 0, "started": 0, "cancelled": 0, "prefetched": 0, "hits": 0, "expired": 0}
+        add_search_listener(self._observe)
+
+    def prefetch(self, session_id: str, preferences: dict) -> int:
+        """
+        Start (or re-plan) prefetches for a session.
+
+        Args:
+            session_id: Identifier of the conversation
+            preferences: Draft or final preferences
+
+        Returns:
+            Number of new prefetch jobs started
+        """
+        if not self.enabled or not preferences:
+            return 0
+        planned = {
+            make_cache_key({"tool": name, **kwargs}): (name, kwargs)
+            for name, kwargs in plan_searches(preferences)
+        }
+        submitted = []
+        with self._lock:
+            self._expire()
+            jobs = self._jobs.setdefault(session_id, {})
+            completed = self._completed.get(session_id, {})
+            for job_key in [job_key for job_key in jobs if job_key not in planned]:
+                if jobs.pop(job_key).cancel():
+                    self._stats["cancelled"] += 1
+            for job_key, (name, kwargs) in planned.items():
+                if job_key in jobs or job_key in completed:
+                    continue
+                ctx = contextvars.copy_context()
+                jobs[job_key] = self._pool.submit(ctx.run, self._run, name, kwargs)
+                submitted.append((job_key, jobs[job_key]))
+            if not jobs:
+                del self._jobs[session_id]
+            self._stats["planned"] += len(planned)
+            self._stats["started"] += len(submitted)
+        # Outside the lock: a job that already finished runs its callback right here
+        for job_key, future in submitted:
+            future.add_done_callback(functools.partial(self._job_done, session_id, job_key))
+        return len(submitted)
+
+    def discard(self, session_id: str) -> None:
+        """Cancel every queued prefetch of a session (e.g. on reset)."""
+        with self._lock:
+            self._completed.pop(session_id, None)
+            for future in self._jobs.pop(session_id, {}).values():
+                if future.cancel():
+                    self._stats["cancelled"] += 1
+
+    def _job_done(self, session_id: str, job_key: str, future) -> None:
+        """Move a finished job to the session's completed jobs; cancelled ones were already removed."""
+        if future.cancelled():
+            return
+        with self._lock:
+            jobs = self._jobs.get(session_id)
+            if jobs is not None and jobs.get(job_key) is future:
+                del jobs[job_key]
+                if not jobs:
+                    del self._jobs[session_id]
+                self._completed.setdefault(session_id, {})[job_key] = time.time()
+
+    def _run(self, name: str, kwargs: dict) -> None:
+        _prefetching.set(True)
+        # Speculative searches only use rate limit capacity that real turns leave over
+        with search_priority("prefetch"):
+            tools_dict[name].func(**kwargs)
+
+    def _observe(self, params: dict) -> None:
+        key = make_cache_key(params)
+        with self._lock:
+            if _prefetching.get():
+                if key not in self._prefetched:
+                    self._prefetched[key] = time.time()
+                    self._stats["prefetched"] += 1
+            elif self._prefetched.pop(key, None) is not None:
+                self._stats["hits"] += 1
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.max_age
+        for key in [key for key, prefetched_at in self._prefetched.items() if prefetched_at < cutoff]:
+            del self._prefetched[key]
+            self._stats["expired"] += 1
+        # Older results may have left the cache, so such jobs can run again
+        for session_id, completed in list(self._completed.items()):
+            for job_key in [job_key for job_key, finished_at in completed.items() if finished_at < cutoff]:
+                del completed[job_key]
+            if not completed:
+                del self._completed[session_id]
+
+    def stats(self) -> dict:
+        """Return prefetch counters and the hit rate (used / prefetched searches)."""
+        with self._lock:
+            self._expire()
+            stats = dict(self._stats)
+            stats["pending"] = len(self._prefetched)
+            stats["hit_rate"] = stats["hits"] / stats["prefetched"] if stats["prefetched"] else 0.0
+            return stats
+
+
+prefetcher = Prefetcher(
+    max_workers=env_int("TRIPFORGE_PREFETCH_WORKERS", 4),
+    max_age=env_float("TRIPFORGE_PREFETCH_MAX_AGE", search_cache.ttl_for("google_flights")),
+    enabled=env_bool("TRIPFORGE_PREFETCH", True),
+)
@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+# Criterion weights per named ordering; every criterion is "lower is better"
+RANKING_PRESETS = {
+    "balanced": {"price": 0.5, "duration": 0.3, "stops": 0.2},
+    "cheapest": {"price": 1.0, "duration": 0.05},
+    "fastest": {"duration": 1.0, "price": 0.05},
+    "fewest_stops": {"stops": 1.0, "duration": 0.2, "price": 0.1},
+    "earliest": {"departure_hour": 1.0, "price": 0.05},
+    "latest": {"departure_hour": -1.0, "price": 0.05},
+}
+
+PARETO_CRITERIA = ("price", "duration", "stops")
+
+
+@dataclass(frozen=True, slots=True)
+class FlightColumns:
+    """Column-oriented view of a flight result set; unknown values are NaN."""
+    price: np.ndarray
+    duration: np.ndarray
+    stops: np.ndarray
+    overnight: np.ndarray
+    departure_hour: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    def matrix(self, criteria: tuple) -> np.ndarray:
+        return np.column_stack([getattr(self, name).astype(np.float64) for name in criteria])
+
+
+def _hour(timestamp: Optional[str]) -> float:
+    """Hour of day as a float from "YYYY-MM-DD HH:MM"."""
+    try:
+        hours, minutes = str(timestamp).rsplit(" ", 1)[-1].split(":")[:2]
+        return int(hours) + int(minutes) / 60
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _number(value) -> float:
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+
+def flight_columns(offers: list) -> FlightColumns:
+    """
+    Convert parsed FlightOffer objects into columnar numpy arrays.
+
+    Args:
+        offers: FlightOffer list (e.g. every offer of a stored search)
+
+    Returns:
+        FlightColumns with one row per offer, in the same order
+    """
+    count = len(offers)
+    return FlightColumns(
+        price=np.fromiter((_number(offer.price) for offer in offers), np.float64, count),
+        duration=np.fromiter((_number(offer.total_duration) for offer in offers), np.float64, count),
+        stops=np.fromiter((len(offer.layovers) for offer in offers), np.int8, count),
+        overnight=np.fromiter((any(layover.overnight for layover in offer.layovers) for offer in offers), np.bool_, count),
+        departure_hour=np.fromiter(
+            (_hour(offer.legs[0].departure_time) if offer.legs else np.nan for offer in offers), np.float64, count
+        ),
+    )
+
+
+def pareto_front(values: np.ndarray) -> np.ndarray:
+    """
+    Mark the rows no other row dominates (all criteria minimized; NaN counts as worst).
+
+    Args:
+        values: (n, k) array of criteria
+
+    Returns:
+        Boolean mask of Pareto-optimal rows
+    """
+    if len(values) == 0:
+        return np.zeros(0, dtype=bool)
+    filled = np.where(np.isnan(values), np.inf, values)
+    # no_worse[i, j]: row j is <= row i on every criterion; better[i, j]: strictly < on at least one
+    no_worse = (filled[None, :, :] <= filled[:, None, :]).all(axis=2)
+    better = (filled[None, :, :] < filled[:, None, :]).any(axis=2)
+    return ~(no_worse & better).any(axis=1)
+
+
+def weighted_scores(columns: FlightColumns, weights: dict) -> np.ndarray:
+    """
+    Score every row as a weighted sum of min-max normalized criteria (lower is better).
+
+    Negative weights reverse a criterion (e.g. later departures first). Unknown
+    values score as the worst of their column.
+    """
+    scores = np.zeros(len(columns))
+    for name, weight in weights.items():
+        column = getattr(columns, name).astype(np.float64)
+        known = ~np.isnan(column)
+        if not known.any():
+            continue
+        low, high = column[known].min(), column[known].max()
+        spread = high - low
+        normalized = (column - low) / spread if spread else np.zeros_like(column)
+        if weight < 0:
+            normalized = 1 - normalized
+        scores += abs(weight) * np.where(known, normalized, 1.0)
+    return scores
+
+
+def rank_flights(
+    columns: FlightColumns,
+    sort_by: str = "balanced",
+    max_stops: Optional[int] = None,
+    avoid_overnight: bool = False,
+    depart_after: Optional[float] = None,
+    depart_before: Optional[float] = None,
+    weights: Optional[dict] = None,
+) -> np.ndarray:
+    """
+    Filter and order a flight result set locally.
+
+    Args:
+        columns: Columns of the full result set
+        sort_by: Name of a RANKING_PRESETS entry (ignored when weights are given)
+        max_stops: Drop options with more layovers
+        avoid_overnight: Drop options with an overnight layover
+        depart_after: Earliest departure hour (0-24)
+        depart_before: Latest departure hour (0-24)
+        weights: Custom criterion weights, e.g. {"price": 0.7, "stops": 0.3}
+
+    Returns:
+        Row indices of the remaining offers, best first
+    """
+    if weights is None:
+        if sort_by not in RANKING_PRESETS:
+            raise ValueError(f"Unknown sort_by '{sort_by}'. Use one of: {', '.join(RANKING_PRESETS)}")
+        weights = RANKING_PRESETS[sort_by]
+    mask = np.ones(len(columns), dtype=bool)
+    if max_stops is not None:
+        mask &= columns.stops <= max_stops
+    if avoid_overnight:
+        mask &= ~columns.overnight
+    if depart_after is not None:
+        mask &= columns.departure_hour >= depart_after
+    if depart_before is not None:
+        mask &= columns.departure_hour <= depart_before
+    candidates = np.flatnonzero(mask)
+    scores = weighted_scores(columns, weights)[candidates]
+    prices = np.nan_to_num(columns.price[candidates], nan=np.inf)
+    # lexsort sorts by the last key first: score, then price as the tie-break
+    return candidates[np.lexsort((prices, scores))]
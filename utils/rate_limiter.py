@@ -0,0 +1,306 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from utils.config import env_float, env_int, env_str
+from utils.deadline import remaining as time_left
+from utils.metrics import metrics
+
+# Lower value = served first
+PRIORITIES = {"interactive": 0, "refinement": 1, "prefetch": 2}
+
+# How long each class may queue for a token before giving up (seconds)
+DEFAULT_MAX_WAIT = {
+    "interactive": env_float("TRIPFORGE_SERPAPI_MAX_WAIT_INTERACTIVE", 30.0),
+    "refinement": env_float("TRIPFORGE_SERPAPI_MAX_WAIT_REFINEMENT", 20.0),
+    "prefetch": env_float("TRIPFORGE_SERPAPI_MAX_WAIT_PREFETCH", 5.0),
+}
+
+
+class PriorityClaim:
+    """Priority class of a block of searches; raise_priority() can move it up while its searches queue."""
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+# Priority of searches started from the current context (set per turn / prefetch job); None means interactive
+_priority = contextvars.ContextVar("tripforge_search_priority", default=None)
+
+QUEUE_DEPTH = metrics.gauge(
+    "tripforge_serpapi_queue_depth", "Searches waiting for a SerpAPI rate limit token.", ("priority",))
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    "tripforge_serpapi_queue_wait_seconds", "Time searches waited for a SerpAPI rate limit token.", ("priority",))
+REJECTED = metrics.counter(
+    "tripforge_serpapi_rejected_total", "Searches refused by the rate limiter.", ("priority", "reason"))
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a search cannot get quota before its deadline (or the monthly quota is used up)."""
+
+
+def current_priority() -> str:
+    claim = _priority.get()
+    return claim.name if claim is not None else "interactive"
+
+
+def raise_priority(claim: Optional[PriorityClaim], name: str) -> None:
+    """
+    Move a claim up to a higher priority class; lower or equal classes are ignored.
+
+    Used when an interactive search joins an identical search that a prefetch
+    or background refresh already started, so the shared request is not left
+    queueing (and timing out) as a prefetch.
+    """
+    if claim is not None and PRIORITIES[name] < PRIORITIES[claim.name]:
+        claim.name = name
+
+
+@contextlib.contextmanager
+def search_priority(name: str):
+    """Run searches started in this block (and tool threads it spawns) with the given priority class."""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority {name!r}; expected one of {list(PRIORITIES)}")
+    with claimed_priority(PriorityClaim(name)):
+        yield
+
+
+@contextlib.contextmanager
+def claimed_priority(claim: PriorityClaim):
+    """Run searches started in this block under an existing claim, so raising it affects only them."""
+    token = _priority.set(claim)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimiter:
+    """
+    Process-wide token bucket for upstream SerpAPI requests, with priority queueing.
+
+    Tokens refill continuously at rate_per_minute up to burst. Waiting callers
+    are served strictly by (priority, arrival order), so interactive searches
+    overtake queued refinements and prefetches. A caller that cannot get a
+    token before its deadline gets RateLimitExceeded instead of hitting the
+    upstream limit. A waiting caller whose PriorityClaim is raised moves up
+    the queue and gets the higher class's deadline. An optional monthly quota
+    refuses requests once used up. A rate of 0 disables the per-minute limit.
+
+    The monthly count lives in this process unless state_path names a SQLite
+    file (e.g. the search cache's), where it survives restarts and is shared
+    by processes using the same file.
+    """
+
+    def __init__(self, rate_per_minute: float = 0, burst: Optional[int] = None, monthly_quota: int = 0,
+                 max_wait: Optional[dict] = None, state_path: Optional[str] = None):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst or int(rate_per_minute) or 1)
+        self.monthly_quota = monthly_quota
+        self.max_wait = dict(DEFAULT_MAX_WAIT, **(max_wait or {}))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._month = None
+        self._used_this_month = 0
+        self._waiters = []      # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._db = None
+        if state_path and monthly_quota:
+            self._db = sqlite3.connect(state_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("CREATE TABLE IF NOT EXISTS serpapi_quota (month TEXT PRIMARY KEY, used INTEGER NOT NULL)")
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _roll_month(self) -> str:
+        month = datetime.now().strftime("%Y-%m")
+        if month != self._month:
+            self._month, self._used_this_month = month, 0
+        return month
+
+    def _quota_exceeded(self, priority: str) -> RateLimitExceeded:
+        REJECTED.inc(priority=priority, reason="monthly_quota")
+        return RateLimitExceeded(f"monthly SerpAPI quota of {self.monthly_quota} searches is used up")
+
+    def _check_quota(self, priority: str) -> None:
+        """Refuse early, before queueing, when the quota is already used up (_use_quota is the real check)."""
+        if not self.monthly_quota:
+            return
+        month = self._roll_month()
+        if self._db is not None:
+            # Other processes may have used quota since the last search
+            row = self._db.execute("SELECT used FROM serpapi_quota WHERE month = ?", (month,)).fetchone()
+            self._used_this_month = row[0] if row else 0
+        if self._used_this_month >= self.monthly_quota:
+            raise self._quota_exceeded(priority)
+
+    def _use_quota(self) -> bool:
+        """Count one search against the monthly quota as its token is taken; False (nothing counted) once used up."""
+        month = self._roll_month()
+        if self._db is None:
+            if self.monthly_quota and self._used_this_month >= self.monthly_quota:
+                return False
+            self._used_this_month += 1
+            return True
+        # Checked and counted in one statement, so processes sharing the file cannot both take the last search
+        self._db.execute("INSERT OR IGNORE INTO serpapi_quota VALUES (?, 0)", (month,))
+        counted = self._db.execute("UPDATE serpapi_quota SET used = used + 1 WHERE month = ? AND used < ?",
+                                   (month, self.monthly_quota)).rowcount
+        if not counted:
+            self._used_this_month = self.monthly_quota
+            return False
+        self._used_this_month += 1
+        return True
+
+    def _try_take(self, entry: tuple, priority: str) -> float:
+        """Take a token if entry is first in line; returns 0 on success, else seconds to wait."""
+        if self._waiters[0] != entry:
+            return 0.05
+        self._refill()
+        if self._tokens >= 1:
+            heapq.heappop(self._waiters)
+            if not self._use_quota():
+                # The quota ran out while this search queued: refuse it and leave the token unused
+                self._cond.notify_all()
+                QUEUE_DEPTH.dec(priority=priority)
+                raise self._quota_exceeded(priority)
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _enqueue(self, priority: str) -> tuple:
+        self._check_quota(priority)
+        entry = (PRIORITIES[priority], next(self._seq))
+        heapq.heappush(self._waiters, entry)
+        QUEUE_DEPTH.inc(priority=priority)
+        return entry
+
+    def _promote(self, entry: tuple, priority: str, claim: Optional[PriorityClaim]):
+        """Re-queue entry under its claim's class if the claim was raised while waiting; returns (entry, priority)."""
+        if claim is None or PRIORITIES[claim.name] >= entry[0]:
+            return entry, priority
+        self._waiters.remove(entry)
+        entry = (PRIORITIES[claim.name], entry[1])
+        self._waiters.append(entry)
+        heapq.heapify(self._waiters)
+        QUEUE_DEPTH.dec(priority=priority)
+        QUEUE_DEPTH.inc(priority=claim.name)
+        return entry, claim.name
+
+    def _give_up(self, entry: tuple, priority: str, waited: float) -> RateLimitExceeded:
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        self._cond.notify_all()
+        QUEUE_DEPTH.dec(priority=priority)
+        REJECTED.inc(priority=priority, reason="deadline")
+        return RateLimitExceeded(f"SerpAPI rate limit: no capacity within {waited:g} seconds, try again shortly")
+
+    def _done(self, priority: str, started: float) -> float:
+        self._cond.notify_all()
+        waited = time.monotonic() - started
+        QUEUE_DEPTH.dec(priority=priority)
+        QUEUE_WAIT_SECONDS.observe(waited, priority=priority)
+        return waited
+
+    def acquire(self, priority: Optional[str] = None, timeout: Optional[float] = None) -> float:
+        """
+        Block until a token is available for the caller's priority class.
+
+        Args:
+            priority: Priority class (default: the context's search_priority)
+            timeout: Maximum wait in seconds (default: max_wait for the class)
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            RateLimitExceeded: Deadline passed or monthly quota used up
+        """
+        claim = None if priority else _priority.get()
+        priority = priority or current_priority()
+        if not self.rate:
+            with self._cond:
+                if not self._use_quota():
+                    raise self._quota_exceeded(priority)
+            return 0.0
+        started = time.monotonic()
+        # A tool call's own deadline also bounds the wait (see utils.deadline)
+        call_left = time_left()
+        with self._cond:
+            entry = self._enqueue(priority)
+            while True:
+                delay = self._try_take(entry, priority)
+                if not delay:
+                    return self._done(priority, started)
+                entry, priority = self._promote(entry, priority, claim)
+                deadline = started + (self.max_wait[priority] if timeout is None else timeout)
+                if call_left is not None:
+                    deadline = min(deadline, started + call_left)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._give_up(entry, priority, deadline - started)
+                self._cond.wait(min(delay, remaining))
+
+    async def aacquire(self, priority: Optional[str] = None, timeout: Optional[float] = None) -> float:
+        """Async counterpart of acquire; waits without blocking the event loop."""
+        claim = None if priority else _priority.get()
+        priority = priority or current_priority()
+        if not self.rate:
+            return self.acquire(priority)
+        started = time.monotonic()
+        call_left = time_left()
+        with self._cond:
+            entry = self._enqueue(priority)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._try_take(entry, priority)
+                    if not delay:
+                        return self._done(priority, started)
+                    entry, priority = self._promote(entry, priority, claim)
+                    deadline = started + (self.max_wait[priority] if timeout is None else timeout)
+                    if call_left is not None:
+                        deadline = min(deadline, started + call_left)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._give_up(entry, priority, deadline - started)
+                # Sync waiters are woken by notify; async waiters poll at short intervals
+                await asyncio.sleep(min(delay, remaining, 0.05))
+        except asyncio.CancelledError:
+            with self._cond:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                    QUEUE_DEPTH.dec(priority=priority)
+            raise
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill()
+            return {
+                "tokens": self._tokens,
+                "queued": len(self._waiters),
+                "used_this_month": self._used_this_month,
+                "monthly_quota": self.monthly_quota,
+            }
+
+
+serpapi_rate_limiter = RateLimiter(
+    rate_per_minute=env_float("TRIPFORGE_SERPAPI_RATE_PER_MINUTE", 0),
+    burst=env_int("TRIPFORGE_SERPAPI_BURST", 0) or None,
+    monthly_quota=env_int("TRIPFORGE_SERPAPI_MONTHLY_QUOTA", 0),
+    # The monthly count is kept next to the cached searches when they are on disk
+    state_path=env_str("TRIPFORGE_CACHE_SQLITE_PATH") or None,
+)
@@ -0,0 +1,211 @@
+from utils.models import FlightOffer, HotelOffer
+
+
+def _text(value, default: str):
+    return default if value is None else value
+
+
+def render_flight_offer(offer: FlightOffer, idx: int) -> str:
+    """Render one flight option in the LLM-facing text format."""
+    flight_legs_info = []
+    for i, leg in enumerate(offer.legs):
+        flight_legs_info.append(
+            f"  Leg {i+1}:\n"
+            f"    Airline: {_text(leg.airline, 'Unknown Airline')} ({_text(leg.flight_number, 'N/A')})\n"
+            f"    Class: {_text(leg.travel_class, 'N/A')}\n"
+            f"    From: {_text(leg.departure_airport, 'Unknown')} ({_text(leg.departure_id, 'N/A')}) at {_text(leg.departure_time, 'Unknown')}\n"
+            f"    To: {_text(leg.arrival_airport, 'Unknown')} ({_text(leg.arrival_id, 'N/A')}) at {_text(leg.arrival_time, 'Unknown')}\n"
+            f"    Duration: {_text(leg.duration, 'Unknown')} mins"
+        )
+
+    layover_info = []
+    for j, layover in enumerate(offer.layovers):
+        overnight = " (overnight)" if layover.overnight else ""
+        layover_info.append(
+            f"  Layover {j+1}: {_text(layover.name, 'Unknown airport')}, "
+            f"Duration: {_text(layover.duration, 'Unknown')} mins{overnight}"
+        )
+
+    return (
+        f"Flight Option {idx+1}:\n"
+        + "\n".join(flight_legs_info)
+        + ("\n" + "\n".join(layover_info) if layover_info else "")
+        + f"\n  Total Duration: {_text(offer.total_duration, 'Unknown')} mins"
+        + f"\n  Price: {_text(offer.price, 'Price not available')}"
+        + f"\n  Type: {_text(offer.type, 'Unknown')}"
+        + f"\n  Airline Logo: {_text(offer.airline_logo, 'N/A')}"
+        + f"\n  Departure Token: {_text(offer.departure_token, 'N/A')}\n"
+        + "-" * 50
+    )
+
+
+def render_flight_offers(offers: list, departure_city: str, arrival_city: str, departure_date: str) -> str:
+    """
+    Render flight options as text for the LLM.
+
+    Args:
+        offers: FlightOffer objects to show, in display order
+        departure_city: Searched departure airport, used in the empty-result message
+        arrival_city: Searched arrival airport, used in the empty-result message
+        departure_date: Searched date, used in the empty-result message
+
+    Returns:
+        Formatted flight options
+    """
+    if not offers:
+        return f"No flights found from {departure_city} to {arrival_city} on {departure_date}"
+    return "\n".join(render_flight_offer(offer, idx) for idx, offer in enumerate(offers))
+
+
+def _nearby_summary(offer: HotelOffer) -> str:
+    nearby_places = []
+    for place in offer.nearby_places:
+        transports = [f"{kind} ({duration})" for kind, duration in place.transportations]
+        nearby_places.append(f"{place.name} - {'; '.join(transports)}")
+    return "; ".join(nearby_places) if nearby_places else "None"
+
+
+def render_hotel_offer(offer: HotelOffer, adults: int) -> str:
+    """Render one hotel in the LLM-facing text format."""
+    return (
+        f"Hotel: {_text(offer.name, 'Unknown Hotel')} ({_text(offer.type, 'Unknown Type')})\n"
+        f"Rating: {_text(offer.overall_rating, 'No rating')} ({_text(offer.reviews, 'N/A')} reviews)\n"
+        f"Price per night for {_text(offer.num_guests, adults)} guests: {_text(offer.rate_per_night, 'N/A')} "
+        f"(Before taxes: {_text(offer.rate_before_taxes, 'N/A')}) via {_text(offer.source, 'N/A')}\n"
+        f"Amenities: {', '.join(offer.amenities)}\n"
+        f"Excluded Amenities: {', '.join(offer.excluded_amenities)}\n"
+        f"Essential Info: {', '.join(offer.essential_info)}\n"
+        f"Location: Latitude {_text(offer.latitude, 'N/A')}, Longitude {_text(offer.longitude, 'N/A')}\n"
+        f"Check-in Time: {_text(offer.check_in_time, 'N/A')}, Check-out Time: {_text(offer.check_out_time, 'N/A')}\n"
+        f"Nearby Places: {_nearby_summary(offer)}\n"
+        f"Booking Link: {_text(offer.link, 'N/A')}\n"
+        f"Property Token: {_text(offer.property_token, 'N/A')}\n"
+        f"Image: {_text(offer.image, 'N/A')}\n"
+        f"Source Logo: {_text(offer.source_logo, 'N/A')}\n"
+        "-------------------------------------------"
+    )
+
+
+def render_hotel_offers(offers: list, query: str, check_in_date: str, check_out_date: str, adults: int) -> str:
+    """
+    Render hotels as text for the LLM.
+
+    Args:
+        offers: HotelOffer objects to show, in display order
+        query: Searched location, used in the empty-result message
+        check_in_date: Searched check-in date
+        check_out_date: Searched check-out date
+        adults: Number of adults, shown when a price has no guest count
+
+    Returns:
+        Formatted hotel options
+    """
+    if not offers:
+        return f"No hotels found for {query} from {check_in_date} to {check_out_date}"
+    return "\n".join(render_hotel_offer(offer, adults) for offer in offers)
+
+
+# Compact renderers: the same offers with low-value fields (logos, tokens, images,
+# links, excluded amenities) dropped and the rest abbreviated to fit a token budget.
+# Each level is terser than the previous one.
+COMPACT_LEVELS = (0, 1, 2)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for output budgets."""
+    return (len(text) + 3) // 4
+
+
+def _clock(timestamp) -> str:
+    # "2025-12-10 06:00" -> "06:00"
+    return str(timestamp).rsplit(" ", 1)[-1] if timestamp else "?"
+
+
+def _stops(offer: FlightOffer) -> str:
+    stops = len(offer.layovers)
+    return "direct" if stops == 0 else f"{stops} stop{'s' if stops > 1 else ''}"
+
+
+def render_flight_offer_compact(offer: FlightOffer, idx: int, level: int = 0) -> str:
+    """Render one flight option in compact form; higher levels are terser."""
+    price = _text(offer.price, "price n/a")
+    duration = _text(offer.total_duration, "?")
+    if level >= 2 or not offer.legs:
+        first, last = (offer.legs[0], offer.legs[-1]) if offer.legs else (None, None)
+        numbers = "/".join(leg.flight_number or "?" for leg in offer.legs)
+        airline = first.airline if first else "Unknown Airline"
+        route = (
+            f"{first.departure_id} {_clock(first.departure_time)} -> {last.arrival_id} {_clock(last.arrival_time)}"
+            if first else "route n/a"
+        )
+        return f"Option {idx+1}: {airline} {numbers} | {route} | {duration} mins | {_stops(offer)} | {price}"
+
+    lines = [f"Option {idx+1}: {price} | {duration} mins | {_stops(offer)} | {_text(offer.type, 'Unknown')}"]
+    if level == 1:
+        lines.append("  " + "; ".join(
+            f"{_text(leg.airline, 'Unknown Airline')} {_text(leg.flight_number, 'N/A')} "
+            f"{leg.departure_id} {_clock(leg.departure_time)} -> {leg.arrival_id} {_clock(leg.arrival_time)}"
+            for leg in offer.legs
+        ))
+    else:
+        for leg in offer.legs:
+            lines.append(
+                f"  {_text(leg.airline, 'Unknown Airline')} {_text(leg.flight_number, 'N/A')} ({_text(leg.travel_class, 'N/A')}): "
+                f"{_text(leg.departure_airport, 'Unknown')} ({leg.departure_id}) {_text(leg.departure_time, 'Unknown')} -> "
+                f"{_text(leg.arrival_airport, 'Unknown')} ({leg.arrival_id}) {_text(leg.arrival_time, 'Unknown')}, "
+                f"{_text(leg.duration, 'Unknown')} mins"
+            )
+    for layover in offer.layovers:
+        overnight = " (overnight)" if layover.overnight else ""
+        lines.append(f"  Layover: {_text(layover.name, 'Unknown airport')} {_text(layover.duration, 'Unknown')} mins{overnight}")
+    return "\n".join(lines)
+
+
+def render_hotel_offer_compact(offer: HotelOffer, idx: int, adults: int, level: int = 0) -> str:
+    """Render one hotel in compact form; higher levels are terser."""
+    summary = (
+        f"Hotel {idx+1}: {_text(offer.name, 'Unknown Hotel')} ({_text(offer.type, 'Unknown Type')}) | "
+        f"{_text(offer.overall_rating, 'No rating')} ({_text(offer.reviews, 'N/A')} reviews) | "
+        f"{_text(offer.rate_per_night, 'N/A')}/night for {_text(offer.num_guests, adults)} guests"
+    )
+    if level >= 2:
+        return summary
+
+    amenity_count, place_count = (6, 3) if level == 0 else (3, 2)
+    lines = [summary if level else f"{summary} via {_text(offer.source, 'N/A')}"]
+    if offer.amenities:
+        lines.append(f"  Amenities: {', '.join(offer.amenities[:amenity_count])}")
+    places = []
+    for place in offer.nearby_places[:place_count]:
+        transport = f" ({place.transportations[0][0]} {place.transportations[0][1]})" if place.transportations else ""
+        places.append(f"{place.name}{transport}")
+    if places:
+        lines.append(f"  Nearby: {'; '.join(places)}")
+    if level == 0 and (offer.check_in_time or offer.check_out_time):
+        lines.append(f"  Check-in {_text(offer.check_in_time, 'N/A')}, Check-out {_text(offer.check_out_time, 'N/A')}")
+    return "\n".join(lines)
+
+
+def fit_to_budget(header: str, render_block, count: int, token_budget: int) -> str:
+    """
+    Render blocks at the most detailed level that fits a token budget.
+
+    Args:
+        header: First line of the output (kept verbatim)
+        render_block: Callable (index, level) -> str
+        count: Number of blocks to render
+        token_budget: Target size in estimated tokens
+
+    Returns:
+        Header and blocks; if even the tersest level is too large, trailing
+        blocks are dropped (at least one is always kept)
+    """
+    for level in COMPACT_LEVELS:
+        blocks = [render_block(idx, level) for idx in range(count)]
+        text = "\n".join([header] + blocks)
+        if estimate_tokens(text) <= token_budget:
+            return text
+    while len(blocks) > 1 and estimate_tokens(text) > token_budget:
+        blocks.pop()
+        text = "\n".join([header] + blocks + [f"({count - len(blocks)} more option(s) omitted)"])
+    return text
@@ -0,0 +1,352 @@
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import Optional
+
+import httpx
+
+from utils.config import env_bool, env_float, env_int
+from utils.metrics import metrics
+from utils.serpapi_client import SerpApiError
+
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+RETRIES = metrics.counter("tripforge_search_retries_total", "Search retries after transient failures.", ("engine",))
+HEDGES = metrics.counter("tripforge_search_hedges_total", "Hedged (duplicate) search requests sent.", ("engine",))
+HEDGE_WINS = metrics.counter("tripforge_search_hedge_wins_total", "Hedged requests that answered first.", ("engine",))
+BUDGET_EXHAUSTED = metrics.counter(
+    "tripforge_search_budget_exhausted_total", "Retries or hedges skipped because the budget was used up.", ("engine",))
+CIRCUIT_OPEN = metrics.gauge(
+    "tripforge_search_circuit_open", "1 while an engine's circuit breaker is open.", ("engine",))
+
+# Threads for hedged sync searches; a slow primary keeps its thread while the hedge runs
+_hedge_pool = ThreadPoolExecutor(max_workers=env_int("TRIPFORGE_SEARCH_HEDGE_WORKERS", 16),
+                                 thread_name_prefix="tripforge-hedge")
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for failures worth retrying: timeouts, connection errors, 429 and 5xx responses."""
+    if isinstance(error, SerpApiError):
+        return error.status_code in TRANSIENT_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, TimeoutError))
+
+
+class RetryBudget:
+    """
+    Caps extra upstream requests at a fraction of real ones.
+
+    Every original request deposits `ratio` tokens (up to max_tokens); each
+    retry or hedge withdraws a whole token. With ratio=0.2, retries and hedges
+    together add at most ~20% to upstream quota use, plus min_tokens of slack
+    for quiet periods.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 5.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max(max_tokens, min_tokens)
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class LatencyWindow:
+    """Sliding window of recent successful latencies for percentile estimates."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile, or None until min_samples have been seen."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class SearchPolicy:
+    """
+    Retry and hedging policy for one search engine.
+
+    Transient failures are retried with full-jitter exponential backoff. When
+    hedging is on, a duplicate request is sent once the primary has taken
+    longer than the engine's recent p95 latency, and the first successful
+    answer wins. Retries and hedges both draw from the engine's RetryBudget.
+    """
+
+    def __init__(
+        self,
+        engine: str,
+        retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 4.0,
+        hedge: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_min_delay: float = 1.0,
+        budget: Optional[RetryBudget] = None,
+    ):
+        self.engine = engine
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.budget = budget or RetryBudget()
+        self.latency = LatencyWindow()
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None when hedging is off or there is no latency history yet."""
+        if not self.hedge:
+            return None
+        p95 = self.latency.percentile(self.hedge_percentile)
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    def _may_retry(self, attempt: int, error: Exception) -> bool:
+        if attempt >= self.retries or not is_transient(error):
+            return False
+        if not self.budget.withdraw():
+            BUDGET_EXHAUSTED.inc(engine=self.engine)
+            return False
+        RETRIES.inc(engine=self.engine)
+        return True
+
+    def _may_hedge(self) -> bool:
+        if not self.budget.withdraw():
+            BUDGET_EXHAUSTED.inc(engine=self.engine)
+            return False
+        HEDGES.inc(engine=self.engine)
+        return True
+
+    def _timed(self, fn):
+        started = time.perf_counter()
+        result = fn()
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    async def _atimed(self, coro_fn):
+        started = time.perf_counter()
+        result = await coro_fn()
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    def _hedged(self, fn):
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._timed(fn)
+        primary = _hedge_pool.submit(contextvars.copy_context().run, self._timed, fn)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        if not self._may_hedge():
+            return primary.result()
+        hedge = _hedge_pool.submit(contextvars.copy_context().run, self._timed, fn)
+        pending, error = {primary, hedge}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        HEDGE_WINS.inc(engine=self.engine)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _ahedged(self, coro_fn):
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._atimed(coro_fn)
+        primary = asyncio.ensure_future(self._atimed(coro_fn))
+        pending, error = {primary}, None
+        # Covers every await: a caller cancelled while waiting (e.g. a tool timeout) must not leave requests running
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not self._may_hedge():
+                return await primary
+            hedge = asyncio.ensure_future(self._atimed(coro_fn))
+            pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            HEDGE_WINS.inc(engine=self.engine)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def call(self, fn):
+        """
+        Run a search callable with retries and optional hedging.
+
+        Args:
+            fn: Zero-argument callable performing one upstream search
+
+        Returns:
+            The first successful result (the last error is re-raised)
+        """
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                return self._hedged(fn)
+            except Exception as e:
+                if not self._may_retry(attempt, e):
+                    raise
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    async def acall(self, coro_fn):
+        """Async counterpart of call for a zero-argument coroutine function."""
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                return await self._ahedged(coro_fn)
+            except Exception as e:
+                if not self._may_retry(attempt, e):
+                    raise
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
+
+
+def _policy_from_env(engine: str) -> SearchPolicy:
+    return SearchPolicy(
+        engine,
+        retries=env_int("TRIPFORGE_SEARCH_RETRIES", 2),
+        backoff_base=env_float("TRIPFORGE_SEARCH_BACKOFF_BASE", 0.5),
+        backoff_max=env_float("TRIPFORGE_SEARCH_BACKOFF_MAX", 4.0),
+        hedge=env_bool("TRIPFORGE_SEARCH_HEDGE", False),
+        hedge_percentile=env_float("TRIPFORGE_SEARCH_HEDGE_PERCENTILE", 95.0),
+        hedge_min_delay=env_float("TRIPFORGE_SEARCH_HEDGE_MIN_DELAY", 1.0),
+        budget=RetryBudget(ratio=env_float("TRIPFORGE_SEARCH_RETRY_BUDGET", 0.2)),
+    )
+
+
+search_policies = {engine: _policy_from_env(engine) for engine in ("google_flights", "google_hotels")}
+_policies_lock = threading.Lock()
+
+
+def search_policy(engine: str) -> SearchPolicy:
+    """Return the retry/hedging policy (and budget) of a SerpAPI engine."""
+    with _policies_lock:
+        policy = search_policies.get(engine)
+        if policy is None:
+            policy = search_policies[engine] = _policy_from_env(engine)
+        return policy
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while an engine's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing upstream for a while.
+
+    After failure_threshold consecutive transient failures the circuit opens
+    and calls fail fast with CircuitOpenError. Once reset_timeout seconds have
+    passed one trial call is let through (half-open); its success closes the
+    circuit, its failure opens it again. A trial that is cancelled or
+    interrupted leaves the circuit half-open for the next call.
+    """
+
+    def __init__(self, engine: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.engine = engine
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_timeout else "open"
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go upstream now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            if remaining <= 0 and not self._trial_running:
+                self._trial_running = True
+                return
+        raise CircuitOpenError(
+            f"{self.engine} searches are paused after {self.failure_threshold} upstream failures; "
+            f"retrying in {max(remaining, 0):.0f} seconds"
+        )
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+        CIRCUIT_OPEN.set(0, engine=self.engine)
+
+    def record_failure(self, error: BaseException) -> None:
+        with self._lock:
+            self._trial_running = False
+            if not is_transient(error):
+                return
+            self._failures += 1
+            if self._opened_at is None and self._failures < self.failure_threshold:
+                return
+            self._opened_at = time.monotonic()
+        CIRCUIT_OPEN.set(1, engine=self.engine)
+
+    def release_trial(self) -> None:
+        """Let another trial through when one ended without an outcome (e.g. it was cancelled)."""
+        with self._lock:
+            self._trial_running = False
+
+
+circuit_breakers = {}
+
+
+def circuit_breaker(engine: str) -> CircuitBreaker:
+    """Return the circuit breaker of a SerpAPI engine."""
+    with _policies_lock:
+        breaker = circuit_breakers.get(engine)
+        if breaker is None:
+            breaker = circuit_breakers[engine] = CircuitBreaker(
+                engine,
+                failure_threshold=env_int("TRIPFORGE_CIRCUIT_FAILURES", 5),
+                reset_timeout=env_float("TRIPFORGE_CIRCUIT_RESET", 30.0),
+            )
+        return breaker
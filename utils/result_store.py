@@ -0,0 +1,106 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from utils.cache import make_cache_key
+from utils.config import env_int
+
+
+@dataclass(slots=True)
+class StoredResult:
+    """Parsed search result kept server-side so tools can refer back to it by ID."""
+    result_id: str
+    kind: str                   # "flights" or "hotels"
+    params: dict                # search parameters without the api_key
+    offers: list                # every parsed offer, not just the ones shown
+    shown: list                 # offers presented to the model, in display order
+    context: dict = field(default_factory=dict)   # extra render arguments (query, dates, adults...)
+    columns: Optional[object] = None              # columnar view for local re-ranking, built on first use
+    spatial: Optional[object] = None              # HotelGeoIndex for proximity queries, built on first use
+    base_id: Optional[str] = None                 # ID of the search a re-ranked view was derived from
+    created_at: float = field(default_factory=time.time)
+
+
+def make_result_id(kind: str, params: dict) -> str:
+    """Derive a short, stable ID from the normalized search parameters."""
+    digest = hashlib.sha1(make_cache_key(params).encode("utf-8")).hexdigest()[:8]
+    return f"{kind[:2]}_{digest}"
+
+
+class ResultStore:
+    """Bounded LRU store of parsed search results keyed by result ID."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._results: "OrderedDict[str, StoredResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, kind: str, params: dict, offers: list, shown: list, **context) -> StoredResult:
+        """
+        Store a parsed search result.
+
+        Args:
+            kind: "flights" or "hotels"
+            params: Search parameters (the api_key is dropped)
+            offers: All parsed offers
+            shown: Offers presented to the model
+            **context: Extra arguments needed to re-render the result
+
+        Returns:
+            The stored record, including its result_id
+        """
+        params = {name: value for name, value in params.items() if name != "api_key"}
+        return self._insert(StoredResult(make_result_id(kind, params), kind, params, offers, shown, context))
+
+    def derive(self, record: StoredResult, shown: list, **variant) -> StoredResult:
+        """
+        Store a re-ranked view of a result under its own ID, leaving the original untouched.
+
+        The record is shared by every session, so a re-rank never changes what
+        the original ID refers to; the view gets an ID derived from the search
+        and the re-rank arguments instead.
+
+        Args:
+            record: Stored result (or an earlier view of it) that was re-ranked
+            shown: Offers of the view, in display order
+            **variant: Re-rank arguments, e.g. sort_by="cheapest", max_stops=0
+
+        Returns:
+            The stored view, sharing the offers and lazily built indexes of the search
+        """
+        base_id = record.base_id or record.result_id
+        digest = hashlib.sha1(make_cache_key(variant).encode("utf-8")).hexdigest()[:6]
+        return self._insert(StoredResult(f"{base_id}.{digest}", record.kind, record.params, record.offers, shown,
+                                         record.context, record.columns, record.spatial, base_id=base_id))
+
+    def _insert(self, record: StoredResult) -> StoredResult:
+        with self._lock:
+            self._results.pop(record.result_id, None)
+            self._results[record.result_id] = record
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return record
+
+    def get(self, result_id: str) -> Optional[StoredResult]:
+        """Return a stored result, or None if it is unknown or was evicted."""
+        with self._lock:
+            record = self._results.get(result_id.strip())
+            if record is not None:
+                self._results.move_to_end(record.result_id)
+            return record
+
+    def __contains__(self, result_id: str) -> bool:
+        """True while a result is stored; unlike get(), does not count as a use."""
+        with self._lock:
+            return str(result_id).strip() in self._results
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._results)
+
+
+# Shared by every session so IDs stay valid across tool calls and follow-up turns
+result_store = ResultStore(max_entries=env_int("TRIPFORGE_RESULT_STORE_SIZE", 256))
@@ -9,6 +9,8 @@ class AgentState(TypedDict):
     next_action: str
     llm_response: str
     preferences: Dict[str, str]
+    draft_preferences: Dict[str, str]
+    slots: Dict[str, object]
     preferences_file: str
     itinerary_file: str
     itinerary: str
\ No newline at end of file
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+
+from utils.config import env_float, env_int, env_str
+from utils.deadline import DeadlineExceeded, bounded, remaining
+
+SERPAPI_BASE_URL = env_str("SERPAPI_BASE_URL", "https://serpapi.com")
+
+
+class SerpApiError(Exception):
+    """Raised when SerpAPI answers with an HTTP error status."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _decode(response: httpx.Response) -> dict:
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    if response.status_code >= 400:
+        message = payload.get("error") if isinstance(payload, dict) else None
+        raise SerpApiError(message or f"HTTP {response.status_code} from SerpAPI", response.status_code)
+    return payload
+
+
+class SerpApiClient:
+    """
+    SerpAPI search client on shared keep-alive connection pools.
+
+    The sync facade uses one process-wide httpx.Client; the async API keeps one
+    httpx.AsyncClient per event loop (async connections cannot be shared across
+    loops). Both reuse TLS connections across searches instead of opening a new
+    one per call like serpapi.GoogleSearch does.
+    """
+
+    def __init__(
+        self,
+        base_url: str = SERPAPI_BASE_URL,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._client: Optional[httpx.Client] = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _request_params(self, params: dict) -> dict:
+        request_params = {name: str(value) for name, value in params.items() if value is not None}
+        request_params.setdefault("output", "json")
+        request_params.setdefault("source", "python")
+        return request_params
+
+    def _request_timeout(self):
+        """The client timeout, shortened to the tool call's deadline when that is sooner."""
+        left = remaining()
+        if left is None or left >= self.timeout.read:
+            return self.timeout
+        read = bounded(self.timeout.read)
+        return httpx.Timeout(read, connect=min(self.timeout.connect, read))
+
+    def _sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+            return self._client
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+                self._async_clients[loop] = client
+            return client
+
+    def search(self, params: dict) -> dict:
+        """
+        Run a search synchronously.
+
+        Args:
+            params: SerpAPI parameters including engine and api_key
+
+        Returns:
+            Decoded JSON response
+        """
+        timeout = self._request_timeout()
+        try:
+            response = self._sync_client().get("/search", params=self._request_params(params), timeout=timeout)
+        except httpx.TimeoutException as e:
+            if timeout is not self.timeout:
+                # Cut short by the deadline, not a slow upstream: not worth a retry or a circuit breaker failure
+                raise DeadlineExceeded("the tool call ran out of time waiting for SerpAPI") from e
+            raise
+        return _decode(response)
+
+    async def asearch(self, params: dict) -> dict:
+        """
+        Run a search on the current event loop.
+
+        Args:
+            params: SerpAPI parameters including engine and api_key
+
+        Returns:
+            Decoded JSON response
+        """
+        response = await self._async_client().get("/search", params=self._request_params(params))
+        return _decode(response)
+
+    def close(self) -> None:
+        """Close the sync connection pool."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        """Close the connection pool owned by the current event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+# Shared by every tool call in the process
+serpapi_client = SerpApiClient(
+    max_connections=env_int("TRIPFORGE_SERPAPI_MAX_CONNECTIONS", 20),
+    max_keepalive_connections=env_int("TRIPFORGE_SERPAPI_MAX_KEEPALIVE", 10),
+    timeout=env_float("TRIPFORGE_SERPAPI_TIMEOUT", 30.0),
+    connect_timeout=env_float("TRIPFORGE_SERPAPI_CONNECT_TIMEOUT", 5.0),
+)
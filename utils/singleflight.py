@@ -0,0 +1,154 @@
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from utils.deadline import DeadlineExceeded, bounded
+
+
+class _LeaderAbandoned(Exception):
+    """The leader stopped before finishing (e.g. its turn was cancelled); a waiting follower takes over."""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the work; callers arriving
+    while it is in flight wait for the leader's outcome instead of starting
+    their own. Sync and async callers can share one flight because the
+    outcome is published through a thread-safe concurrent.futures.Future.
+    Followers receive the leader's result object itself, so results must be
+    treated as read-only. A leader that is cancelled or interrupted does not
+    pass that on: the flight is cleared and one follower retries as the new
+    leader, and a cancelled follower never cancels the shared flight.
+
+    A leader can attach a tag to its flight (e.g. the priority its work runs
+    under); each follower is handed that tag through on_join when it joins.
+    """
+
+    def __init__(self):
+        self._flights: dict = {}
+        self._lock = threading.Lock()
+        self._stats = {"executions": 0, "coalesced": 0, "failures": 0, "abandoned": 0}
+
+    def _join(self, key: str, tag=None, on_join=None):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._stats["coalesced"] += 1
+                if on_join is not None:
+                    on_join(flight.tag)
+                return flight, False
+            flight = Future()
+            flight.tag = tag
+            self._flights[key] = flight
+            self._stats["executions"] += 1
+            return flight, True
+
+    def _finish(self, key: str, flight: Future, result=None, error: BaseException = None) -> None:
+        with self._lock:
+            self._flights.pop(key, None)
+            if error is not None:
+                self._stats["failures"] += 1
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+    def _abandon(self, key: str, flight: Future) -> None:
+        with self._lock:
+            self._flights.pop(key, None)
+            self._stats["abandoned"] += 1
+        flight.set_exception(_LeaderAbandoned())
+
+    def do(self, key: str, fn, tag=None, on_join=None):
+        """
+        Run fn() once for all concurrent callers with the same key.
+
+        Args:
+            key: Identity of the work, e.g. a normalized search cache key
+            fn: Zero-argument callable doing the work
+            tag: Stored with the flight when this caller leads it
+            on_join: Called with the leader's tag when this caller joins a flight in progress
+
+        Returns:
+            The leader's result (exceptions are re-raised in every caller)
+        """
+        while True:
+            flight, leader = self._join(key, tag, on_join)
+            if leader:
+                break
+            try:
+                # A follower stops waiting at its own deadline; the leader may be a prefetch without one
+                return flight.result(timeout=bounded(None))
+            except _LeaderAbandoned:
+                continue
+            except FutureTimeoutError:
+                raise DeadlineExceeded("the tool call ran out of time waiting for an identical search") from None
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(key, flight, error=e)
+            raise
+        except BaseException:
+            self._abandon(key, flight)
+            raise
+        self._finish(key, flight, result=result)
+        return result
+
+    async def ado(self, key: str, coro_fn, tag=None, on_join=None):
+        """
+        Async variant of do() for a zero-argument coroutine function.
+
+        Args:
+            key: Identity of the work
+            coro_fn: Callable returning an awaitable doing the work
+            tag: Stored with the flight when this caller leads it
+            on_join: Called with the leader's tag when this caller joins a flight in progress
+
+        Returns:
+            The leader's result (exceptions are re-raised in every caller)
+        """
+        while True:
+            flight, leader = self._join(key, tag, on_join)
+            if leader:
+                break
+            waiter = asyncio.wrap_future(flight)
+            try:
+                # Shielded: a cancelled follower must not cancel the flight other callers wait on
+                return await asyncio.shield(waiter)
+            except _LeaderAbandoned:
+                continue
+            except asyncio.CancelledError:
+                # Nobody awaits the waiter any more; retrieve its outcome so asyncio does not log it
+                waiter.add_done_callback(lambda done: done.cancelled() or done.exception())
+                raise
+        try:
+            result = await coro_fn()
+        except Exception as e:
+            self._finish(key, flight, error=e)
+            raise
+        except BaseException:
+            # Cancellation (e.g. a per-call timeout or an abandoned turn) belongs to the leader alone
+            self._abandon(key, flight)
+            raise
+        self._finish(key, flight, result=result)
+        return result
+
+    def in_flight(self) -> int:
+        """Number of keys currently being executed."""
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self) -> dict:
+        """Return execution/coalescing counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._flights)
+            calls = stats["executions"] + stats["coalesced"]
+            stats["coalesce_rate"] = stats["coalesced"] / calls if calls else 0.0
+            return stats
+
+
+# Shared by every tool call in the process, keyed on normalized search parameters
+search_singleflight = SingleFlight()
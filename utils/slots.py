@@ -0,0 +1,157 @@
+import json
+import re
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from utils.airports import airport_index
+
+
+@dataclass(frozen=True, slots=True)
+class Slot:
+    """One preferences field: its value type and the question asked when it is missing."""
+    name: str
+    kind: str               # "text", "int", "date", "list" or "bool"
+    question: str = ""
+
+
+# Every field of the 'end' preferences schema in system_prompt_phase_1, in the same order
+SLOTS = {slot.name: slot for slot in (
+    Slot("departure_city", "text", "Which city will you be flying from?"),
+    Slot("arrival_city", "text", "Where would you like to go?"),
+    Slot("departure_date", "date", "What date would you like to leave?"),
+    Slot("return_date", "date", "And when would you like to come back?"),
+    Slot("adults", "int", "How many adults are travelling?"),
+    Slot("children", "int", "Will any children be coming along?"),
+    Slot("travel_class", "text"),
+    Slot("hotel_preference", "text"),
+    Slot("hotel_class", "text"),
+    Slot("budget_per_person", "text", "What budget per person do you have in mind?"),
+    Slot("interests", "list", "What would you love to do on this trip?"),
+    Slot("trip_type", "text"),
+    Slot("multi_city", "bool"),
+    Slot("city_sequence", "list", "In which order would you like to visit the cities?"),
+    Slot("group_composition", "text"),
+    Slot("transport_preferences", "text"),
+    Slot("constraints", "list"),
+    Slot("special_occasions", "text"),
+    Slot("accommodation_style", "text"),
+    Slot("daily_budget", "text"),
+    Slot("visa_status", "text", "Do you already have a visa for this trip, or will you need one?"),
+)}
+
+REQUIRED_SLOTS = ("departure_city", "arrival_city", "departure_date", "return_date", "adults", "children",
+                  "budget_per_person", "interests")
+
+_EMPTY = (None, "", [], {}, "...")
+
+
+def _coerce(kind: str, value):
+    """Convert a model-provided value to the slot type, or None if it is not usable."""
+    if value in _EMPTY:
+        return None
+    if kind == "int":
+        match = re.search(r"\d+", str(value))
+        return int(match.group()) if match else None
+    if kind == "date":
+        try:
+            return date.fromisoformat(str(value).strip()[:10]).isoformat()
+        except ValueError:
+            return None
+    if kind == "list":
+        items = value if isinstance(value, (list, tuple)) else str(value).split(",")
+        items = [str(item).strip() for item in items if str(item).strip() not in ("", "...")]
+        return items or None
+    if kind == "bool":
+        return value if isinstance(value, bool) else str(value).strip().lower() in ("true", "yes", "1")
+    return str(value).strip()
+
+
+def _country(place) -> Optional[str]:
+    resolution = airport_index.resolve(str(place or ""))
+    airport = airport_index.airport(resolution.codes[0]) if resolution and resolution.codes else None
+    return airport.country if airport else None
+
+
+class SlotStore:
+    """
+    Typed preferences collected so far in the preferences chat.
+
+    Values are merged in from the model's per-turn "slots" output (and from
+    draft or final preferences), coerced to their slot type; unusable values
+    are ignored so the field stays missing. Fields outside the schema are kept
+    as given. The store is a plain dict in the graph state between turns.
+    """
+
+    def __init__(self, values: Optional[dict] = None):
+        self.values = dict(values or {})
+
+    def update(self, values: Optional[dict]) -> list:
+        """
+        Merge newly learned fields.
+
+        Args:
+            values: Field name -> value, e.g. {"adults": "2", "interests": "beaches, food"}
+
+        Returns:
+            Names of the fields that changed
+        """
+        changed = []
+        for name, value in (values or {}).items():
+            slot = SLOTS.get(name)
+            coerced = _coerce(slot.kind, value) if slot else (None if value in _EMPTY else value)
+            if coerced is not None and self.values.get(name) != coerced:
+                self.values[name] = coerced
+                changed.append(name)
+        return changed
+
+    def required(self) -> list:
+        """Required fields for this trip: visas for international trips, a city order for multi-city ones."""
+        names = list(REQUIRED_SLOTS)
+        if self.values.get("multi_city"):
+            names.append("city_sequence")
+        departure, arrival = _country(self.values.get("departure_city")), _country(self.values.get("arrival_city"))
+        if departure and arrival and departure != arrival:
+            names.append("visa_status")
+        return names
+
+    def missing(self) -> list:
+        return [name for name in self.required() if name not in self.values]
+
+    def is_complete(self) -> bool:
+        return not self.missing()
+
+    def question_for_missing(self) -> Optional[str]:
+        """A plain question for the first missing field, or None when complete."""
+        missing = self.missing()
+        return SLOTS[missing[0]].question if missing else None
+
+    def to_preferences(self) -> dict:
+        """Known fields in schema order, followed by any extra fields."""
+        ordered = {name: self.values[name] for name in SLOTS if name in self.values}
+        ordered.update((name, value) for name, value in self.values.items() if name not in SLOTS)
+        return ordered
+
+    def fill_gaps(self, preferences: Optional[dict]) -> dict:
+        """
+        The model's preferences, with fields it left empty filled from the collected slots.
+
+        The model's payload wins: it has read the whole conversation and may name
+        or word fields differently from the slot schema.
+        """
+        merged = dict(preferences) if isinstance(preferences, dict) else {}
+        for name, value in self.to_preferences().items():
+            if merged.get(name) in _EMPTY:
+                merged[name] = value
+        return merged
+
+    def snapshot(self) -> str:
+        """Compact description of the collected fields for the model's prompt."""
+        missing = self.missing()
+        if missing:
+            # A hint only: the user may have answered in words the slots did not capture
+            status = (f"Not recorded yet: {', '.join(missing)} - ask for these unless the user already answered them "
+                      f"(e.g. \"{self.question_for_missing()}\")")
+        else:
+            status = "Not recorded yet: nothing - all required fields are filled, move to confirm"
+        return f"Trip details collected so far: {json.dumps(self.to_preferences(), ensure_ascii=False)}\n{status}"
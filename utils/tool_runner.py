@@ -0,0 +1,140 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from langchain_core.messages import ToolMessage
+
+from utils.config import env_float, env_int
+from utils.deadline import deadline_at
+from utils.metrics import TOOL_TIMEOUTS, record_tool_call
+
+DEFAULT_MAX_CONCURRENCY = env_int("TRIPFORGE_TOOL_MAX_CONCURRENCY", 6)
+DEFAULT_TOOL_TIMEOUT = env_float("TRIPFORGE_TOOL_TIMEOUT", 60.0)
+
+
+def _unknown_tool(name: str, tools_dict: dict) -> str:
+    return f"Tool not available: {name}. Available tools: {list(tools_dict.keys())}"
+
+
+def _call_tool(tool, args: dict, deadline: Optional[float] = None) -> str:
+    started = time.perf_counter()
+    try:
+        with deadline_at(deadline):
+            result, status = str(tool.func(**args)), "ok"
+    except Exception as e:
+        result, status = f"Error executing tool {tool.name}: {str(e)}", "error"
+    record_tool_call(tool.name, time.perf_counter() - started, result, status)
+    return result
+
+
+async def _acall_tool(tool, args: dict) -> str:
+    started = time.perf_counter()
+    try:
+        if tool.coroutine is not None:
+            result = str(await tool.coroutine(**args))
+        else:
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()
+            result = str(await loop.run_in_executor(None, lambda: ctx.run(tool.func, **args)))
+        status = "ok"
+    except Exception as e:
+        result, status = f"Error executing tool {tool.name}: {str(e)}", "error"
+    record_tool_call(tool.name, time.perf_counter() - started, result, status)
+    return result
+
+
+class ToolRunner:
+    """
+    Executes a batch of LLM tool calls concurrently.
+
+    Calls run on a bounded thread pool (or as asyncio tasks guarded by a
+    semaphore in the async path). Each call gets its own timeout, failures are
+    turned into error strings for the model, and the resulting ToolMessages are
+    always returned in the order of the original tool calls.
+
+    A thread cannot be cancelled once it runs, so sync calls also carry the
+    deadline (utils.deadline): their HTTP requests and rate limit waits are cut
+    short at the timeout, and the worker is free again soon after.
+    """
+
+    def __init__(self, tools_dict: dict, max_concurrency: Optional[int] = None, timeout: Optional[float] = None):
+        self.tools_dict = tools_dict
+        self.max_concurrency = max(1, max_concurrency or DEFAULT_MAX_CONCURRENCY)
+        self.timeout = timeout if timeout is not None else DEFAULT_TOOL_TIMEOUT
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="tripforge-tool")
+
+    def _timeout_message(self, name: str) -> str:
+        TOOL_TIMEOUTS.inc(tool=name)
+        return f"Error executing tool {name}: timed out after {self.timeout:g} seconds"
+
+    def run(self, tool_calls: list) -> list:
+        """
+        Run tool calls on the thread pool.
+
+        The timeout is counted from the moment the batch is dispatched, so calls
+        queued behind a full pool share the same deadline as the rest of the turn.
+
+        Args:
+            tool_calls: Tool calls from an AIMessage
+
+        Returns:
+            List of ToolMessage objects in tool call order
+        """
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        futures = []
+        for t in tool_calls:
+            tool = self.tools_dict.get(t['name'])
+            if tool is None:
+                futures.append(None)
+                continue
+            # Each call gets its own copy of the caller's context (e.g. request priority)
+            ctx = contextvars.copy_context()
+            futures.append(self._pool.submit(ctx.run, _call_tool, tool, t['args'], deadline))
+
+        results = []
+        for t, future in zip(tool_calls, futures):
+            if future is None:
+                result = _unknown_tool(t['name'], self.tools_dict)
+            else:
+                try:
+                    remaining = max(0.0, deadline - time.monotonic()) if deadline else None
+                    result = future.result(timeout=remaining)
+                except FutureTimeoutError:
+                    # Queued calls are dropped; a running one stops at its deadline by itself
+                    future.cancel()
+                    result = self._timeout_message(t['name'])
+            results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=result))
+        return results
+
+    async def arun(self, tool_calls: list) -> list:
+        """
+        Run tool calls as asyncio tasks, using the tools' coroutines when available.
+
+        Args:
+            tool_calls: Tool calls from an AIMessage
+
+        Returns:
+            List of ToolMessage objects in tool call order
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_one(t: dict) -> str:
+            tool = self.tools_dict.get(t['name'])
+            if tool is None:
+                return _unknown_tool(t['name'], self.tools_dict)
+            async with semaphore:
+                deadline = time.monotonic() + self.timeout if self.timeout else None
+                try:
+                    # The deadline reaches sync tools run in the executor, which wait_for cannot cancel
+                    with deadline_at(deadline):
+                        return await asyncio.wait_for(_acall_tool(tool, t['args']), self.timeout or None)
+                except asyncio.TimeoutError:
+                    return self._timeout_message(t['name'])
+
+        contents = await asyncio.gather(*(run_one(t) for t in tool_calls))
+        return [
+            ToolMessage(tool_call_id=t['id'], name=t['name'], content=content)
+            for t, content in zip(tool_calls, contents)
+        ]
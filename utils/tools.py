@@ -1,10 +1,340 @@
+import asyncio
+import contextvars
 import os
-from langchain_core.tools import tool
-from serpapi import GoogleSearch
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.tools import StructuredTool, tool
 from typing import Optional
+import numpy as np
+from utils.airports import airport_index
+from utils.backends import get_search_backend
+from utils.cache import make_cache_key, search_cache
+from utils.config import env_int, env_str
+from utils.fare_matrix import date_window, render_fare_matrix, summarize_offers
+from utils.geo import HotelGeoIndex
+from utils.models import parse_flight_offers, parse_hotel_offers, select_flight_offers
+from utils.renderers import (
+    fit_to_budget,
+    render_flight_offer,
+    render_flight_offer_compact,
+    render_flight_offers,
+    render_hotel_offer,
+    render_hotel_offer_compact,
+    render_hotel_offers,
+)
+from utils.ranking import PARETO_CRITERIA, flight_columns, pareto_front, rank_flights
+from utils.rate_limiter import PriorityClaim, claimed_priority, current_priority, raise_priority, search_priority
+from utils.resilience import circuit_breaker, search_policy
+from utils.result_store import result_store
+from utils.singleflight import search_singleflight
+
+MISSING_API_KEY_ERROR = "Error: SERPAPI_API_KEY not found in environment variables"
+
+# "full" sends every field to the LLM; "compact" sends an abbreviated view sized to a
+# per-tool token budget and keeps the full result retrievable via get_search_details
+TOOL_OUTPUT_MODE = env_str("TRIPFORGE_TOOL_OUTPUT_MODE", "full").lower()
+TOOL_TOKEN_BUDGETS = {
+    "search_flights": env_int("TRIPFORGE_TOOL_TOKEN_BUDGET_SEARCH_FLIGHTS", 400),
+    "search_hotels": env_int("TRIPFORGE_TOOL_TOKEN_BUDGET_SEARCH_HOTELS", 600),
+}
+
+# Flexible-date searches fan out one search per date on their own bounded pool
+FARE_MATRIX_MAX_DAYS = env_int("TRIPFORGE_FARE_MATRIX_MAX_DAYS", 10)
+FARE_MATRIX_CONCURRENCY = env_int("TRIPFORGE_FARE_MATRIX_CONCURRENCY", 6)
+_fare_matrix_pool = ThreadPoolExecutor(max_workers=FARE_MATRIX_CONCURRENCY, thread_name_prefix="tripforge-fares")
+
+# Results served past their TTL carry their age (seconds) under this key
+STALE_AGE_KEY = "tripforge_stale_age"
+_refresh_pool = ThreadPoolExecutor(max_workers=env_int("TRIPFORGE_CACHE_REFRESH_WORKERS", 2),
+                                   thread_name_prefix="tripforge-refresh")
+_refresh_lock = threading.Lock()
+_refreshing = set()
+
+
+# Callables notified with the params of every search lookup (e.g. prefetch hit tracking)
+_search_listeners = []
+
+
+def add_search_listener(listener) -> None:
+    """Register a callable invoked with the params of every search before the cache lookup."""
+    _search_listeners.append(listener)
+
+
+def _notify_listeners(params: dict) -> None:
+    for listener in _search_listeners:
+        try:
+            listener(params)
+        except Exception:
+            pass
+
+
+def _fetch_upstream(params: dict) -> dict:
+    """Run one upstream search through the engine's circuit breaker and retry/hedging policy, caching successes."""
+    engine = params.get("engine", "")
+    breaker = circuit_breaker(engine)
+    breaker.before_call()
+    started = time.perf_counter()
+    try:
+        # Transient failures are retried (and slow requests optionally hedged) within the engine's budget
+        results = search_policy(engine).call(lambda: get_search_backend().search(params))
+    except Exception as e:
+        breaker.record_failure(e)
+        raise
+    except BaseException:
+        # Cancelled or interrupted: no outcome to record, but the half-open trial slot must be freed
+        breaker.release_trial()
+        raise
+    breaker.record_success()
+    # Error payloads are not cached so the next call retries upstream
+    if "error" not in results:
+        search_cache.set(params, results, latency=time.perf_counter() - started)
+    return results
+
+
+async def _afetch_upstream(params: dict) -> dict:
+    """Async counterpart of _fetch_upstream."""
+    engine = params.get("engine", "")
+    breaker = circuit_breaker(engine)
+    breaker.before_call()
+    started = time.perf_counter()
+    try:
+        results = await search_policy(engine).acall(lambda: get_search_backend().asearch(params))
+    except Exception as e:
+        breaker.record_failure(e)
+        raise
+    except BaseException:
+        breaker.release_trial()
+        raise
+    breaker.record_success()
+    if "error" not in results:
+        search_cache.set(params, results, latency=time.perf_counter() - started)
+    return results
 
-@tool
-def search_flights(
+
+def _join_flight(claim: PriorityClaim) -> None:
+    """A caller joining a search in flight lends it its priority, e.g. an interactive search joining a prefetch."""
+    raise_priority(claim, current_priority())
+
+
+def _coalesced_fetch(params: dict) -> dict:
+    """Fetch upstream once for all identical concurrent searches, at the highest priority among their callers."""
+    # Each flight queues under its own claim, so raising it leaves the leader's other searches as they were
+    claim = PriorityClaim(current_priority())
+
+    def lead() -> dict:
+        with claimed_priority(claim):
+            return _fetch_upstream(params)
+
+    return search_singleflight.do(make_cache_key(params), lead, claim, _join_flight)
+
+
+async def _acoalesced_fetch(params: dict) -> dict:
+    """Async counterpart of _coalesced_fetch."""
+    claim = PriorityClaim(current_priority())
+
+    async def lead() -> dict:
+        with claimed_priority(claim):
+            return await _afetch_upstream(params)
+
+    return await search_singleflight.ado(make_cache_key(params), lead, claim, _join_flight)
+
+
+def _refresh_in_background(params: dict) -> None:
+    """Re-fetch an expired search off the request path; concurrent refreshes of one search are coalesced."""
+    key = make_cache_key(params)
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def refresh() -> None:
+        try:
+            # Refreshes only use rate limit capacity that interactive searches leave over
+            with search_priority("prefetch"):
+                _coalesced_fetch(params)
+        except Exception:
+            pass
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(key)
+
+    _refresh_pool.submit(refresh)
+
+
+def _serve_stale(params: dict) -> Optional[dict]:
+    """Return an expired-but-servable cached result marked with its age, starting a background refresh."""
+    stale = search_cache.get_stale(params)
+    if stale is None:
+        return None
+    results, age = stale
+    _refresh_in_background(params)
+    results[STALE_AGE_KEY] = age
+    return results
+
+
+def _fetch_results(params: dict) -> dict:
+    """
+    Run a SerpAPI search, serving repeated searches from the shared cache and
+    coalescing identical concurrent searches into one upstream request.
+    Upstream requests go through the engine's retry/hedging policy.
+
+    Recently expired results are served immediately (marked with their age
+    under STALE_AGE_KEY) while a background refresh runs.
+
+    Args:
+        params: SerpAPI request parameters (including api_key)
+
+    Returns:
+        Decoded SerpAPI response dictionary
+    """
+    _notify_listeners(params)
+    cached = search_cache.get(params)
+    if cached is not None:
+        return cached
+    stale = _serve_stale(params)
+    if stale is not None:
+        return stale
+    # Identical searches already in flight (from any session) share one upstream request
+    return _coalesced_fetch(params)
+
+
+async def _afetch_results(params: dict) -> dict:
+    """Async counterpart of _fetch_results on the pooled async HTTP client."""
+    _notify_listeners(params)
+    cached = search_cache.get(params)
+    if cached is not None:
+        return cached
+    stale = _serve_stale(params)
+    if stale is not None:
+        return stale
+    return await _acoalesced_fetch(params)
+
+
+def _stale_note(results: dict) -> str:
+    """Warning line for results served from an expired cache entry, else ''."""
+    age = results.get(STALE_AGE_KEY)
+    if age is None:
+        return ""
+    fetched = "under a minute" if age < 60 else f"{round(age / 60)} minute(s)"
+    return (f"Note: live search is being refreshed; these results were fetched {fetched} ago "
+            f"and prices or availability may have changed.\n")
+
+
+def _flight_params(
+    departure_city: str,
+    arrival_city: str,
+    departure_date: str,
+    adults: int,
+    children: int,
+    currency: str,
+    travel_class: int,
+    deep_search: bool,
+    sort_by: int,
+) -> Optional[dict]:
+    """Build Google Flights parameters, or return None when the backend needs an API key that is missing."""
+    api_key = os.environ.get("SERPAPI_API_KEY")
+    if not api_key and get_search_backend().requires_api_key:
+        return None
+    adults = int(adults)
+    children = int(children)
+    travel_class = int(travel_class)
+    sort_by = int(sort_by)
+    return {
+        "engine": "google_flights",
+        # Exact city names and metro areas become airport codes, e.g. "Goa" -> "GOI,GOX"; other text is sent as given
+        "departure_id": airport_index.to_search_ids(departure_city),
+        "arrival_id": airport_index.to_search_ids(arrival_city),
+        "outbound_date": departure_date,
+        "adults": str(adults),
+        "children": str(children),
+        "currency": currency,
+        "gl": "in",
+        "hl": "en",
+        "type": "2",
+        "api_key": api_key,
+        "travel_class": str(travel_class),
+        "deep_search": str(deep_search).lower(),
+        "sort_by": str(sort_by)
+    }
+
+
+def _format_flight_results(params: dict, results: dict, departure_city: str, arrival_city: str, departure_date: str) -> str:
+    """Parse a Google Flights response, keep it server-side and format it for the LLM."""
+    offers = parse_flight_offers(results)
+    shown = select_flight_offers(offers, limit=3)
+    record = result_store.put("flights", params, offers, shown, departure_city=departure_city,
+                              arrival_city=arrival_city, departure_date=departure_date)
+    note = _stale_note(results)
+    if not shown:
+        return note + render_flight_offers(shown, departure_city, arrival_city, departure_date)
+    if TOOL_OUTPUT_MODE != "compact":
+        # The ID lets the model re-rank the full result set locally instead of searching again
+        header = f"Result ID: {record.result_id} ({len(shown)} of {len(offers)} flights; more via rerank_flights)\n"
+        return note + header + render_flight_offers(shown, departure_city, arrival_city, departure_date)
+    header = f"{note}Result ID: {record.result_id} ({len(shown)} of {len(offers)} flights, compact; full details via get_search_details)"
+    return fit_to_budget(header, lambda idx, level: render_flight_offer_compact(shown[idx], idx, level),
+                         len(shown), TOOL_TOKEN_BUDGETS["search_flights"])
+
+
+def _hotel_params(
+    query: str,
+    check_in_date: str,
+    check_out_date: str,
+    adults: int,
+    children: int,
+    sort_by: Optional[int],
+    currency: str,
+    rating: Optional[int],
+    hotel_class: Optional[str],
+) -> Optional[dict]:
+    """Build Google Hotels parameters, or return None when the backend needs an API key that is missing."""
+    api_key = os.environ.get("SERPAPI_API_KEY")
+    if not api_key and get_search_backend().requires_api_key:
+        return None
+    adults = int(adults)
+    children = int(children)
+    params = {
+        "engine": "google_hotels",
+        "q": query,
+        "check_in_date": check_in_date,
+        "check_out_date": check_out_date,
+        "adults": adults,
+        "children": children,
+        "currency": currency,
+        "gl": "in",
+        "hl": "en",
+        "api_key": api_key
+    }
+
+    if sort_by is not None:
+        params["sort_by"] = sort_by
+    if rating is not None:
+        params["rating"] = rating
+    if hotel_class is not None:
+        params["hotel_class"] = hotel_class
+    return params
+
+
+def _format_hotel_results(params: dict, results: dict, query: str, check_in_date: str, check_out_date: str, adults: int) -> str:
+    """Parse a Google Hotels response, keep it server-side and format it for the LLM."""
+    offers = parse_hotel_offers(results)
+    shown = offers[:3]  # Limit to top 3
+    record = result_store.put("hotels", params, offers, shown, query=query, check_in_date=check_in_date,
+                              check_out_date=check_out_date, adults=adults)
+    note = _stale_note(results)
+    if not shown:
+        return note + render_hotel_offers(shown, query, check_in_date, check_out_date, adults)
+    if TOOL_OUTPUT_MODE != "compact":
+        # The ID lets the model rank every property by distance without searching again
+        header = f"Result ID: {record.result_id} ({len(shown)} of {len(offers)} hotels; nearest to a place via hotels_near)\n"
+        return note + header + render_hotel_offers(shown, query, check_in_date, check_out_date, adults)
+    header = f"{note}Result ID: {record.result_id} ({len(shown)} of {len(offers)} hotels, compact; full details via get_search_details)"
+    return fit_to_budget(header, lambda idx, level: render_hotel_offer_compact(shown[idx], idx, adults, level),
+                         len(shown), TOOL_TOKEN_BUDGETS["search_hotels"])
+
+
+def _search_flights(
     departure_city: str,
     arrival_city: str,
     departure_date: str,
@@ -19,8 +349,8 @@ def search_flights(
     Search flights using SerpAPI Google Flights engine.
 
     Args:
-        departure_city: Departure city IATA code (e.g., "DEL" for Delhi)
-        arrival_city: Arrival city IATA code (e.g., "GOI" for Goa)
+        departure_city: Departure city IATA code (e.g., "DEL" for Delhi) or city name
+        arrival_city: Arrival city IATA code (e.g., "GOI" for Goa) or city name
         departure_date: Departure date in YYYY-MM-DD format
         adults: Number of adults (default: 1)
         children: Number of children (default: 0)
@@ -32,116 +362,41 @@ def search_flights(
     Returns:
         String containing flight search results
     """
-    api_key = os.environ.get("SERPAPI_API_KEY")
-    if not api_key:
-        return "Error: SERPAPI_API_KEY not found in environment variables"
-    adults = int(adults)
-    children = int(children)
-    travel_class = int(travel_class)
-    sort_by = int(sort_by)
-    params = {
-        "engine": "google_flights",
-        "departure_id": departure_city,
-        "arrival_id": arrival_city,
-        "outbound_date": departure_date,
-        "adults": str(adults),
-        "children": str(children),
-        "currency": currency,
-        "gl": "in",
-        "hl": "en",
-        "type": "2",
-        "api_key": api_key,
-        "travel_class": str(travel_class),
-        "deep_search": str(deep_search).lower(),
-        "sort_by": str(sort_by)
-    }
+    params = _flight_params(departure_city, arrival_city, departure_date, adults, children,
+                            currency, travel_class, deep_search, sort_by)
+    if params is None:
+        return MISSING_API_KEY_ERROR
+    try:
+        results = _fetch_results(params)
+        return _format_flight_results(params, results, departure_city, arrival_city, departure_date)
+    except Exception as e:
+        return f"Error searching flights: {str(e)}"
 
 
+async def _asearch_flights(
+    departure_city: str,
+    arrival_city: str,
+    departure_date: str,
+    adults: int = 1,
+    children: int = 0,
+    currency: str = "INR",
+    travel_class: int = 1,
+    deep_search: bool = False,
+    sort_by: int = 1,
+) -> str:
+    """Async implementation of search_flights."""
+    params = _flight_params(departure_city, arrival_city, departure_date, adults, children,
+                            currency, travel_class, deep_search, sort_by)
+    if params is None:
+        return MISSING_API_KEY_ERROR
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        # print(f"Search results: {results}")  # Debugging line to check results
-
-        flight_pool = []
-        if 'best_flights' in results and results['best_flights']:
-            flight_pool = results['best_flights'][:3]
-        elif 'other_flights' in results and results['other_flights']:
-            flight_pool = results['other_flights'][:3]  
-
-        if not flight_pool:
-            return f"No flights found from {departure_city} to {arrival_city} on {departure_date}"
-        
-        flight_info = []
-
-        for idx, flight in enumerate(flight_pool):
-            legs = flight.get('flights', [])
-            layovers = flight.get('layovers', [])
-            total_duration = flight.get('total_duration', 'Unknown')
-            price = flight.get('price', 'Price not available')
-            flight_type = flight.get('type', 'Unknown')
-            departure_token = flight.get('departure_token', 'N/A')
-            airline_logo = flight.get('airline_logo', 'N/A')
-
-            # Build string for each leg
-            flight_legs_info = []
-            for i, leg in enumerate(legs):
-                airline = leg.get('airline', 'Unknown Airline')
-                flight_number = leg.get('flight_number', 'N/A')
-                travel_class = leg.get('travel_class', 'N/A')
-
-                dep_airport_info = leg.get('departure_airport', {})
-                arr_airport_info = leg.get('arrival_airport', {})
-                departure_airport = dep_airport_info.get('name', 'Unknown')
-                departure_id = dep_airport_info.get('id', 'N/A')
-                departure_time = dep_airport_info.get('time', 'Unknown')
-
-                arrival_airport = arr_airport_info.get('name', 'Unknown')
-                arrival_id = arr_airport_info.get('id', 'N/A')
-                arrival_time = arr_airport_info.get('time', 'Unknown')
-
-                duration = leg.get('duration', 'Unknown')
-
-                leg_info = (
-                    f"  Leg {i+1}:\n"
-                    f"    Airline: {airline} ({flight_number})\n"
-                    f"    Class: {travel_class}\n"
-                    f"    From: {departure_airport} ({departure_id}) at {departure_time}\n"
-                    f"    To: {arrival_airport} ({arrival_id}) at {arrival_time}\n"
-                    f"    Duration: {duration} mins"
-                )
-                flight_legs_info.append(leg_info)
-
-            # Layovers
-            layover_info = []
-            for j, layover in enumerate(layovers):
-                layover_name = layover.get("name", "Unknown airport")
-                layover_duration = layover.get("duration", "Unknown")
-                overnight = " (overnight)" if layover.get("overnight") else ""
-                layover_info.append(f"  Layover {j+1}: {layover_name}, Duration: {layover_duration} mins{overnight}")
-
-            full_flight_info = (
-                f"Flight Option {idx+1}:\n"
-                + "\n".join(flight_legs_info)
-                + ("\n" + "\n".join(layover_info) if layover_info else "")
-                + f"\n  Total Duration: {total_duration} mins"
-                + f"\n  Price: {price}"
-                + f"\n  Type: {flight_type}"
-                + f"\n  Airline Logo: {airline_logo}"
-                + f"\n  Departure Token: {departure_token}\n"
-                + "-" * 50
-            )
-
-            flight_info.append(full_flight_info)
-
-        return "\n".join(flight_info)
-
-        
+        results = await _afetch_results(params)
+        return _format_flight_results(params, results, departure_city, arrival_city, departure_date)
     except Exception as e:
         return f"Error searching flights: {str(e)}"
 
 
-@tool
-def search_hotels(
+def _search_hotels(
     query: str,
     check_in_date: str,
     check_out_date: str,
@@ -170,94 +425,371 @@ def search_hotels(
         String containing formatted hotel search results, including name, rating, price per night,
         amenities, coordinates, image, and booking link
     """
+    params = _hotel_params(query, check_in_date, check_out_date, adults, children,
+                           sort_by, currency, rating, hotel_class)
+    if params is None:
+        return MISSING_API_KEY_ERROR
+    try:
+        results = _fetch_results(params)
+        return _format_hotel_results(params, results, query, check_in_date, check_out_date, int(adults))
+    except Exception as e:
+        return f"Error searching hotels: {str(e)}"
 
-    api_key = os.environ.get("SERPAPI_API_KEY")
-    if not api_key:
-        return "Error: SERPAPI_API_KEY not found in environment variables"
-    adults = int(adults)
-    children = int(children)
-    params = {
-        "engine": "google_hotels",
-        "q": query,
-        "check_in_date": check_in_date,
-        "check_out_date": check_out_date,
-        "adults": adults,
-        "children": children,
-        "currency": currency,
-        "gl": "in",
-        "hl": "en",
-        "api_key": api_key
-    }
-    
-    if sort_by is not None:
-        params["sort_by"] = sort_by
-    if rating is not None:
-        params["rating"] = rating
-    if hotel_class is not None:
-        params["hotel_class"] = hotel_class
 
+async def _asearch_hotels(
+    query: str,
+    check_in_date: str,
+    check_out_date: str,
+    adults: int = 2,
+    children: int = 0,
+    sort_by: Optional[int] = None,
+    currency: str = "INR",
+    rating: Optional[int] = None,
+    hotel_class: Optional[str] = None
+) -> str:
+    """Async implementation of search_hotels."""
+    params = _hotel_params(query, check_in_date, check_out_date, adults, children,
+                           sort_by, currency, rating, hotel_class)
+    if params is None:
+        return MISSING_API_KEY_ERROR
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        
-        if 'properties' not in results:
-            return f"No hotels found for {query} from {check_in_date} to {check_out_date}"
-        
-        hotels = results['properties'][:3]  # Limit to top 3
-        hotel_info = []
-
-        for hotel in hotels:
-            name = hotel.get('name', 'Unknown Hotel')
-            type_ = hotel.get('type', 'Unknown Type')
-            rating = hotel.get('overall_rating', 'No rating')
-            reviews = hotel.get('reviews', 'N/A')
-            price = hotel.get('rate_per_night', {}).get('lowest', 'N/A')
-            taxes = hotel.get('rate_per_night', {}).get('before_taxes_fees', 'N/A')
-            price_guests = hotel.get('prices', [{}])[0].get('num_guests', adults)
-            source = hotel.get('prices', [{}])[0].get('source', 'N/A')
-            logo = hotel.get('prices', [{}])[0].get('logo', 'N/A')
-            property_token = hotel.get('property_token', 'N/A')
-            link = hotel.get('link', hotel.get('serpapi_property_details_link', 'N/A'))
-            coords = hotel.get('gps_coordinates', {})
-            lat = coords.get('latitude', 'N/A')
-            lon = coords.get('longitude', 'N/A')
-            check_in = hotel.get('check_in_time', 'N/A')
-            check_out = hotel.get('check_out_time', 'N/A')
-            essential = ', '.join(hotel.get('essential_info', []))
-            amenities = ', '.join(hotel.get('amenities', []))
-            excluded = ', '.join(hotel.get('excluded_amenities', []))
-            image = hotel.get('images', [{}])[0].get('original_image', 'N/A')
-
-            nearby_places = []
-            for place in hotel.get("nearby_places", []):
-                place_name = place.get("name")
-                transports = [f"{t['type']} ({t['duration']})" for t in place.get("transportations", [])]
-                nearby_places.append(f"{place_name} - {'; '.join(transports)}")
-            nearby_summary = "; ".join(nearby_places) if nearby_places else "None"
-
-            hotel_info.append(
-                f"Hotel: {name} ({type_})\n"
-                f"Rating: {rating} ({reviews} reviews)\n"
-                f"Price per night for {price_guests} guests: {price} (Before taxes: {taxes}) via {source}\n"
-                f"Amenities: {amenities}\n"
-                f"Excluded Amenities: {excluded}\n"
-                f"Essential Info: {essential}\n"
-                f"Location: Latitude {lat}, Longitude {lon}\n"
-                f"Check-in Time: {check_in}, Check-out Time: {check_out}\n"
-                f"Nearby Places: {nearby_summary}\n"
-                f"Booking Link: {link}\n"
-                f"Property Token: {property_token}\n"
-                f"Image: {image}\n"
-                f"Source Logo: {logo}\n"
-                "-------------------------------------------"
-            )
-
-        return "\n".join(hotel_info)
-
+        results = await _afetch_results(params)
+        return _format_hotel_results(params, results, query, check_in_date, check_out_date, int(adults))
     except Exception as e:
         return f"Error searching hotels: {str(e)}"
 
 
+def _fare_matrix_jobs(
+    departure_city: str,
+    arrival_city: str,
+    departure_date_from: str,
+    departure_date_to: Optional[str],
+    return_date_from: Optional[str],
+    return_date_to: Optional[str],
+    adults: int,
+    children: int,
+    currency: str,
+    travel_class: int,
+) -> Optional[list]:
+    """Build one-way searches for every date in the windows as (direction, date, params) tuples."""
+    jobs = []
+    for day in date_window(departure_date_from, departure_date_to, FARE_MATRIX_MAX_DAYS):
+        params = _flight_params(departure_city, arrival_city, day, adults, children, currency, travel_class, False, 1)
+        if params is None:
+            return None
+        jobs.append(("outbound", day, params))
+    if return_date_from:
+        for day in date_window(return_date_from, return_date_to, FARE_MATRIX_MAX_DAYS):
+            params = _flight_params(arrival_city, departure_city, day, adults, children, currency, travel_class, False, 1)
+            jobs.append(("inbound", day, params))
+    return jobs
+
+
+def _fare_cell(results: dict):
+    offers = parse_flight_offers(results)
+    if not offers:
+        return "no flights found"
+    return summarize_offers(offers)
+
+
+def _render_fare_jobs(departure_city: str, arrival_city: str, jobs: list, cells: list) -> str:
+    grid = {"outbound": {}, "inbound": {}}
+    for (direction, day, _), cell in zip(jobs, cells):
+        grid[direction][day] = cell
+    return render_fare_matrix(departure_city, arrival_city, grid["outbound"], grid["inbound"] or None)
+
+
+def _search_flight_dates(
+    departure_city: str,
+    arrival_city: str,
+    departure_date_from: str,
+    departure_date_to: str,
+    return_date_from: Optional[str] = None,
+    return_date_to: Optional[str] = None,
+    adults: int = 1,
+    children: int = 0,
+    currency: str = "INR",
+    travel_class: int = 1,
+) -> str:
+    """
+    Compare one-way fares across flexible travel dates in a single call.
+
+    Use this instead of calling search_flights once per date when the user's dates are
+    flexible (e.g. "sometime in the second week of December"). Each date window may span
+    at most 10 days; split longer ones into several calls.
+
+    Args:
+        departure_city: Departure city IATA code (e.g., "DEL" for Delhi) or city name
+        arrival_city: Arrival city IATA code (e.g., "GOI" for Goa) or city name
+        departure_date_from: First possible departure date in YYYY-MM-DD format
+        departure_date_to: Last possible departure date in YYYY-MM-DD format
+        return_date_from: First possible return date in YYYY-MM-DD format (optional)
+        return_date_to: Last possible return date in YYYY-MM-DD format (optional)
+        adults: Number of adults (default: 1)
+        children: Number of children (default: 0)
+        currency: Currency code (default: "INR")
+        travel_class: 1 - Economy (default), 2 - Premium economy, 3 - Business, 4 - First
+
+    Returns:
+        String containing a date grid of the cheapest fare and fastest duration per date
+    """
+    try:
+        jobs = _fare_matrix_jobs(departure_city, arrival_city, departure_date_from, departure_date_to,
+                                 return_date_from, return_date_to, adults, children, currency, travel_class)
+    except ValueError as e:
+        return f"Error searching flight dates: {str(e)}"
+    if jobs is None:
+        return MISSING_API_KEY_ERROR
+
+    futures = [
+        _fare_matrix_pool.submit(contextvars.copy_context().run, _fetch_results, params)
+        for _, _, params in jobs
+    ]
+    cells = []
+    for future in futures:
+        try:
+            cells.append(_fare_cell(future.result()))
+        except Exception as e:
+            cells.append(f"error: {str(e)}")
+    return _render_fare_jobs(departure_city, arrival_city, jobs, cells)
+
+
+async def _asearch_flight_dates(
+    departure_city: str,
+    arrival_city: str,
+    departure_date_from: str,
+    departure_date_to: str,
+    return_date_from: Optional[str] = None,
+    return_date_to: Optional[str] = None,
+    adults: int = 1,
+    children: int = 0,
+    currency: str = "INR",
+    travel_class: int = 1,
+) -> str:
+    """Async implementation of search_flight_dates."""
+    try:
+        jobs = _fare_matrix_jobs(departure_city, arrival_city, departure_date_from, departure_date_to,
+                                 return_date_from, return_date_to, adults, children, currency, travel_class)
+    except ValueError as e:
+        return f"Error searching flight dates: {str(e)}"
+    if jobs is None:
+        return MISSING_API_KEY_ERROR
+
+    semaphore = asyncio.Semaphore(FARE_MATRIX_CONCURRENCY)
+
+    async def fetch_cell(params: dict):
+        async with semaphore:
+            try:
+                return _fare_cell(await _afetch_results(params))
+            except Exception as e:
+                return f"error: {str(e)}"
+
+    cells = await asyncio.gather(*(fetch_cell(params) for _, _, params in jobs))
+    return _render_fare_jobs(departure_city, arrival_city, jobs, cells)
+
+
+@tool
+def get_search_details(result_id: str, option: Optional[int] = None) -> str:
+    """
+    Get the full details of an earlier flight or hotel search shown in compact form.
+
+    Args:
+        result_id: The "Result ID" printed at the top of a search_flights or search_hotels result
+        option: Option number to expand (default: all options that were shown)
+
+    Returns:
+        String containing the full, uncompacted search results
+    """
+    record = result_store.get(result_id)
+    if record is None:
+        return (f"Unknown or expired result ID: {result_id}. Only the most recent searches are kept; "
+                "run the same search again to get its details.")
+    if option is not None:
+        option = int(option)
+        if not 1 <= option <= len(record.shown):
+            return f"Option {option} does not exist in {result_id} (options 1-{len(record.shown)})."
+        offer = record.shown[option - 1]
+        if record.kind == "flights":
+            return render_flight_offer(offer, option - 1)
+        return render_hotel_offer(offer, record.context["adults"])
+    if record.kind == "flights":
+        return render_flight_offers(record.shown, **record.context)
+    return render_hotel_offers(record.shown, **record.context)
+
+
+@tool
+def rerank_flights(
+    result_id: str,
+    sort_by: str = "balanced",
+    max_stops: Optional[int] = None,
+    avoid_overnight: bool = False,
+    depart_after_hour: Optional[int] = None,
+    depart_before_hour: Optional[int] = None,
+    limit: int = 3,
+) -> str:
+    """
+    Re-rank or filter ALL flights of an earlier search_flights result locally, without a new search.
+    Use it when the user wants cheaper, faster, fewer stops or different departure times on the same route and date.
+
+    Args:
+        result_id: The "Result ID" printed at the top of a search_flights result
+        sort_by: "balanced", "cheapest", "fastest", "fewest_stops", "earliest" or "latest"
+        max_stops: Maximum number of layovers (0 for non-stop only)
+        avoid_overnight: Exclude options with an overnight layover
+        depart_after_hour: Earliest departure hour, 0-23
+        depart_before_hour: Latest departure hour, 0-23
+        limit: Number of options to return (default: 3)
+
+    Returns:
+        String containing the re-ranked flight options
+    """
+    record = result_store.get(result_id)
+    if record is None or record.kind != "flights":
+        return f"Unknown or expired flight result ID: {result_id}. Please run search_flights again."
+    if record.columns is None:
+        record.columns = flight_columns(record.offers)
+    columns = record.columns
+    try:
+        order = rank_flights(columns, sort_by=sort_by, max_stops=max_stops, avoid_overnight=bool(avoid_overnight),
+                             depart_after=depart_after_hour, depart_before=depart_before_hour)
+    except ValueError as e:
+        return f"Error re-ranking flights: {str(e)}"
+    if len(order) == 0:
+        return f"None of the {len(columns)} flights in {result_id} match these filters. Relax them or search another date."
+
+    chosen = [record.offers[i] for i in order[:max(1, int(limit))]]
+    # The ordering gets its own ID for get_search_details(option=N); the original result is shared by every session
+    view = result_store.derive(record, chosen, sort_by=sort_by, max_stops=max_stops, avoid_overnight=bool(avoid_overnight),
+                               depart_after=depart_after_hour, depart_before=depart_before_hour, limit=len(chosen))
+    pareto = pareto_front(columns.matrix(PARETO_CRITERIA))
+    trade_offs = [str(rank + 1) for rank, i in enumerate(order[:len(chosen)]) if pareto[i]]
+    header = (f"Result ID: {view.result_id} - {len(chosen)} of {len(order)} matching flights "
+              f"({len(columns)} total), sorted by {sort_by}")
+    if trade_offs:
+        header += f"\nBest price/duration/stops trade-offs (nothing beats them on all three): option(s) {', '.join(trade_offs)}"
+    if TOOL_OUTPUT_MODE != "compact":
+        return header + "\n" + render_flight_offers(chosen, **record.context)
+    return fit_to_budget(header, lambda idx, level: render_flight_offer_compact(chosen[idx], idx, level),
+                         len(chosen), TOOL_TOKEN_BUDGETS["search_flights"])
+
+
+@tool
+def hotels_near(
+    result_id: str,
+    place: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    max_km: Optional[float] = None,
+    limit: int = 3,
+) -> str:
+    """
+    Rank ALL hotels of an earlier search_hotels result by distance, locally and without a new search.
+    Use it when the user wants to stay close to an attraction (e.g. one of their interests) or a given point.
+
+    Args:
+        result_id: The "Result ID" printed at the top of a search_hotels result
+        place: Attraction name(s) listed near the hotels, comma-separated for several (e.g. "Baga Beach, Fort Aguada")
+        latitude: Latitude of a point to stay near (instead of place)
+        longitude: Longitude of a point to stay near (instead of place)
+        max_km: Only include hotels within this distance
+        limit: Number of hotels to return (default: 3)
+
+    Returns:
+        String listing the closest hotels with their distance, price and rating
+    """
+    record = result_store.get(result_id)
+    if record is None or record.kind != "hotels":
+        return f"Unknown or expired hotel result ID: {result_id}. Please run search_hotels again."
+    if record.spatial is None:
+        record.spatial = HotelGeoIndex(record.offers)
+    index = record.spatial
+    unknown = []
+    if not len(index):
+        return f"None of the hotels in {result_id} have coordinates."
+
+    if latitude is not None and longitude is not None:
+        targets = [(float(latitude), float(longitude), f"({float(latitude):.4f}, {float(longitude):.4f})")]
+    elif place:
+        targets = []
+        for name in (part.strip() for part in str(place).split(",")):
+            located = index.locate_place(name) if name else None
+            if located:
+                targets.append(located)
+            elif name:
+                unknown.append(name)
+        if not targets:
+            return (f"None of the hotels in {result_id} list '{place}' nearby. "
+                    "Give latitude/longitude instead, or try another attraction name.")
+    else:
+        return "Provide a place name or latitude and longitude."
+
+    limit = max(1, int(limit))
+    if len(targets) == 1:
+        lat, lon, _ = targets[0]
+        ranked = index.nearest(lat, lon, k=limit, max_km=max_km)
+    else:
+        # Several places: rank by mean distance to all of them (hotels without coordinates stay NaN)
+        per_target = np.array([index.distances(lat, lon) for lat, lon, _ in targets])
+        located = ~np.isnan(per_target).any(axis=0)
+        distances = np.full(per_target.shape[1], np.nan)
+        distances[located] = per_target[:, located].mean(axis=0)
+        order = [int(i) for i in np.argsort(distances, kind="stable") if not np.isnan(distances[i])]
+        if max_km is not None:
+            order = [i for i in order if distances[i] <= max_km]
+        ranked = [(i, float(distances[i])) for i in order[:limit]]
+    if not ranked:
+        return f"No hotels in {result_id} within {max_km:g} km. Increase max_km."
+
+    label = ", ".join(name for _, _, name in targets)
+    # The ordering gets its own ID for get_search_details(option=N); the original result is shared by every session
+    view = result_store.derive(record, [record.offers[i] for i, _ in ranked], near=label, max_km=max_km, limit=limit)
+    distance_label = "mean distance" if len(targets) > 1 else "distance"
+    lines = [f"Result ID: {view.result_id} - {len(ranked)} of {len(index)} located hotels nearest to {label}"]
+    if unknown:
+        lines.append(f"Not listed near any hotel (ignored): {', '.join(unknown)}")
+    for option, (i, km) in enumerate(ranked, 1):
+        offer = record.offers[i]
+        rating = f"{offer.overall_rating}/5" if offer.overall_rating is not None else "no rating"
+        lines.append(f"{option}. {offer.name or 'Unknown'} - {distance_label} {km:.1f} km, "
+                     f"{offer.rate_per_night or 'price N/A'}/night, {rating}")
+    lines.append("Full details via get_search_details(result_id, option).")
+    return "\n".join(lines)
+
+
+@tool
+def resolve_airport(query: str) -> str:
+    """
+    Look up the IATA airport code(s) for a city, metro area or airport name (offline, instant).
+
+    Args:
+        query: City, airport or area name, e.g. "Goa", "New York", "Heathrow"
+
+    Returns:
+        String listing the best matches and their codes
+    """
+    candidates = airport_index.lookup(query, limit=3)
+    if not candidates:
+        return f"No airport found for '{query}'. Try a nearby major city."
+    lines = []
+    for resolution in candidates:
+        airports = ", ".join(
+            f"{code} ({airport.name})" if (airport := airport_index.airport(code)) else code
+            for code in resolution.codes
+        )
+        lines.append(f"{resolution.label}: {airports} -> use \"{resolution.search_ids}\"")
+    if candidates[0].method in ("prefix", "fuzzy"):
+        lines.insert(0, f"No exact match for '{query}'; closest names (confirm with the user before searching):")
+    return "\n".join(lines)
+
+
+# Tools expose the sync implementation via invoke()/.func and the pooled async one via ainvoke()/.coroutine
+search_flights = StructuredTool.from_function(func=_search_flights, coroutine=_asearch_flights, name="search_flights")
+search_hotels = StructuredTool.from_function(func=_search_hotels, coroutine=_asearch_hotels, name="search_hotels")
+search_flight_dates = StructuredTool.from_function(
+    func=_search_flight_dates, coroutine=_asearch_flight_dates, name="search_flight_dates"
+)
+
+
 def save_itinerary(filename: str, itinerary: str) -> str:
     """
     Save the generated itinerary to a file.
@@ -295,5 +827,5 @@ def save_preferences(preferences: str, filename: str) -> str:
     except Exception as e:
         return f"Error saving preferences: {str(e)}"
 
-tools = [search_flights, search_hotels]
+tools = [search_flights, search_hotels, search_flight_dates, get_search_details, rerank_flights, hotels_near, resolve_airport]
 tools_dict = {tool.name: tool for tool in tools}
\ No newline at end of file